@@ -0,0 +1,195 @@
+import pandas as pd # type: ignore
+import numpy as np # type: ignore
+import os
+import json
+from datetime import datetime
+
+from analysis_functions import analisar_pendencias, gerar_txt_admissoes, gerar_txt_divergencias, gerar_txt_demissoes
+from core_processing import renderizar_chave, registros_mais_recentes
+from correspondencia import indice_candidatos, COLUNAS_CANDIDATO
+from reconciliacao import data_de_referencia, limite_admissao, limite_rescisao, VISOES
+
+PASTA_ESTADO = os.path.join('data', '.incremental')
+VERSAO_ESTADO = 2
+
+# nome (chave de analisar_pendencias) -> (gerador do TXT, colunas que identificam uma pendência)
+ANALISES = {
+    'admissoes': (gerar_txt_admissoes, ['chapa', 'evento_sugerido']),
+    'divergencias': (gerar_txt_divergencias, ['id_sistema_local', 'campo_divergente']),
+    'demissoes': (gerar_txt_demissoes, ['id_sistema_local', 'evento_codigo']),
+}
+
+def _assinatura_por_chave(df, chave='id_sistema_local'):
+    # Soma (com overflow) dos hashes das linhas de cada colaborador: independe da ordem
+    # das linhas e muda quando qualquer linha é incluída, alterada ou removida.
+    hashes = pd.util.hash_pandas_object(df, index=False)
+    return pd.DataFrame({chave: df[chave].array, 'hash': hashes.to_numpy()}).groupby(chave, dropna=False).agg(
+        hash=('hash', 'sum'), linhas=('hash', 'size'))
+
+def detectar_chaves_alteradas(anterior, atual, chave='id_sistema_local'):
+    assinatura = _assinatura_por_chave(anterior, chave).join(
+        _assinatura_por_chave(atual, chave), how='outer', lsuffix='_ant', rsuffix='_atual')
+    incluidas = assinatura.index[assinatura['linhas_ant'].isna()]
+    removidas = assinatura.index[assinatura['linhas_atual'].isna()]
+    ambas = assinatura.dropna(subset=['linhas_ant', 'linhas_atual'])
+    alteradas = ambas.index[(ambas['hash_ant'] != ambas['hash_atual']) | (ambas['linhas_ant'] != ambas['linhas_atual'])]
+    return set(incluidas), set(alteradas), set(removidas)
+
+def _chaves_por_janela(df, coluna, inicio, fim, chave='id_sistema_local'):
+    if coluna not in df.columns:
+        return set()
+    return set(df.loc[(df[coluna] >= inicio) & (df[coluna] <= fim), chave])
+
+def _chaves_afetadas_pelo_tempo(brasil_limpo, metadados, agora):
+    # As janelas de 7 dias (admissão) e 5 dias (rescisão) andam com o relógio: quem
+    # cruzou o limite entre a execução anterior e a atual precisa ser reavaliado.
+    hoje_ant, hoje = data_de_referencia(metadados['executado_em']), data_de_referencia(agora)
+    chaves = _chaves_por_janela(brasil_limpo, 'data_admissao', limite_admissao(hoje_ant), limite_admissao(hoje))
+    chaves |= _chaves_por_janela(brasil_limpo, 'dt_pagto_rescisao', limite_rescisao(hoje_ant), limite_rescisao(hoje))
+    return chaves
+
+def _expandir_por_chapa(chaves, *bases_brasil):
+    # O relatório de admissões é identificado pela chapa; colaboradores que dividem
+    # chapa com uma chave afetada entram juntos para não perder linhas no merge.
+    chapas = set()
+    for df in bases_brasil:
+        chapas |= set(df.loc[df['id_sistema_local'].isin(chaves), 'chapa'])
+    for df in bases_brasil:
+        chaves = chaves | set(df.loc[df['chapa'].isin(chapas), 'id_sistema_local'])
+    return chaves
+
+def _chapas_renderizadas(df, chaves):
+    return set(renderizar_chave(df.loc[df['id_sistema_local'].isin(chaves), 'chapa']))
+
+def _linhas_afetadas(nome, df_relatorio, chaves, chapas):
+    if df_relatorio.empty:
+        return pd.Series(False, index=df_relatorio.index)
+    if nome == 'admissoes':
+        return df_relatorio['chapa'].isin(chapas)
+    # Nos relatórios as chaves já estão renderizadas como texto.
+    return df_relatorio['id_sistema_local'].isin(set(renderizar_chave(pd.Series(list(chaves), dtype=object))))
+
+def _atualizar_candidatos(df_relatorio, brasil_limpo, espanha_limpa):
+    # Os candidatos de EVE001 vêm do histórico inteiro da Espanha: uma inclusão na Espanha pode
+    # virar o melhor candidato de uma pendência mantida, e a análise parcial só viu as chaves afetadas.
+    if df_relatorio.empty:
+        return df_relatorio
+    eve001 = df_relatorio['evento_sugerido'].str.contains('EVE001', na=False).to_numpy()
+    if not eve001.any():
+        return df_relatorio
+    _, filtro, _ = VISOES['br_ativo_local']
+    recentes = registros_mais_recentes(brasil_limpo[filtro(brasil_limpo).to_numpy(dtype=bool, na_value=False)])
+    nacionalidades = pd.Series(recentes['nacionalidade'].to_numpy(), index=renderizar_chave(recentes['chapa']).to_numpy())
+    nacionalidades = nacionalidades[~nacionalidades.index.duplicated(keep='last')]
+    linhas = df_relatorio[eve001]
+    melhores = indice_candidatos(espanha_limpa).melhores(linhas['nome'], linhas['data_admissao'],
+                                                         linhas['chapa'].map(nacionalidades), index=linhas.index)
+    # Um relatório novo: o recebido pode ser o resultado guardado pela memoização.
+    vazia = pd.Series(np.nan, index=df_relatorio.index)
+    return df_relatorio.assign(**{col: df_relatorio.get(col, vazia).mask(eve001, melhores[col].reindex(df_relatorio.index))
+                                  for col in COLUNAS_CANDIDATO})
+
+def _marcar_novos_e_resolvidos(df_atual, df_anterior, colunas_id):
+    if df_atual.empty:
+        atual_ids = pd.MultiIndex.from_arrays([[]] * len(colunas_id))
+    else:
+        atual_ids = pd.MultiIndex.from_frame(df_atual[colunas_id].astype(str))
+    if df_anterior is None or df_anterior.empty:
+        anterior_ids = pd.MultiIndex.from_arrays([[]] * len(colunas_id))
+        df_resolvidos = pd.DataFrame()
+    else:
+        anterior_ids = pd.MultiIndex.from_frame(df_anterior[colunas_id].astype(str))
+        df_resolvidos = df_anterior[~anterior_ids.isin(atual_ids)].drop(columns=['novo_desde_ultima_execucao'], errors='ignore')
+        df_resolvidos = df_resolvidos.assign(resolvido_desde_ultima_execucao=True)
+    if not df_atual.empty:
+        df_atual = df_atual.assign(novo_desde_ultima_execucao=~atual_ids.isin(anterior_ids))
+    return df_atual, df_resolvidos
+
+def _ler_estado(pasta_estado):
+    try:
+        with open(os.path.join(pasta_estado, 'metadados.json'), 'r', encoding='utf-8') as f:
+            metadados = json.load(f)
+        if metadados.get('versao') != VERSAO_ESTADO:
+            return None
+        estado = {
+            'metadados': metadados,
+            'brasil': pd.read_parquet(os.path.join(pasta_estado, 'brasil_anterior.parquet')),
+            'espanha': pd.read_parquet(os.path.join(pasta_estado, 'espanha_anterior.parquet')),
+            'resultados': {nome: pd.read_pickle(os.path.join(pasta_estado, f'resultado_{nome}.pkl')) for nome in ANALISES},
+        }
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"AVISO: Estado incremental ignorado por erro de leitura; será feita uma execução completa.\nDetalhe: {e}")
+        return None
+    return estado
+
+def _gravar_estado(pasta_estado, brasil_limpo, espanha_limpa, resultados, agora):
+    os.makedirs(pasta_estado, exist_ok=True)
+    caminho_metadados = os.path.join(pasta_estado, 'metadados.json')
+    if os.path.exists(caminho_metadados):
+        os.remove(caminho_metadados)
+    brasil_limpo.to_parquet(os.path.join(pasta_estado, 'brasil_anterior.parquet'))
+    espanha_limpa.to_parquet(os.path.join(pasta_estado, 'espanha_anterior.parquet'))
+    for nome, df in resultados.items():
+        df.to_pickle(os.path.join(pasta_estado, f'resultado_{nome}.pkl'))
+    with open(caminho_metadados, 'w', encoding='utf-8') as f:
+        json.dump({'versao': VERSAO_ESTADO, 'executado_em': agora.isoformat()}, f, indent=2)
+
+def executar_incremental(brasil_limpo, espanha_limpa, pasta_estado=PASTA_ESTADO):
+    agora = datetime.now()
+    estado = _ler_estado(pasta_estado)
+    if estado is not None and (
+        list(estado['brasil'].columns) != list(brasil_limpo.columns)
+        or list(estado['espanha'].columns) != list(espanha_limpa.columns)
+        or datetime.fromisoformat(estado['metadados']['executado_em']) > agora
+    ):
+        print("--- INCREMENTAL: Estrutura das bases mudou; será feita uma execução completa. ---")
+        estado = None
+
+    if estado is None:
+        chaves = None
+        print("--- INCREMENTAL: Nenhuma execução anterior utilizável, analisando todos os colaboradores. ---")
+    else:
+        incl_br, alt_br, rem_br = detectar_chaves_alteradas(estado['brasil'], brasil_limpo)
+        incl_es, alt_es, rem_es = detectar_chaves_alteradas(estado['espanha'], espanha_limpa)
+        chaves_tempo = _chaves_afetadas_pelo_tempo(brasil_limpo, estado['metadados'], agora)
+        chaves = incl_br | alt_br | rem_br | incl_es | alt_es | rem_es | chaves_tempo
+        chaves = _expandir_por_chapa(chaves, estado['brasil'], brasil_limpo)
+        print(f"--- INCREMENTAL: Brasil: {len(incl_br)} incluídos, {len(alt_br)} alterados, {len(rem_br)} removidos. "
+              f"Espanha: {len(incl_es)} incluídos, {len(alt_es)} alterados, {len(rem_es)} removidos. "
+              f"Janelas de data: {len(chaves_tempo)}. Total a reavaliar: {len(chaves)}. ---")
+
+    if chaves is None:
+        brasil_alvo, espanha_alvo = brasil_limpo, espanha_limpa
+    else:
+        brasil_alvo = brasil_limpo[brasil_limpo['id_sistema_local'].isin(chaves)]
+        espanha_alvo = espanha_limpa[espanha_limpa['id_sistema_local'].isin(chaves)]
+
+    saida, resultados_estado = {}, {}
+    parciais = analisar_pendencias(brasil_alvo, espanha_alvo, data_referencia=agora)
+    for nome, (gerar_txt, colunas_id) in ANALISES.items():
+        df_parcial, _ = parciais[nome]
+        if 'Erro' in df_parcial.columns:
+            saida[nome] = (df_parcial, "", pd.DataFrame())
+            resultados_estado[nome] = pd.DataFrame()
+            continue
+
+        df_anterior = None if estado is None else estado['resultados'][nome]
+        if chaves is None or df_anterior is None or df_anterior.empty:
+            df_resultado = df_parcial
+        else:
+            chapas = _chapas_renderizadas(estado['brasil'], chaves) | _chapas_renderizadas(brasil_limpo, chaves)
+            mantidos = df_anterior[~_linhas_afetadas(nome, df_anterior, chaves, chapas)]
+            df_resultado = pd.concat([mantidos.drop(columns=['novo_desde_ultima_execucao'], errors='ignore'), df_parcial],
+                                     ignore_index=True)
+            if nome == 'admissoes':
+                df_resultado = _atualizar_candidatos(df_resultado, brasil_limpo, espanha_limpa)
+
+        resultados_estado[nome] = df_resultado.drop(columns=['novo_desde_ultima_execucao'], errors='ignore')
+        df_resultado, df_resolvidos = _marcar_novos_e_resolvidos(resultados_estado[nome], df_anterior, colunas_id)
+        txt = gerar_txt(df_resultado) if not df_resultado.empty else ""
+        saida[nome] = (df_resultado, txt, df_resolvidos)
+
+    _gravar_estado(pasta_estado, brasil_limpo, espanha_limpa, resultados_estado, agora)
+    return saida
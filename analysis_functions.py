@@ -1,47 +1,16 @@
-import streamlit as st # type: ignore # Importa o streamlit para usar o cache
 import pandas as pd # type: ignore
 import numpy as np # type: ignore
-from datetime import datetime, timedelta
-
-# Adicionando o decorador de cache para otimizar a performance
-@st.cache_data
-def analisar_admissoes_recontratacoes(brasil_limpo, espanha_historico):
-    brasil_limpo = brasil_limpo[brasil_limpo['status_empregado'] == 'Activo'].copy()
-    expats_br_list = ['expaIn', 'expaOut']
-    filtro_br_expat = brasil_limpo['expa_local'].isin(expats_br_list)
-    expats_es_list = ['Expatriado entrante', 'Expatriado no oficial', 'Expatriado saliente']
-    filtro_es_expat = espanha_historico['expa_local'].isin(expats_es_list)
-    brasil_para_analise = brasil_limpo[~filtro_br_expat].copy()
-    espanha_para_analise = espanha_historico[~filtro_es_expat].copy()
-    lista_pendencias = []
-    brasil_recente_para_novos = brasil_para_analise.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
-    df_merged_novos = pd.merge(brasil_recente_para_novos, espanha_para_analise[['id_sistema_local']].drop_duplicates(), on='id_sistema_local', how='left', indicator=True)
-    novos_nao_encontrados = df_merged_novos[df_merged_novos['_merge'] == 'left_only'].copy()
-    hoje = pd.to_datetime(datetime.now().date())
-    data_limite_admissao = hoje - pd.Timedelta(days=7)
-    pendencias_eve001 = novos_nao_encontrados[novos_nao_encontrados['data_admissao'] <= data_limite_admissao].copy()
-    if not pendencias_eve001.empty:
-        pendencias_eve001['evento_sugerido'] = 'EVE001 - Nova Contratação'
-        lista_pendencias.append(pendencias_eve001)
-    brasil_recente = brasil_para_analise.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
-    espanha_recente = espanha_para_analise.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
-    df_merged_status = pd.merge(brasil_recente, espanha_recente, on='id_sistema_local', suffixes=('_br', '_es'))
-    if 'status_empregado_br' in df_merged_status.columns and 'status_empregado_es' in df_merged_status.columns:
-        filtro_status = (df_merged_status['status_empregado_br'] == 'Activo') & (df_merged_status['status_empregado_es'] == 'Con terminación de contrato')
-        pendencias_eve003_023 = df_merged_status[filtro_status].copy()
-        if not pendencias_eve003_023.empty:
-            pendencias_eve003_023['nome'] = pendencias_eve003_023['nome_br']
-            pendencias_eve003_023['evento_sugerido'] = 'VERIFICAR: EVE003/023 - Ativo no BR, Terminado na ES'
-            lista_pendencias.append(pendencias_eve003_023)
-    if not lista_pendencias: return pd.DataFrame(), ""
-    df_relatorio_final = pd.concat(lista_pendencias, ignore_index=True)
-    colunas_relatorio_base = ['chapa', 'nome', 'data_admissao', 'evento_sugerido']
-    colunas_existentes = [col for col in colunas_relatorio_base if col in df_relatorio_final.columns]
-    for col in ['status_empregado_br', 'status_empregado_es']:
-        if col in df_relatorio_final.columns: colunas_existentes.append(col)
-    df_relatorio_final = df_relatorio_final[colunas_existentes].copy()
-    df_relatorio_final.rename(columns={'status_empregado_br': 'status_brasil', 'status_empregado_es': 'status_espanha'}, inplace=True)
-    if 'chapa' in df_relatorio_final.columns: df_relatorio_final['chapa'] = df_relatorio_final['chapa'].astype(str).str.split('.').str[0]
+
+from core_processing import renderizar_chave
+from correspondencia import indice_candidatos
+from instrumentacao import etapa, medir_etapa
+from memoizacao import memoizar
+from reconciliacao import (
+    selecionar_pendencias, resolver_motor, resolver_as_of, resolver_particoes, coluna, data_de_referencia,
+    DIAS_LIMITE_ADMISSAO, DIAS_LIMITE_RESCISAO, COLUNAS_PARA_COMPARAR
+)
+
+def gerar_txt_admissoes(df_relatorio_final):
     chapas_eve001 = df_relatorio_final[df_relatorio_final['evento_sugerido'].str.contains('EVE001', na=False)]['chapa'].unique()
     chapas_verificar = df_relatorio_final[df_relatorio_final['evento_sugerido'].str.contains('VERIFICAR', na=False)]['chapa'].unique()
     conteudo_txt = []
@@ -52,30 +21,9 @@ def analisar_admissoes_recontratacoes(brasil_limpo, espanha_historico):
         if conteudo_txt: conteudo_txt.append("\n")
         conteudo_txt.append("---VERIFICAR: EVE003 ou EVE023---")
         conteudo_txt.append(';'.join(chapas_verificar.astype(str)))
-    return df_relatorio_final, '\n'.join(conteudo_txt)
-
-@st.cache_data
-def analisar_divergencias_info(brasil_limpo, espanha_historico):
-    brasil_limpo = brasil_limpo[brasil_limpo['status_empregado'] == 'Activo'].copy()
-    espanha_ativos = espanha_historico[espanha_historico['status_empregado'] == 'Activo'].copy()
-    brasil_limpo_recente = brasil_limpo.sort_values('data_efetiva', ascending=False).drop_duplicates('id_sistema_local')
-    espanha_ativos_recente = espanha_ativos.sort_values('data_efetiva', ascending=False).drop_duplicates('id_sistema_local')
-    df_merged = pd.merge(brasil_limpo_recente, espanha_ativos_recente, on='id_sistema_local', how='inner', suffixes=('_br', '_es'))
-    if df_merged.empty: return pd.DataFrame(), ""
-    colunas_para_comparar = ['cargo', 'categoria', 'familia', 'tipo_empregado', 'tipo_contrato', 'business_unit']
-    df_relatorio_final = pd.DataFrame()
-    for col in colunas_para_comparar:
-        col_br, col_es = f"{col}_br", f"{col}_es"
-        if col_br in df_merged.columns and col_es in df_merged.columns:
-            divergencias = df_merged[df_merged[col_br] != df_merged[col_es]].copy()
-            if not divergencias.empty:
-                temp_df = divergencias[['id_sistema_local', 'chapa', 'nome_br', col_br, col_es]].copy()
-                temp_df.rename(columns={'chapa':'chapa_brasil', 'nome_br': 'nome', col_br: 'valor_brasil', col_es: 'valor_espanha'}, inplace=True)
-                temp_df['campo_divergente'] = col
-                df_relatorio_final = pd.concat([df_relatorio_final, temp_df], ignore_index=True)
-    if df_relatorio_final.empty: return pd.DataFrame(), ""
-    df_relatorio_final['evento_sugerido'] = np.where(df_relatorio_final['campo_divergente'] == 'business_unit', 'EVE013', 'EVE012')
-    df_relatorio_final['chapa_brasil'] = df_relatorio_final['chapa_brasil'].astype(str).str.split('.').str[0]
+    return '\n'.join(conteudo_txt)
+
+def gerar_txt_divergencias(df_relatorio_final):
     chapas_012 = df_relatorio_final[df_relatorio_final['evento_sugerido'] == 'EVE012']['chapa_brasil'].unique()
     chapas_013 = df_relatorio_final[df_relatorio_final['evento_sugerido'] == 'EVE013']['chapa_brasil'].unique()
     txt = []
@@ -83,32 +31,9 @@ def analisar_divergencias_info(brasil_limpo, espanha_historico):
     if chapas_013.size > 0:
         if txt: txt.append("\n")
         txt.extend(["--------------EVE013------------", ';'.join(chapas_013)])
-    return df_relatorio_final, "\n".join(txt)
+    return "\n".join(txt)
 
-@st.cache_data
-def analisar_demissoes(brasil_limpo, espanha_historico):
-    eventos_demissao = ['eve005', 'eve008', 'eve009', 'eve010', 'eve011', 'eve024', 'eve025', 'eve026', 'eve027']
-    if 'dt_pagto_rescisao' not in brasil_limpo.columns:
-        return pd.DataFrame({'Erro': ["A coluna 'DTPAGTORESCISAO' não foi encontrada na Base RM."]}), ""
-    brasil_recente = brasil_limpo.sort_values('data_efetiva', ascending=False).drop_duplicates('id_sistema_local', keep='first')
-    brasil_recente['evento_codigo'] = brasil_recente['motivo_evento'].astype(str).str.split('-').str[0].str.strip().str.lower()
-    colaboradores_demitidos_br = brasil_recente[brasil_recente['evento_codigo'].isin(eventos_demissao)].copy()
-    if colaboradores_demitidos_br.empty: return pd.DataFrame(), ""
-    df_merged = pd.merge(colaboradores_demitidos_br, espanha_historico[['id_sistema_local', 'status_empregado']], on='id_sistema_local', how='left', suffixes=('_br', '_es'))
-    pendencias_status = df_merged[df_merged['status_empregado_es'] == 'Activo'].copy()
-    if pendencias_status.empty: return pd.DataFrame(), ""
-    pendencias_status.dropna(subset=['dt_pagto_rescisao'], inplace=True)
-    data_limite = datetime.now() - timedelta(days=5)
-    pendencias_finais = pendencias_status[pendencias_status['dt_pagto_rescisao'] < data_limite].copy()
-    if pendencias_finais.empty: return pd.DataFrame(), ""
-    df_relatorio = pendencias_finais.rename(columns={
-        'chapa': 'chapa_brasil', 'nome': 'nome_completo', 'status_empregado_br': 'status_brasil',
-        'status_empregado_es': 'status_espanha', 'motivo_evento': 'evento_demissao_brasil',
-        'dt_pagto_rescisao': 'data_pagamento_rescisao'
-    })
-    colunas_finais_relatorio = ['id_sistema_local', 'chapa_brasil', 'nome_completo', 'status_brasil', 'status_espanha', 'evento_demissao_brasil', 'data_pagamento_rescisao']
-    df_relatorio = df_relatorio[colunas_finais_relatorio]
-    df_relatorio['evento_codigo'] = df_relatorio['evento_demissao_brasil'].astype(str).str.split('-').str[0].str.strip()
+def gerar_txt_demissoes(df_relatorio):
     eventos_encontrados = sorted(df_relatorio['evento_codigo'].unique())
     conteudo_txt = []
     for evento in eventos_encontrados:
@@ -117,4 +42,178 @@ def analisar_demissoes(brasil_limpo, espanha_historico):
             if conteudo_txt: conteudo_txt.append("\n")
             conteudo_txt.append(f"--------------{evento.upper()}------------")
             conteudo_txt.append(';'.join(chapas))
-    return df_relatorio, "\n".join(conteudo_txt)
\ No newline at end of file
+    return "\n".join(conteudo_txt)
+
+def _relatorio_admissoes(pendencias, espanha_historico, as_of=None):
+    lista_pendencias = []
+    pendencias_eve001, pendencias_eve003_023 = pendencias['eve001'], pendencias['eve003_023']
+    if not pendencias_eve001.empty:
+        df_eve001 = pd.DataFrame({
+            'chapa': pendencias_eve001[coluna('chapa', 'br_ativo_local')],
+            'nome': pendencias_eve001[coluna('nome', 'br_ativo_local')],
+            'data_admissao': pendencias_eve001[coluna('data_admissao', 'br_ativo_local')],
+            'evento_sugerido': 'EVE001 - Nova Contratação',
+        })
+        # Recontratação ou troca de ID: o colaborador pode já existir na Espanha com outro id_sistema_local.
+        df_eve001 = df_eve001.join(indice_candidatos(espanha_historico).melhores(
+            df_eve001['nome'], df_eve001['data_admissao'],
+            pendencias_eve001[coluna('nacionalidade', 'br_ativo_local')], index=df_eve001.index, as_of=as_of))
+        lista_pendencias.append(df_eve001)
+    if not pendencias_eve003_023.empty:
+        lista_pendencias.append(pd.DataFrame({
+            'chapa': pendencias_eve003_023[coluna('chapa', 'br_ativo_local')],
+            'nome': pendencias_eve003_023[coluna('nome', 'br_ativo_local')],
+            'evento_sugerido': 'VERIFICAR: EVE003/023 - Ativo no BR, Terminado na ES',
+            'status_brasil': pendencias_eve003_023[coluna('status_empregado', 'br_ativo_local')],
+            'status_espanha': pendencias_eve003_023[coluna('status_empregado', 'es_local')],
+        }))
+    if not lista_pendencias: return pd.DataFrame(), ""
+    df_relatorio_final = pd.concat(lista_pendencias, ignore_index=True)
+    df_relatorio_final['chapa'] = renderizar_chave(df_relatorio_final['chapa'])
+    return df_relatorio_final, gerar_txt_admissoes(df_relatorio_final)
+
+# Memoização com backend plugável (memoizacao.py): LRU em memória, disco ou o cache do Streamlit no app.
+# As funções públicas resolvem a data de referência, o 'as_of' e o motor antes, para que entrem
+# na chave do cache junto com a impressão digital das bases e os limites de dias.
+# as_of: reproduz a análise como estaria nessa data (histórico até a data e janelas contadas
+# a partir dela); a data de referência, se não for informada, passa a ser o próprio as_of.
+# particoes: concilia as bases em partições por id_sistema_local, em processos paralelos
+# (mesmo resultado da execução serial; padrão: ANALISE_PARTICOES ou 1).
+@memoizar
+@medir_etapa('analise.admissoes')
+def _analisar_admissoes(brasil_limpo, espanha_historico, data_referencia, dias_limite_admissao, motor, as_of, particoes):
+    pendencias = selecionar_pendencias(brasil_limpo, espanha_historico, ['eve001', 'eve003_023'], data_referencia,
+                                       dias_limite_admissao=dias_limite_admissao, motor=motor, as_of=as_of, particoes=particoes)
+    return _relatorio_admissoes(pendencias, espanha_historico, as_of)
+
+def analisar_admissoes_recontratacoes(brasil_limpo, espanha_historico, data_referencia=None,
+                                      dias_limite_admissao=DIAS_LIMITE_ADMISSAO, motor=None, as_of=None, particoes=None):
+    return _analisar_admissoes(brasil_limpo, espanha_historico, data_de_referencia(data_referencia, as_of), dias_limite_admissao,
+                               resolver_motor(motor), resolver_as_of(as_of), resolver_particoes(particoes))
+
+# Tratamento de valores nulos na comparação BR x ES:
+#   'sempre'  -> qualquer nulo conta como divergência (inclusive nulo x nulo);
+#   'um_lado' -> diverge apenas quando só um dos lados é nulo;
+#   'ignorar' -> pares com algum nulo nunca são divergência.
+TRATAMENTOS_NAN = ('sempre', 'um_lado', 'ignorar')
+
+def calcular_divergencias(df_merged, colunas_para_comparar=COLUNAS_PARA_COMPARAR, tratamento_nan='sempre'):
+    if tratamento_nan not in TRATAMENTOS_NAN:
+        raise ValueError(f"tratamento_nan inválido: '{tratamento_nan}'. Use um de {TRATAMENTOS_NAN}.")
+    colunas_saida = ['id_sistema_local', 'chapa', 'nome', 'campo_divergente', 'valor_brasil', 'valor_espanha']
+    colunas = [col for col in colunas_para_comparar if f"{col}_br" in df_merged.columns and f"{col}_es" in df_merged.columns]
+    if df_merged.empty or not colunas:
+        return pd.DataFrame(columns=colunas_saida)
+
+    df_merged = df_merged.reset_index(drop=True)
+    # Um único melt por lado empilha todos os campos: a linha i do campo k fica na
+    # posição k * len(df_merged) + i, com o índice original preservado.
+    longo = df_merged[[f"{col}_br" for col in colunas]].set_axis(colunas, axis=1).melt(
+        var_name='campo_divergente', value_name='valor_brasil', ignore_index=False)
+    longo['valor_espanha'] = df_merged[[f"{col}_es" for col in colunas]].set_axis(colunas, axis=1).melt(
+        value_name='valor_espanha', ignore_index=False)['valor_espanha'].to_numpy()
+
+    # Com colunas categóricas o melt pode preservar o dtype 'category'; a comparação
+    # e o relatório trabalham sobre os valores em si.
+    longo['valor_brasil'] = longo['valor_brasil'].astype(object)
+    divergente = longo['valor_brasil'].ne(longo['valor_espanha'])
+    nulo_br, nulo_es = longo['valor_brasil'].isna(), longo['valor_espanha'].isna()
+    if tratamento_nan == 'um_lado':
+        divergente &= ~(nulo_br & nulo_es)
+    elif tratamento_nan == 'ignorar':
+        divergente &= ~(nulo_br | nulo_es)
+    longo = longo[divergente]
+
+    coluna_chapa = 'chapa' if 'chapa' in df_merged.columns else 'chapa_br'
+    coluna_nome = next((col for col in ['nome_br', 'nome_es', 'nome'] if col in df_merged.columns), None)
+    identificacao = pd.DataFrame({
+        'id_sistema_local': df_merged['id_sistema_local'],
+        'chapa': df_merged[coluna_chapa] if coluna_chapa in df_merged.columns else np.nan,
+        'nome': df_merged[coluna_nome] if coluna_nome else np.nan,
+    }).loc[longo.index]
+    return pd.concat([identificacao, longo], axis=1)[colunas_saida]
+
+def _relatorio_divergencias(pendencias):
+    pares = pendencias['divergencia_cadastro']
+    if pares.empty: return pd.DataFrame(), ""
+    # Mesmo layout do merge BR x ES com sufixos: chapa_br, nome_br, <campo>_br, <campo>_es.
+    renomear = {coluna('chapa', 'br_ativo'): 'chapa_br', coluna('nome', 'br_ativo'): 'nome_br'}
+    for col in COLUNAS_PARA_COMPARAR:
+        renomear.update({coluna(col, 'br_ativo'): f"{col}_br", coluna(col, 'es_ativo'): f"{col}_es"})
+    df_merged = pares[[col for col in renomear if col in pares.columns]].rename(columns=renomear).reset_index()
+    with etapa('divergencias.comparacao', linhas_entrada=len(df_merged)) as registro:
+        df_relatorio_final = calcular_divergencias(df_merged, COLUNAS_PARA_COMPARAR, tratamento_nan='sempre')
+        registro.linhas_saida = len(df_relatorio_final)
+    if df_relatorio_final.empty: return pd.DataFrame(), ""
+    df_relatorio_final = df_relatorio_final.rename(columns={'chapa': 'chapa_brasil'})[
+        ['id_sistema_local', 'chapa_brasil', 'nome', 'valor_brasil', 'valor_espanha', 'campo_divergente']].reset_index(drop=True)
+    df_relatorio_final['evento_sugerido'] = np.where(df_relatorio_final['campo_divergente'] == 'business_unit', 'EVE013', 'EVE012')
+    df_relatorio_final['id_sistema_local'] = renderizar_chave(df_relatorio_final['id_sistema_local'])
+    df_relatorio_final['chapa_brasil'] = renderizar_chave(df_relatorio_final['chapa_brasil'])
+    return df_relatorio_final, gerar_txt_divergencias(df_relatorio_final)
+
+@memoizar
+@medir_etapa('analise.divergencias')
+def _analisar_divergencias(brasil_limpo, espanha_historico, motor, as_of, particoes):
+    pendencias = selecionar_pendencias(brasil_limpo, espanha_historico, ['divergencia_cadastro'], None, motor=motor, as_of=as_of,
+                                       particoes=particoes)
+    return _relatorio_divergencias(pendencias)
+
+def analisar_divergencias_info(brasil_limpo, espanha_historico, motor=None, as_of=None, particoes=None):
+    return _analisar_divergencias(brasil_limpo, espanha_historico, resolver_motor(motor), resolver_as_of(as_of),
+                                  resolver_particoes(particoes))
+
+ERRO_SEM_RESCISAO = pd.DataFrame({'Erro': ["A coluna 'DTPAGTORESCISAO' não foi encontrada na Base RM."]})
+
+def _relatorio_demissoes(pendencias):
+    pendencias = pendencias['demissao']
+    # Uma linha por registro 'Activo' do colaborador no histórico da Espanha.
+    pendencias = pendencias.loc[pendencias.index.repeat(pendencias[coluna('registros', 'es_ativo')].astype(int))]
+    if pendencias.empty: return pd.DataFrame(), ""
+    df_relatorio = pd.DataFrame({
+        'chapa_brasil': pendencias[coluna('chapa', 'br')], 'nome_completo': pendencias[coluna('nome', 'br')],
+        'status_brasil': pendencias[coluna('status_empregado', 'br')], 'status_espanha': pendencias[coluna('status_empregado', 'es_ativo')],
+        'evento_demissao_brasil': pendencias[coluna('motivo_evento', 'br')],
+        'data_pagamento_rescisao': pendencias[coluna('dt_pagto_rescisao', 'br')],
+    }).reset_index()
+    df_relatorio['id_sistema_local'] = renderizar_chave(df_relatorio['id_sistema_local'])
+    df_relatorio['chapa_brasil'] = renderizar_chave(df_relatorio['chapa_brasil'])
+    # Código de evento extraído na carga (core_processing.codificar_eventos); no relatório fica como texto.
+    df_relatorio['evento_codigo'] = pendencias[coluna('evento_codigo', 'br')].astype(str).to_numpy()
+    return df_relatorio, gerar_txt_demissoes(df_relatorio)
+
+@memoizar
+@medir_etapa('analise.demissoes')
+def _analisar_demissoes(brasil_limpo, espanha_historico, data_referencia, dias_limite_rescisao, motor, as_of, particoes):
+    if 'dt_pagto_rescisao' not in brasil_limpo.columns:
+        return ERRO_SEM_RESCISAO.copy(), ""
+    pendencias = selecionar_pendencias(brasil_limpo, espanha_historico, ['demissao'], data_referencia,
+                                       dias_limite_rescisao=dias_limite_rescisao, motor=motor, as_of=as_of, particoes=particoes)
+    return _relatorio_demissoes(pendencias)
+
+def analisar_demissoes(brasil_limpo, espanha_historico, data_referencia=None,
+                       dias_limite_rescisao=DIAS_LIMITE_RESCISAO, motor=None, as_of=None, particoes=None):
+    return _analisar_demissoes(brasil_limpo, espanha_historico, data_de_referencia(data_referencia, as_of), dias_limite_rescisao,
+                               resolver_motor(motor), resolver_as_of(as_of), resolver_particoes(particoes))
+
+@memoizar
+@medir_etapa('analise.pendencias')
+def _analisar_pendencias(brasil_limpo, espanha_historico, data_referencia, dias_limite_admissao, dias_limite_rescisao, motor,
+                         as_of, particoes):
+    # As três análises numa passada só: uma base de conciliação com todas as visões.
+    com_rescisao = 'dt_pagto_rescisao' in brasil_limpo.columns
+    regras = ['eve001', 'eve003_023', 'divergencia_cadastro'] + (['demissao'] if com_rescisao else [])
+    pendencias = selecionar_pendencias(brasil_limpo, espanha_historico, regras, data_referencia,
+                                       dias_limite_admissao, dias_limite_rescisao, motor, as_of, particoes)
+    return {
+        'admissoes': _relatorio_admissoes(pendencias, espanha_historico, as_of),
+        'divergencias': _relatorio_divergencias(pendencias),
+        'demissoes': _relatorio_demissoes(pendencias) if com_rescisao else (ERRO_SEM_RESCISAO.copy(), ""),
+    }
+
+def analisar_pendencias(brasil_limpo, espanha_historico, data_referencia=None,
+                        dias_limite_admissao=DIAS_LIMITE_ADMISSAO, dias_limite_rescisao=DIAS_LIMITE_RESCISAO, motor=None,
+                        as_of=None, particoes=None):
+    return _analisar_pendencias(brasil_limpo, espanha_historico, data_de_referencia(data_referencia, as_of),
+                                dias_limite_admissao, dias_limite_rescisao, resolver_motor(motor), resolver_as_of(as_of),
+                                resolver_particoes(particoes))
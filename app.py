@@ -1,178 +1,340 @@
 import streamlit as st # type: ignore
 import pandas as pd # type: ignore
-import plotly.express as px # type: ignore
-from io import BytesIO
 from datetime import datetime
 import textwrap
 
-from core_processing import load_and_prepare_data
-from analysis_functions import analisar_admissoes_recontratacoes, analisar_divergencias_info, analisar_demissoes
+from core_processing import load_and_prepare_data, ConjuntoDados, ativar_copy_on_write
+from analysis_functions import analisar_admissoes_recontratacoes, analisar_divergencias_info, analisar_demissoes, analisar_pendencias
+from reconciliacao import motores_disponiveis, resolver_motor, data_de_referencia
+from historico_resultados import contagens_por_execucao, itens, historico_da_chave
+from precalculo import precalculo_atual, abrir_precalculo
+from navegacao_relatorio import IndiceRelatorio
+from instrumentacao import ColetorMemoria, adicionar_coletor, remover_coletor
+import memoizacao
+from memoizacao import impressao_dataframe
+from exportacao import FORMATOS_EXPORTACAO, relatorio_em_bytes
 
-st.set_page_config(
-    layout="wide",
-    page_title="Análise de Colaboradores",
-    initial_sidebar_state="expanded"
-)
+# O Streamlit executa este script como __main__. Os processos das partições (particionamento.py,
+# iniciados por 'spawn') o importam como __mp_main__: para eles valem só os imports acima.
+if __name__ == '__main__':
+    # Opção global do pandas, ligada pelo ponto de entrada (core_processing.ativar_copy_on_write).
+    ativar_copy_on_write()
 
-st.title("🔎 Ferramenta de Análise de Sincronia de Colaboradores")
-
-with st.sidebar:
-    st.image("imgs/login_logo.png", width=250)
-    st.header("Painel de Controle")
-    menu_selecao = st.radio(
-        "**Menu de análises:**",
-        options=["Página inicial", "Admissões & Recontratações", "Informações pessoais & Informações de cargo", "Demissões"],
-        captions=["Visão geral", "Eventos EVE001 e EVE003", "Eventos EVE012 e EVE013", "Eventos de desligamento"]
+    st.set_page_config(
+        layout="wide",
+        page_title="Análise de Colaboradores",
+        initial_sidebar_state="expanded"
     )
-    with st.expander("🎨 Mudar o Tema"):
-        st.write("""
-        Para alternar entre o modo claro e escuro:
-        1. Clique no menu **☰** no canto superior direito da tela.
-        2. Clique em **Settings**.
-        3. Na seção **Theme**, escolha entre 'Light' (Claro) e 'Dark' (Escuro).
-        """)
-    st.info("Desenvolvido por guilherme.campos")
 
-@st.cache_data
-def carregar_dados_wrapper():
-    return load_and_prepare_data()
+    st.title("🔎 Ferramenta de Análise de Sincronia de Colaboradores")
+
+    # No app as análises ficam no cache do Streamlit (compartilhado entre sessões e limpo pelo "Clear cache").
+    if not isinstance(memoizacao.backend_atual(), memoizacao.BackendStreamlit):
+        memoizacao.configurar(memoizacao.BackendStreamlit())
+
+    with st.sidebar:
+        st.image("imgs/login_logo.png", width=250)
+        st.header("Painel de Controle")
+        menu_selecao = st.radio(
+            "**Menu de análises:**",
+            options=["Página inicial", "Admissões & Recontratações", "Informações pessoais & Informações de cargo", "Demissões",
+                     "Histórico de pendências"],
+            captions=["Visão geral", "Eventos EVE001 e EVE003", "Eventos EVE012 e EVE013", "Eventos de desligamento",
+                      "Tendência e idade das pendências"]
+        )
+        with st.expander("🎨 Mudar o Tema"):
+            st.write("""
+            Para alternar entre o modo claro e escuro:
+            1. Clique no menu **☰** no canto superior direito da tela.
+            2. Clique em **Settings**.
+            3. Na seção **Theme**, escolha entre 'Light' (Claro) e 'Dark' (Escuro).
+            """)
+        recarregar_bases = st.button("🔄 Recarregar bases", help="Lê novamente os arquivos da pasta 'data' e descarta as análises em cache.")
+        opcoes_motor = motores_disponiveis()
+        motor = st.selectbox("⚙️ Motor de execução", options=opcoes_motor,
+                             index=opcoes_motor.index(resolver_motor()) if resolver_motor() in opcoes_motor else 0,
+                             help="'duckdb' executa as regras em SQL (várias threads, spill em disco) com os mesmos resultados. "
+                                  "Aparece quando o pacote opcional duckdb está instalado.")
+        medir_etapas = st.toggle("⏱️ Medir etapas", help="Mostra tempo, linhas e memória de cada etapa executada nesta interação.")
+        painel_etapas = st.empty()
+        painel_precalculo = st.empty()
+        st.info("Desenvolvido por guilherme.campos")
+
+    # O coletor vale só para o contexto desta sessão: outras sessões não são medidas nem misturadas aqui.
+    coletor_etapas = st.session_state.setdefault('coletor_etapas', ColetorMemoria())
+    coletor_etapas.limpar()
+    if medir_etapas:
+        adicionar_coletor(coletor_etapas)
+    else:
+        remover_coletor(coletor_etapas)
 
-def to_excel(df):
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='Relatorio')
-    return output.getvalue()
+    # cache_resource devolve sempre os mesmos objetos: a memoização das análises os
+    # identifica sem precisar hashear as bases a cada interação.
+    @st.cache_resource
+    def carregar_dados_wrapper():
+        return load_and_prepare_data()
 
-def wrap_labels(labels, width=20):
-    return [ '<br>'.join(textwrap.wrap(str(label), width=width)) for label in labels ]
+    # Resultados gravados pelo pré-cálculo (python precalculo.py). Cada identificador é lido uma
+    # vez; quando o pré-cálculo troca de pasta, o novo identificador entra no cache.
+    @st.cache_resource(max_entries=2)
+    def carregar_precalculo(identificador):
+        return abrir_precalculo(identificador)
 
-# --- LÓGICA DE EXIBIÇÃO DAS PÁGINAS ---
+    # O arquivo só é gerado quando o usuário pede e fica em cache por (versão dos dados, análise, filtro, busca,
+    # ordenação, formato): trocar o filtro ou voltar a uma combinação já gerada não reconstrói a planilha.
+    @st.cache_data(max_entries=32, show_spinner="Gerando arquivo...")
+    def gerar_arquivo_relatorio(_indice, _posicoes, versao, analise, filtro, busca, ordenar_por, decrescente, formato):
+        return relatorio_em_bytes(_indice.linhas(_posicoes), formato)
 
-brasil_df, espanha_df = carregar_dados_wrapper()
+    TAMANHOS_PAGINA = [50, 100, 500, 1000]
 
-if menu_selecao == "Página inicial":
-    st.header("Dashboard Geral de Pendências", divider='rainbow')
+    # Um índice por resultado (versão dos dados + análise), compartilhado entre as sessões.
+    @st.cache_resource(max_entries=8)
+    def indexar_relatorio(_df, versao, analise, coluna_filtro):
+        return IndiceRelatorio(_df, coluna_filtro)
 
-    if brasil_df is None or espanha_df is None:
-        st.error("Falha Crítica ao carregar os dados. Verifique os arquivos na pasta 'data'.")
+    def contar_por_valor(serie):
+        # Colunas categóricas listam também as categorias sem ocorrência no relatório.
+        contagem = serie.value_counts()
+        return contagem[contagem > 0].reset_index()
+
+    def wrap_labels(labels, width=20):
+        return [ '<br>'.join(textwrap.wrap(str(label), width=width)) for label in labels ]
+
+    # --- LÓGICA DE EXIBIÇÃO DAS PÁGINAS ---
+
+    if recarregar_bases:
+        carregar_precalculo.clear()
+    # Com um pré-cálculo das bases atuais as páginas só leem os resultados gravados; sem ele
+    # (ou com bases mais novas que o pré-cálculo) as bases são carregadas e as análises feitas aqui.
+    precalculo = carregar_precalculo(precalculo_atual())
+    if precalculo is not None and precalculo.desatualizado():
+        precalculo = None
+
+    brasil_df = espanha_df = None
+    if precalculo is None and menu_selecao != "Histórico de pendências":
+        conjunto_dados = carregar_dados_wrapper()
+        # Arquivos novos na pasta 'data' (ou o botão da barra lateral) invalidam as bases e as análises feitas sobre elas.
+        if recarregar_bases or (isinstance(conjunto_dados, ConjuntoDados) and conjunto_dados.desatualizado()):
+            if isinstance(conjunto_dados, ConjuntoDados):
+                conjunto_dados.invalidar()
+            carregar_dados_wrapper.clear()
+            conjunto_dados = carregar_dados_wrapper()
+        brasil_df, espanha_df = conjunto_dados
+        # Os prazos das análises dependem do dia: a mesma carga gera outro resultado amanhã. Sem a
+        # impressão da carga (bases lidas sem cache), vale a identidade dos objetos do cache_resource,
+        # que mudam a cada recarga.
+        if isinstance(conjunto_dados, ConjuntoDados):
+            versao_dados = f"{conjunto_dados.impressao}-{data_de_referencia().date()}"
+        elif brasil_df is not None and espanha_df is not None:
+            versao_dados = f"{impressao_dataframe(brasil_df)}-{impressao_dataframe(espanha_df)}-{data_de_referencia().date()}"
+        else:
+            versao_dados = None
     else:
-        with st.spinner("Calculando totais de pendências..."):
-            df_admissoes, _ = analisar_admissoes_recontratacoes(brasil_df, espanha_df)
-            df_divergencias, _ = analisar_divergencias_info(brasil_df, espanha_df)
-            df_demissoes, _ = analisar_demissoes(brasil_df, espanha_df)
-
-        total_admissoes = len(df_admissoes)
-        total_divergencias = len(df_divergencias)
-        total_demissoes = len(df_demissoes)
-        total_pendencias = total_admissoes + total_divergencias + total_demissoes
-
-        st.subheader("Resumo Geral")
-        cols = st.columns(4)
-        cols[0].metric("Total de Pendências", f"{total_pendencias}")
-        cols[1].metric("Admissões / Recontratações", f"{total_admissoes}")
-        cols[2].metric("Divergências de Cadastro", f"{total_divergencias}")
-        cols[3].metric("Pendências de Demissão", f"{total_demissoes}")
+        versao_dados = None if precalculo is None else precalculo.identificador
+    bases_indisponiveis = precalculo is None and (brasil_df is None or espanha_df is None)
+
+    if precalculo is not None:
+        painel_precalculo.caption(f"⚡ Resultados pré-calculados em {precalculo.manifesto['gerado_em'].replace('T', ' ')}.")
+
+    if menu_selecao == "Página inicial":
+        st.header("Dashboard Geral de Pendências", divider='rainbow')
+
+        if bases_indisponiveis:
+            st.error("Falha Crítica ao carregar os dados. Verifique os arquivos na pasta 'data'.")
+        else:
+            with st.spinner("Calculando totais de pendências..."):
+                if precalculo is not None:
+                    pendencias = precalculo.relatorios()
+                else:
+                    pendencias = analisar_pendencias(brasil_df, espanha_df, motor=motor)
+                df_admissoes, df_divergencias, df_demissoes = (pendencias[nome][0] for nome in ['admissoes', 'divergencias', 'demissoes'])
+
+            total_admissoes = len(df_admissoes)
+            total_divergencias = len(df_divergencias)
+            total_demissoes = len(df_demissoes)
+            total_pendencias = total_admissoes + total_divergencias + total_demissoes
+
+            st.subheader("Resumo Geral")
+            cols = st.columns(4)
+            cols[0].metric("Total de Pendências", f"{total_pendencias}")
+            cols[1].metric("Admissões / Recontratações", f"{total_admissoes}")
+            cols[2].metric("Divergências de Cadastro", f"{total_divergencias}")
+            cols[3].metric("Pendências de Demissão", f"{total_demissoes}")
         
-        st.subheader("Distribuição das Pendências")
-        col1, col2 = st.columns([0.4, 0.6])
-
-        with col1:
-            summary_data = {
-                'Tipo de Análise': ['Admissões & Recontratações', 'Info. Pessoais & Cargo', 'Demissões'],
-                'Quantidade': [total_admissoes, total_divergencias, total_demissoes]
-            }
-            df_summary = pd.DataFrame(summary_data)
-            df_summary = df_summary[df_summary['Quantidade'] > 0]
-
-            if not df_summary.empty:
-                fig = px.pie(df_summary, names='Tipo de Análise', values='Quantidade', hole=0.5,
-                             color_discrete_sequence=px.colors.qualitative.Pastel)
-                fig.update_traces(textposition='inside', textinfo='percent+label', pull=[0.05, 0.05, 0.05])
-                fig.update_layout(showlegend=False, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
-                                  margin=dict(t=20, b=20, l=20, r=20))
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.success("🎉 Ótima notícia! Nenhuma pendência encontrada em todas as análises.")
+            st.subheader("Distribuição das Pendências")
+            col1, col2 = st.columns([0.4, 0.6])
+
+            with col1:
+                summary_data = {
+                    'Tipo de Análise': ['Admissões & Recontratações', 'Info. Pessoais & Cargo', 'Demissões'],
+                    'Quantidade': [total_admissoes, total_divergencias, total_demissoes]
+                }
+                df_summary = pd.DataFrame(summary_data)
+                df_summary = df_summary[df_summary['Quantidade'] > 0]
+
+                if not df_summary.empty:
+                    import plotly.express as px # type: ignore
+                    fig = px.pie(df_summary, names='Tipo de Análise', values='Quantidade', hole=0.5,
+                                 color_discrete_sequence=px.colors.qualitative.Pastel)
+                    fig.update_traces(textposition='inside', textinfo='percent+label', pull=[0.05, 0.05, 0.05])
+                    fig.update_layout(showlegend=False, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+                                      margin=dict(t=20, b=20, l=20, r=20))
+                    st.plotly_chart(fig, use_container_width=True)
+                else:
+                    st.success("🎉 Ótima notícia! Nenhuma pendência encontrada em todas as análises.")
         
-        with col2:
-             st.markdown("""
-            Esta plataforma foi desenhada para simplificar e automatizar a validação de dados de colaboradores entre as bases do Brasil e da Espanha.
-            Navegue pelo **Menu de Análises** na barra lateral para executar as validações necessárias para cada caso.
+            with col2:
+                 st.markdown("""
+                Esta plataforma foi desenhada para simplificar e automatizar a validação de dados de colaboradores entre as bases do Brasil e da Espanha.
+                Navegue pelo **Menu de Análises** na barra lateral para executar as validações necessárias para cada caso.
             
-            - **Admissões & Recontratações:** Verifica novos colaboradores e reativações.
-            - **Informações Pessoais & de Cargo:** Compara campos-chave para garantir consistência.
-            - **Demissões:** Identifica colaboradores desligados no Brasil que ainda constam como ativos na Espanha.
-            """)
-else:
-    if brasil_df is None or espanha_df is None:
-        st.error("Falha Crítica ao carregar os dados. Verifique os arquivos na pasta 'data'.")
-    else:
-        agora = datetime.now().strftime('%d%m%Y_%H%M')
-        df_relatorio, txt_content, filename_base, header, metrica_label = pd.DataFrame(), "", "", "", ""
-
-        with st.spinner("Executando análise... Por favor, aguarde."):
-            if menu_selecao == "Admissões & Recontratações":
-                header, metrica_label = "Admissões & Recontratações", "Total de Pendências"
-                df_relatorio, txt_content = analisar_admissoes_recontratacoes(brasil_df, espanha_df)
-                filename_base = f"Admissoes_Recontratacoes_{agora}"
-            elif menu_selecao == "Informações pessoais & Informações de cargo":
-                header, metrica_label = "Divergências de Informações Pessoais e de Cargo", "Total de Divergências"
-                df_relatorio, txt_content = analisar_divergencias_info(brasil_df, espanha_df)
-                filename_base = f"Divergencias_Info_{agora}"
-            elif menu_selecao == "Demissões":
-                header, metrica_label = "Pendências de Demissão", "Total de Pendências"
-                df_relatorio, txt_content = analisar_demissoes(brasil_df, espanha_df)
-                filename_base = f"Pendencias_Demissao_{agora}"
-
-        st.header(header, divider='rainbow')
-        
-        if "Erro" in df_relatorio.columns:
-            st.error(df_relatorio["Erro"].iloc[0])
-        elif df_relatorio.empty:
-            st.success("✅ Nenhuma pendência ou divergência encontrada.")
+                - **Admissões & Recontratações:** Verifica novos colaboradores e reativações.
+                - **Informações Pessoais & de Cargo:** Compara campos-chave para garantir consistência.
+                - **Demissões:** Identifica colaboradores desligados no Brasil que ainda constam como ativos na Espanha.
+                """)
+    elif menu_selecao == "Histórico de pendências":
+        st.header("Histórico de Pendências", divider='rainbow')
+        # Lê só o histórico gravado pelas execuções (scripts run_*.py e run_lote.py), não as bases.
+        contagens = contagens_por_execucao()
+        if contagens.empty:
+            st.info("Nenhuma execução registrada ainda. O histórico é gravado a cada execução dos scripts run_*.py e do run_lote.py.")
         else:
-            st.subheader("📊 Dashboard Interativo")
+            col1, col2 = st.columns(2)
+            analise = col1.selectbox("Análise:", options=sorted(contagens['analise'].unique()))
+            contagens = contagens[contagens['analise'] == analise]
+            primeira, ultima = contagens['executado_em'].min().date(), contagens['executado_em'].max().date()
+            periodo = col2.date_input("Período:", value=(primeira, ultima), min_value=primeira, max_value=ultima)
+            if len(periodo) == 2:
+                contagens = contagens_por_execucao(analise, *periodo)
+
+            abertos, resolvidos = itens(analise, abertos=True), itens(analise, abertos=False)
+            cols = st.columns(3)
+            cols[0].metric("Pendências em aberto", f"{len(abertos)}")
+            cols[1].metric("Idade média (dias)", f"{abertos['dias_pendente'].mean():.1f}" if not abertos.empty else "0")
+            cols[2].metric("Resolvidas", f"{len(resolvidos)}")
+
             with st.container(border=True):
-                df_chart, fig = pd.DataFrame(), None
-                x_axis, y_axis, color, filter_col = None, None, None, None
-                
-                # --- LÓGICA RESTAURADA PARA DEFINIR filter_col ---
+                import plotly.express as px # type: ignore
+                fig = px.line(contagens, x='executado_em', y='pendencias', color='evento', markers=True)
+                fig.update_layout(xaxis_title=None, yaxis_title="Pendências", plot_bgcolor='rgba(0,0,0,0)',
+                                  paper_bgcolor='rgba(0,0,0,0)', legend_title_text="Evento")
+                st.plotly_chart(fig, use_container_width=True)
+
+            st.subheader("⏳ Pendências em aberto")
+            st.dataframe(abertos.drop(columns=['analise', 'resolvido_em']), hide_index=True, use_container_width=True)
+            st.subheader("✅ Pendências resolvidas")
+            st.dataframe(resolvidos.drop(columns=['analise']), hide_index=True, use_container_width=True)
+
+            chapa = st.text_input("🔎 Consultar chapa:", help="Mostra todas as execuções em que a chapa apareceu, em qualquer análise.")
+            if chapa.strip():
+                st.dataframe(historico_da_chave(chapa.strip()), hide_index=True, use_container_width=True)
+    else:
+        if bases_indisponiveis:
+            st.error("Falha Crítica ao carregar os dados. Verifique os arquivos na pasta 'data'.")
+        else:
+            agora = datetime.now().strftime('%d%m%Y_%H%M')
+            df_relatorio, txt_content, filename_base, header, metrica_label = pd.DataFrame(), "", "", "", ""
+
+            with st.spinner("Executando análise... Por favor, aguarde."):
                 if menu_selecao == "Admissões & Recontratações":
-                    df_chart, x_axis, y_axis, color, filter_col = df_relatorio['evento_sugerido'].value_counts().reset_index(), "evento_sugerido", "count", "#0083B8", "evento_sugerido"
+                    header, metrica_label = "Admissões & Recontratações", "Total de Pendências"
+                    df_relatorio, txt_content = (precalculo.relatorio('admissoes') if precalculo is not None
+                                                 else analisar_admissoes_recontratacoes(brasil_df, espanha_df, motor=motor))
+                    filename_base = f"Admissoes_Recontratacoes_{agora}"
                 elif menu_selecao == "Informações pessoais & Informações de cargo":
-                    df_chart, x_axis, y_axis, color, filter_col = df_relatorio['campo_divergente'].value_counts().reset_index(), "campo_divergente", "count", "#FF6347", "campo_divergente"
+                    header, metrica_label = "Divergências de Informações Pessoais e de Cargo", "Total de Divergências"
+                    df_relatorio, txt_content = (precalculo.relatorio('divergencias') if precalculo is not None
+                                                 else analisar_divergencias_info(brasil_df, espanha_df, motor=motor))
+                    filename_base = f"Divergencias_Info_{agora}"
                 elif menu_selecao == "Demissões":
-                    df_chart, x_axis, y_axis, color, filter_col = df_relatorio['evento_demissao_brasil'].value_counts().reset_index(), "evento_demissao_brasil", "count", "#4B0082", "evento_demissao_brasil"
+                    header, metrica_label = "Pendências de Demissão", "Total de Pendências"
+                    df_relatorio, txt_content = (precalculo.relatorio('demissoes') if precalculo is not None
+                                                 else analisar_demissoes(brasil_df, espanha_df, motor=motor))
+                    filename_base = f"Pendencias_Demissao_{agora}"
+
+            st.header(header, divider='rainbow')
+        
+            if "Erro" in df_relatorio.columns:
+                st.error(df_relatorio["Erro"].iloc[0])
+            elif df_relatorio.empty:
+                st.success("✅ Nenhuma pendência ou divergência encontrada.")
+            else:
+                st.subheader("📊 Dashboard Interativo")
+                with st.container(border=True):
+                    df_chart, fig = pd.DataFrame(), None
+                    x_axis, y_axis, color, filter_col = None, None, None, None
                 
-                if not df_chart.empty:
-                    total_registros = df_chart[y_axis].sum()
-                    df_chart['percentage_label'] = (df_chart[y_axis] / total_registros).map('{:.1%}'.format)
-                    df_chart[x_axis] = wrap_labels(df_chart[x_axis])
-                    fig = px.bar(df_chart, x=x_axis, y=y_axis, text='percentage_label', color_discrete_sequence=[color])
-                    fig.update_layout(
-                        xaxis_title=None, yaxis_visible=False, bargap=0.4, plot_bgcolor='rgba(0,0,0,0)',
-                        paper_bgcolor='rgba(0,0,0,0)', xaxis_tickangle=0, uniformtext_minsize=12,
-                        hovermode=False, dragmode=False
-                    )
-                    fig.update_traces(textfont_size=16, textposition="outside", cliponaxis=False)
-                    st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
-            
-            st.subheader("📄 Relatório Detalhado")
-            opcoes_filtro = ['Mostrar Todos'] + df_relatorio[filter_col].unique().tolist()
-            filtro_selecionado = st.selectbox("Filtrar relatório por categoria:", options=opcoes_filtro)
+                    # --- LÓGICA RESTAURADA PARA DEFINIR filter_col ---
+                    if menu_selecao == "Admissões & Recontratações":
+                        df_chart, x_axis, y_axis, color, filter_col = contar_por_valor(df_relatorio['evento_sugerido']), "evento_sugerido", "count", "#0083B8", "evento_sugerido"
+                    elif menu_selecao == "Informações pessoais & Informações de cargo":
+                        df_chart, x_axis, y_axis, color, filter_col = contar_por_valor(df_relatorio['campo_divergente']), "campo_divergente", "count", "#FF6347", "campo_divergente"
+                    elif menu_selecao == "Demissões":
+                        df_chart, x_axis, y_axis, color, filter_col = contar_por_valor(df_relatorio['evento_demissao_brasil']), "evento_demissao_brasil", "count", "#4B0082", "evento_demissao_brasil"
+                
+                    if not df_chart.empty:
+                        import plotly.express as px # type: ignore
+                        total_registros = df_chart[y_axis].sum()
+                        df_chart['percentage_label'] = (df_chart[y_axis] / total_registros).map('{:.1%}'.format)
+                        df_chart[x_axis] = wrap_labels(df_chart[x_axis])
+                        fig = px.bar(df_chart, x=x_axis, y=y_axis, text='percentage_label', color_discrete_sequence=[color])
+                        fig.update_layout(
+                            xaxis_title=None, yaxis_visible=False, bargap=0.4, plot_bgcolor='rgba(0,0,0,0)',
+                            paper_bgcolor='rgba(0,0,0,0)', xaxis_tickangle=0, uniformtext_minsize=12,
+                            hovermode=False, dragmode=False
+                        )
+                        fig.update_traces(textfont_size=16, textposition="outside", cliponaxis=False)
+                        st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
             
-            df_to_show = df_relatorio
-            if filtro_selecionado != 'Mostrar Todos':
-                df_to_show = df_relatorio[df_relatorio[filter_col] == filtro_selecionado].copy()
+                st.subheader("📄 Relatório Detalhado")
+                # Filtro, busca e ordenação consultam o índice do relatório; só a página atual vai para o navegador.
+                indice = indexar_relatorio(df_relatorio, versao_dados, menu_selecao, filter_col)
+                col_filtro, col_busca = st.columns(2)
+                filtro_selecionado = col_filtro.selectbox("Filtrar relatório por categoria:", options=['Mostrar Todos'] + indice.opcoes)
+                busca = col_busca.text_input("🔎 Buscar por chapa ou nome:").strip()
+                col_ordem, col_sentido, col_tamanho = st.columns([0.5, 0.2, 0.3])
+                ordenar_por = col_ordem.selectbox("Ordenar por:", options=['(ordem do relatório)'] + df_relatorio.columns.tolist())
+                ordenar_por = None if ordenar_por == '(ordem do relatório)' else ordenar_por
+                decrescente = col_sentido.toggle("Decrescente", disabled=ordenar_por is None)
+                tamanho_pagina = col_tamanho.selectbox("Linhas por página:", options=TAMANHOS_PAGINA, index=1)
+                posicoes = indice.consultar(None if filtro_selecionado == 'Mostrar Todos' else filtro_selecionado,
+                                            busca, ordenar_por, decrescente)
 
-            with st.container(border=True):
-                col1, col2 = st.columns([0.5, 0.5])
-                with col1:
-                    st.metric(label=metrica_label, value=f"{len(df_to_show)}", delta=f"de {len(df_relatorio)} no total", delta_color="off")
-                with col2:
-                    st.write("")
-                    btn1, btn2 = st.columns(2)
-                    btn1.download_button("📥 Baixar Relatório (.xlsx)", to_excel(df_to_show), f"{filename_base}_filtrado.xlsx", use_container_width=True)
-                    btn2.download_button("📥 Baixar Chapas (.txt)", txt_content, f"{filename_base}.txt", use_container_width=True)
+                with st.container(border=True):
+                    col1, col2 = st.columns([0.5, 0.5])
+                    with col1:
+                        st.metric(label=metrica_label, value=f"{len(posicoes)}", delta=f"de {len(df_relatorio)} no total", delta_color="off")
+                    with col2:
+                        formato = st.radio("Formato do relatório:", options=list(FORMATOS_EXPORTACAO), horizontal=True,
+                                           label_visibility="collapsed")
+                        extensao, mime = FORMATOS_EXPORTACAO[formato]
+                        btn1, btn2 = st.columns(2)
+                        chave_arquivo = (versao_dados, menu_selecao, filtro_selecionado, busca, ordenar_por, decrescente, formato)
+                        arquivos_gerados = st.session_state.setdefault('arquivos_gerados', set())
+                        area_relatorio = btn1.empty()
+                        if chave_arquivo not in arquivos_gerados and area_relatorio.button(
+                                f"⚙️ Gerar Relatório ({extensao})", use_container_width=True):
+                            arquivos_gerados.add(chave_arquivo)
+                        if chave_arquivo in arquivos_gerados:
+                            area_relatorio.download_button(
+                                f"📥 Baixar Relatório ({extensao})", gerar_arquivo_relatorio(indice, posicoes, *chave_arquivo),
+                                f"{filename_base}_filtrado{extensao}", mime=mime, use_container_width=True)
+                        btn2.download_button("📥 Baixar Chapas (.txt)", txt_content, f"{filename_base}.txt", use_container_width=True)
             
-            st.dataframe(df_to_show, use_container_width=True)
\ No newline at end of file
+                total_paginas = max(1, -(-len(posicoes) // tamanho_pagina))
+                # O rótulo muda com o total de páginas: um novo filtro ou busca volta para a página 1.
+                pagina = st.number_input(f"Página (de {total_paginas}):", min_value=1, max_value=total_paginas, value=1, step=1)
+                st.dataframe(indice.pagina(posicoes, pagina, tamanho_pagina), use_container_width=True)
+                if len(posicoes) > tamanho_pagina:
+                    inicio_pagina = (pagina - 1) * tamanho_pagina
+                    st.caption(f"Linhas {inicio_pagina + 1}–{min(inicio_pagina + tamanho_pagina, len(posicoes))} de {len(posicoes)}.")
+
+    if medir_etapas:
+        with painel_etapas.container():
+            df_etapas = coletor_etapas.como_dataframe()
+            if df_etapas.empty:
+                st.caption("Nenhuma etapa executada nesta interação (resultados vieram do cache).")
+            else:
+                st.dataframe(df_etapas[['etapa', 'segundos', 'linhas_entrada', 'linhas_saida', 'memoria_delta_mb']],
+                             hide_index=True, use_container_width=True)
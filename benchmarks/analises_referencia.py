@@ -0,0 +1,501 @@
+import contextlib
+import os
+import warnings
+from datetime import datetime as _datetime, time, timedelta
+
+import pandas as pd # type: ignore
+import numpy as np # type: ignore
+
+# Implementação original das análises (commit 06413d7, o baseline), congelada para o
+# verificar_equivalencia.py: o load_and_prepare_data do core_processing.py, as três análises
+# do analysis_functions.py e o corpo dos três run_*.py, copiados sem alteração. Só ficaram de
+# fora os decoradores do Streamlit e a entrada e saída dos scripts (prints, pasta de saída,
+# Excel e TXT gravados): cada script recebe as bases e devolve o relatório e o texto do TXT.
+# Nada aqui importa reconciliacao.py, analysis_functions.py ou os run_*.py atuais, e nada
+# muda por otimização.
+#
+# As mudanças de comportamento feitas depois do baseline não entram no código congelado:
+# cada uma é uma diferença declarada em DIFERENCAS, aplicada às entradas ou ao ambiente das
+# funções originais. O verificar_equivalencia.py congela o efeito de cada diferença sobre os
+# relatórios originais e confere, a cada execução, que ele continua o mesmo.
+
+# O datetime.now() das funções originais devolve a data de referência (meio-dia).
+class datetime(_datetime):
+    agora = None
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.agora
+
+# --- core_processing.py (06413d7) ---
+
+def load_and_prepare_data():
+    print("--- CORE: Iniciando carga e preparação dos dados... ---")
+    data_path = 'data'
+    
+    try:
+        df_brasil_bruto = pd.read_excel(os.path.join(data_path, 'Base RM.xlsx'))
+        df_espanha_bruto = pd.read_excel(os.path.join(data_path, 'Base SF.xlsx'))
+    except FileNotFoundError as e:
+        print(f"ERRO: Arquivo base não encontrado. Verifique se 'Base RM.xlsx' e 'Base SF.xlsx' estão na pasta 'data/'.\nDetalhe: {e}")
+        return None, None
+    except Exception as e:
+        print(f"ERRO ao ler os arquivos base.\nDetalhe: {e}")
+        return None, None
+
+    colunas_brasil = {
+        'LOCAL SYSTEM ID': 'id_sistema_local', 'CHAPA': 'chapa', 'FIRST NAME': 'nome_parcial',
+        'LAST NAME': 'sobrenome', 'HIRE DATE': 'data_admissao', 'EFFECTIVE DATE': 'data_efetiva',
+        'STATUS': 'status_empregado', 'CONTRACT TYPE': 'tipo_contrato', 'JOB': 'cargo',
+        'FAMILY': 'familia', 'CATEGORY': 'categoria', 'EMPLOYMENT TYPE': 'tipo_empregado',
+        'EVENT REASON': 'motivo_evento', 'NATIONALITY': 'nacionalidade', 'EXPA/LOCAL': 'expa_local',
+        'BUSINESS UNIT': 'business_unit',
+        'DTPAGTORESCISAO': 'dt_pagto_rescisao' # <-- NOVA COLUNA ADICIONADA AQUI
+    }
+
+    colunas_espanha = {
+        'ID sist. nom. local': 'id_sistema_local', 'Nombre': 'nome_parcial', 'Primer apellido': 'sobrenome',
+        'Expa/Local': 'expa_local', 'Detalles de empleo Fecha de inicio original': 'data_admissao',
+        'Detalles de empleo Fecha de terminación de contrato': 'data_demissao', 'Fecha del evento': 'data_efetiva',
+        'Estado de empleado': 'status_empregado', 'Tipo de contrato': 'tipo_contrato', 'Puesto': 'cargo',
+        'Familia': 'familia', 'Categoría': 'categoria', 'Tipo empleado': 'tipo_empregado',
+        'Motivo del evento': 'motivo_evento', 'DG / DN corporativo': 'business_unit',
+        'Primera nacionalidad': 'nacionalidade'
+    }
+
+    brasil_limpo = df_brasil_bruto.rename(columns=colunas_brasil)
+    espanha_limpa = df_espanha_bruto.rename(columns=colunas_espanha)
+
+    if 'nome_parcial' in brasil_limpo.columns and 'sobrenome' in brasil_limpo.columns:
+        brasil_limpo['nome'] = brasil_limpo['nome_parcial'].astype(str) + ' ' + brasil_limpo['sobrenome'].astype(str)
+    if 'nome_parcial' in espanha_limpa.columns and 'sobrenome' in espanha_limpa.columns:
+        espanha_limpa['nome'] = espanha_limpa['nome_parcial'].astype(str) + ' ' + espanha_limpa['sobrenome'].astype(str)
+
+    if 'chapa' not in brasil_limpo.columns and 'id_sistema_local' in brasil_limpo.columns:
+        brasil_limpo['chapa'] = brasil_limpo['id_sistema_local']
+    
+    # Adicionando a nova coluna à lista de datas para conversão
+    datas_brasil = ['data_admissao', 'data_efetiva', 'dt_pagto_rescisao']
+    for data in datas_brasil:
+        if data in brasil_limpo.columns:
+            brasil_limpo[data] = pd.to_datetime(brasil_limpo[data], errors='coerce')
+    
+    datas_espanha = ['data_admissao', 'data_efetiva', 'data_demissao']
+    for data in datas_espanha:
+        if data in espanha_limpa.columns:
+            espanha_limpa[data] = pd.to_datetime(espanha_limpa[data], errors='coerce')
+    
+    mapeamentos_abas = {
+        'status_empregado': 'Status', 'cargo': 'Cargo', 'familia': 'Familia', 'categoria': 'Categoria', 
+        'tipo_empregado': 'Tipo de empregado', 'tipo_contrato': 'Tipo de contrato', 'business_unit': 'Business'
+    }
+    caminho_mapeamento_excel = os.path.join(data_path, 'mapeamento_valores.xlsx')
+    for coluna, aba in mapeamentos_abas.items():
+        if coluna in brasil_limpo.columns:
+            try:
+                df_map = pd.read_excel(caminho_mapeamento_excel, sheet_name=aba)
+                map_dict = pd.Series(df_map.iloc[:, 1].values, index=df_map.iloc[:, 0]).to_dict()
+                brasil_limpo[coluna] = brasil_limpo[coluna].map(map_dict).fillna(brasil_limpo[coluna])
+            except Exception:
+                pass
+
+    for col in brasil_limpo.select_dtypes(include=['object']).columns:
+        brasil_limpo[col] = brasil_limpo[col].str.strip()
+    for col in espanha_limpa.select_dtypes(include=['object']).columns:
+        espanha_limpa[col] = espanha_limpa[col].str.strip()
+
+    key_columns = ['id_sistema_local', 'chapa']
+    for df_name, df in [('Brasil', brasil_limpo), ('Espanha', espanha_limpa)]:
+        for col in key_columns:
+            if col in df.columns:
+                df[col] = df[col].astype(str).str.replace(r'\\.0$', '', regex=True).str.strip()
+
+    return brasil_limpo, espanha_limpa
+
+# --- analysis_functions.py (06413d7), sem os decoradores @st.cache_data ---
+
+def analisar_admissoes_recontratacoes(brasil_limpo, espanha_historico):
+    brasil_limpo = brasil_limpo[brasil_limpo['status_empregado'] == 'Activo'].copy()
+    expats_br_list = ['expaIn', 'expaOut']
+    filtro_br_expat = brasil_limpo['expa_local'].isin(expats_br_list)
+    expats_es_list = ['Expatriado entrante', 'Expatriado no oficial', 'Expatriado saliente']
+    filtro_es_expat = espanha_historico['expa_local'].isin(expats_es_list)
+    brasil_para_analise = brasil_limpo[~filtro_br_expat].copy()
+    espanha_para_analise = espanha_historico[~filtro_es_expat].copy()
+    lista_pendencias = []
+    brasil_recente_para_novos = brasil_para_analise.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
+    df_merged_novos = pd.merge(brasil_recente_para_novos, espanha_para_analise[['id_sistema_local']].drop_duplicates(), on='id_sistema_local', how='left', indicator=True)
+    novos_nao_encontrados = df_merged_novos[df_merged_novos['_merge'] == 'left_only'].copy()
+    hoje = pd.to_datetime(datetime.now().date())
+    data_limite_admissao = hoje - pd.Timedelta(days=7)
+    pendencias_eve001 = novos_nao_encontrados[novos_nao_encontrados['data_admissao'] <= data_limite_admissao].copy()
+    if not pendencias_eve001.empty:
+        pendencias_eve001['evento_sugerido'] = 'EVE001 - Nova Contratação'
+        lista_pendencias.append(pendencias_eve001)
+    brasil_recente = brasil_para_analise.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
+    espanha_recente = espanha_para_analise.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
+    df_merged_status = pd.merge(brasil_recente, espanha_recente, on='id_sistema_local', suffixes=('_br', '_es'))
+    if 'status_empregado_br' in df_merged_status.columns and 'status_empregado_es' in df_merged_status.columns:
+        filtro_status = (df_merged_status['status_empregado_br'] == 'Activo') & (df_merged_status['status_empregado_es'] == 'Con terminación de contrato')
+        pendencias_eve003_023 = df_merged_status[filtro_status].copy()
+        if not pendencias_eve003_023.empty:
+            pendencias_eve003_023['nome'] = pendencias_eve003_023['nome_br']
+            pendencias_eve003_023['evento_sugerido'] = 'VERIFICAR: EVE003/023 - Ativo no BR, Terminado na ES'
+            lista_pendencias.append(pendencias_eve003_023)
+    if not lista_pendencias: return pd.DataFrame(), ""
+    df_relatorio_final = pd.concat(lista_pendencias, ignore_index=True)
+    colunas_relatorio_base = ['chapa', 'nome', 'data_admissao', 'evento_sugerido']
+    colunas_existentes = [col for col in colunas_relatorio_base if col in df_relatorio_final.columns]
+    for col in ['status_empregado_br', 'status_empregado_es']:
+        if col in df_relatorio_final.columns: colunas_existentes.append(col)
+    df_relatorio_final = df_relatorio_final[colunas_existentes].copy()
+    df_relatorio_final.rename(columns={'status_empregado_br': 'status_brasil', 'status_empregado_es': 'status_espanha'}, inplace=True)
+    if 'chapa' in df_relatorio_final.columns: df_relatorio_final['chapa'] = df_relatorio_final['chapa'].astype(str).str.split('.').str[0]
+    chapas_eve001 = df_relatorio_final[df_relatorio_final['evento_sugerido'].str.contains('EVE001', na=False)]['chapa'].unique()
+    chapas_verificar = df_relatorio_final[df_relatorio_final['evento_sugerido'].str.contains('VERIFICAR', na=False)]['chapa'].unique()
+    conteudo_txt = []
+    if chapas_eve001.size > 0:
+        conteudo_txt.append("--------------EVE001------------")
+        conteudo_txt.append(';'.join(chapas_eve001.astype(str)))
+    if chapas_verificar.size > 0:
+        if conteudo_txt: conteudo_txt.append("\n")
+        conteudo_txt.append("---VERIFICAR: EVE003 ou EVE023---")
+        conteudo_txt.append(';'.join(chapas_verificar.astype(str)))
+    return df_relatorio_final, '\n'.join(conteudo_txt)
+
+def analisar_divergencias_info(brasil_limpo, espanha_historico):
+    brasil_limpo = brasil_limpo[brasil_limpo['status_empregado'] == 'Activo'].copy()
+    espanha_ativos = espanha_historico[espanha_historico['status_empregado'] == 'Activo'].copy()
+    brasil_limpo_recente = brasil_limpo.sort_values('data_efetiva', ascending=False).drop_duplicates('id_sistema_local')
+    espanha_ativos_recente = espanha_ativos.sort_values('data_efetiva', ascending=False).drop_duplicates('id_sistema_local')
+    df_merged = pd.merge(brasil_limpo_recente, espanha_ativos_recente, on='id_sistema_local', how='inner', suffixes=('_br', '_es'))
+    if df_merged.empty: return pd.DataFrame(), ""
+    colunas_para_comparar = ['cargo', 'categoria', 'familia', 'tipo_empregado', 'tipo_contrato', 'business_unit']
+    df_relatorio_final = pd.DataFrame()
+    for col in colunas_para_comparar:
+        col_br, col_es = f"{col}_br", f"{col}_es"
+        if col_br in df_merged.columns and col_es in df_merged.columns:
+            divergencias = df_merged[df_merged[col_br] != df_merged[col_es]].copy()
+            if not divergencias.empty:
+                temp_df = divergencias[['id_sistema_local', 'chapa', 'nome_br', col_br, col_es]].copy()
+                temp_df.rename(columns={'chapa':'chapa_brasil', 'nome_br': 'nome', col_br: 'valor_brasil', col_es: 'valor_espanha'}, inplace=True)
+                temp_df['campo_divergente'] = col
+                df_relatorio_final = pd.concat([df_relatorio_final, temp_df], ignore_index=True)
+    if df_relatorio_final.empty: return pd.DataFrame(), ""
+    df_relatorio_final['evento_sugerido'] = np.where(df_relatorio_final['campo_divergente'] == 'business_unit', 'EVE013', 'EVE012')
+    df_relatorio_final['chapa_brasil'] = df_relatorio_final['chapa_brasil'].astype(str).str.split('.').str[0]
+    chapas_012 = df_relatorio_final[df_relatorio_final['evento_sugerido'] == 'EVE012']['chapa_brasil'].unique()
+    chapas_013 = df_relatorio_final[df_relatorio_final['evento_sugerido'] == 'EVE013']['chapa_brasil'].unique()
+    txt = []
+    if chapas_012.size > 0: txt.extend(["--------------EVE012------------", ';'.join(chapas_012)])
+    if chapas_013.size > 0:
+        if txt: txt.append("\n")
+        txt.extend(["--------------EVE013------------", ';'.join(chapas_013)])
+    return df_relatorio_final, "\n".join(txt)
+
+def analisar_demissoes(brasil_limpo, espanha_historico):
+    eventos_demissao = ['eve005', 'eve008', 'eve009', 'eve010', 'eve011', 'eve024', 'eve025', 'eve026', 'eve027']
+    if 'dt_pagto_rescisao' not in brasil_limpo.columns:
+        return pd.DataFrame({'Erro': ["A coluna 'DTPAGTORESCISAO' não foi encontrada na Base RM."]}), ""
+    brasil_recente = brasil_limpo.sort_values('data_efetiva', ascending=False).drop_duplicates('id_sistema_local', keep='first')
+    brasil_recente['evento_codigo'] = brasil_recente['motivo_evento'].astype(str).str.split('-').str[0].str.strip().str.lower()
+    colaboradores_demitidos_br = brasil_recente[brasil_recente['evento_codigo'].isin(eventos_demissao)].copy()
+    if colaboradores_demitidos_br.empty: return pd.DataFrame(), ""
+    df_merged = pd.merge(colaboradores_demitidos_br, espanha_historico[['id_sistema_local', 'status_empregado']], on='id_sistema_local', how='left', suffixes=('_br', '_es'))
+    pendencias_status = df_merged[df_merged['status_empregado_es'] == 'Activo'].copy()
+    if pendencias_status.empty: return pd.DataFrame(), ""
+    pendencias_status.dropna(subset=['dt_pagto_rescisao'], inplace=True)
+    data_limite = datetime.now() - timedelta(days=5)
+    pendencias_finais = pendencias_status[pendencias_status['dt_pagto_rescisao'] < data_limite].copy()
+    if pendencias_finais.empty: return pd.DataFrame(), ""
+    df_relatorio = pendencias_finais.rename(columns={
+        'chapa': 'chapa_brasil', 'nome': 'nome_completo', 'status_empregado_br': 'status_brasil',
+        'status_empregado_es': 'status_espanha', 'motivo_evento': 'evento_demissao_brasil',
+        'dt_pagto_rescisao': 'data_pagamento_rescisao'
+    })
+    colunas_finais_relatorio = ['id_sistema_local', 'chapa_brasil', 'nome_completo', 'status_brasil', 'status_espanha', 'evento_demissao_brasil', 'data_pagamento_rescisao']
+    df_relatorio = df_relatorio[colunas_finais_relatorio]
+    df_relatorio['evento_codigo'] = df_relatorio['evento_demissao_brasil'].astype(str).str.split('-').str[0].str.strip()
+    eventos_encontrados = sorted(df_relatorio['evento_codigo'].unique())
+    conteudo_txt = []
+    for evento in eventos_encontrados:
+        chapas = df_relatorio[df_relatorio['evento_codigo'] == evento]['chapa_brasil'].unique()
+        if chapas.size > 0:
+            if conteudo_txt: conteudo_txt.append("\n")
+            conteudo_txt.append(f"--------------{evento.upper()}------------")
+            conteudo_txt.append(';'.join(chapas))
+    return df_relatorio, "\n".join(conteudo_txt)
+
+# --- run_eve001.py, run_eve012_013.py e run_outros_eventos.py (06413d7), sem entrada e saída ---
+
+def run_analysis_novos_colaboradores(brasil_limpo, espanha_historico):
+    expats_br_list = ['expaIn', 'expaOut']
+    filtro_br_expat = brasil_limpo['expa_local'].isin(expats_br_list)
+    
+    expats_es_list = ['Expatriado entrante', 'Expatriado no oficial', 'Expatriado saliente']
+    filtro_es_expat = espanha_historico['expa_local'].isin(expats_es_list)
+
+    brasil_para_analise = brasil_limpo[~filtro_br_expat].copy()
+    espanha_para_analise = espanha_historico[~filtro_es_expat].copy()
+
+    lista_pendencias = []
+
+    brasil_recente_para_novos = brasil_para_analise.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
+    
+    df_merged_novos = pd.merge(brasil_recente_para_novos, espanha_para_analise[['id_sistema_local']].drop_duplicates(), on='id_sistema_local', how='left', indicator=True)
+    novos_nao_encontrados = df_merged_novos[df_merged_novos['_merge'] == 'left_only'].copy()
+
+    hoje = pd.to_datetime(datetime.now().date())
+    data_limite_admissao = hoje - pd.Timedelta(days=7)
+    
+    pendencias_eve001 = novos_nao_encontrados[novos_nao_encontrados['data_admissao'] <= data_limite_admissao].copy()
+    pendencias_eve001['evento_sugerido'] = 'EVE001 - Nova Contratação'
+    lista_pendencias.append(pendencias_eve001)
+
+    brasil_recente = brasil_para_analise.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
+    espanha_recente = espanha_para_analise.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
+
+    df_merged_status = pd.merge(brasil_recente, espanha_recente, on='id_sistema_local', suffixes=('_br', '_es'))
+    
+    filtro_status = (df_merged_status['status_empregado_br'] == 'Activo') & (df_merged_status['status_empregado_es'] == 'Con terminación de contrato')
+    pendencias_eve003_023 = df_merged_status[filtro_status].copy()
+
+    pendencias_eve003_023['nome'] = pendencias_eve003_023['nome_br']
+    
+    pendencias_eve003_023['evento_sugerido'] = 'VERIFICAR: EVE003/023 - Ativo no BR, Terminado na ES'
+    lista_pendencias.append(pendencias_eve003_023)
+
+    if not lista_pendencias:
+        return None, ""
+
+    df_relatorio_final = pd.concat(lista_pendencias, ignore_index=True)
+
+    colunas_relatorio = ['chapa', 'nome', 'data_admissao', 'evento_sugerido']
+    for col in ['status_empregado_br', 'status_empregado_es']:
+        if col in df_relatorio_final.columns and col not in colunas_relatorio:
+            colunas_relatorio.append(col)
+
+    df_relatorio_final = df_relatorio_final[colunas_relatorio].copy()
+    df_relatorio_final.rename(columns={'status_empregado_br': 'status_brasil', 'status_empregado_es': 'status_espanha'}, inplace=True)
+    df_relatorio_final['chapa'] = df_relatorio_final['chapa'].astype(str).str.split('.').str[0]
+
+    chapas_eve001 = df_relatorio_final[df_relatorio_final['evento_sugerido'].str.contains('EVE001')]['chapa'].unique()
+    chapas_verificar = df_relatorio_final[df_relatorio_final['evento_sugerido'].str.contains('VERIFICAR')]['chapa'].unique()
+
+    conteudo_txt = []
+    if chapas_eve001.size > 0:
+        conteudo_txt.append("--------------EVE001------------")
+        conteudo_txt.append(';'.join(chapas_eve001.astype(str)))
+    if chapas_verificar.size > 0:
+        if conteudo_txt: conteudo_txt.append("\n")
+        conteudo_txt.append("---VERIFICAR: EVE003 ou EVE023---")
+        conteudo_txt.append(';'.join(chapas_verificar.astype(str)))
+
+    return df_relatorio_final, '\n'.join(conteudo_txt)
+
+def run_analysis_divergencias(brasil_limpo, espanha_historico):
+    espanha_ativos = espanha_historico[espanha_historico['status_empregado'] == 'Activo'].copy()
+    
+    if 'data_efetiva' not in brasil_limpo.columns or 'data_efetiva' not in espanha_ativos.columns:
+        return None, ""
+        
+    brasil_limpo = brasil_limpo.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
+    espanha_ativos = espanha_ativos.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
+
+    df_merged = pd.merge(
+        brasil_limpo, 
+        espanha_ativos, 
+        on='id_sistema_local', 
+        how='inner',
+        suffixes=('_br', '_es')
+    )
+
+    colunas_para_comparar = [
+        'cargo', 'familia', 'categoria', 'tipo_empregado', 
+        'tipo_contrato', 'business_unit'
+    ]
+
+    colunas_comparaveis = [
+        col for col in colunas_para_comparar
+        if f'{col}_br' in df_merged.columns and f'{col}_es' in df_merged.columns
+    ]
+
+    divergencias = []
+
+    for index, row in df_merged.iterrows():
+        for coluna in colunas_comparaveis:
+            valor_br = row[f'{coluna}_br']
+            valor_es = row[f'{coluna}_es']
+            
+            if pd.notna(valor_br) and pd.notna(valor_es) and valor_br != valor_es:
+                divergencias.append({
+                    'id_sistema_local': row['id_sistema_local'],
+                    'chapa': row['chapa'],
+                    'nome': row.get('nome_br', row.get('nome_es')),
+                    'campo_divergente': coluna,
+                    'valor_brasil': valor_br,
+                    'valor_espanha': valor_es
+                })
+
+    if not divergencias:
+        return None, ""
+
+    df_relatorio_final = pd.DataFrame(divergencias)
+    df_relatorio_final['chapa'] = df_relatorio_final['chapa'].astype(str).str.split('.').str[0]
+    df_relatorio_final['evento_sugerido'] = np.where(df_relatorio_final['campo_divergente'] == 'business_unit', 'eve013', 'eve012')
+
+    chapas_eve012 = df_relatorio_final[df_relatorio_final['evento_sugerido'] == 'eve012']['chapa'].unique()
+    chapas_eve013 = df_relatorio_final[df_relatorio_final['evento_sugerido'] == 'eve013']['chapa'].unique()
+
+    conteudo_txt = []
+    if chapas_eve012.size > 0:
+        conteudo_txt.append("--------------EVE012------------")
+        conteudo_txt.append(';'.join(chapas_eve012.astype(str)))
+    if chapas_eve013.size > 0:
+        if conteudo_txt: conteudo_txt.append("\n")
+        conteudo_txt.append("--------------EVE013------------")
+        conteudo_txt.append(';'.join(chapas_eve013.astype(str)))
+
+    return df_relatorio_final, '\n'.join(conteudo_txt)
+
+def run_analysis_outros_eventos(brasil_bruto, espanha_bruto):
+    mapeamento_local_espanha = {
+        'ID de usuario/empleado': 'chapa'
+    }
+    colunas_para_renomear_es = {k: v for k, v in mapeamento_local_espanha.items() if k in espanha_bruto.columns}
+    if colunas_para_renomear_es:
+        espanha_bruto.rename(columns=colunas_para_renomear_es, inplace=True)
+
+    # 2. Ajuste para a base do Brasil: Garante que a coluna 'nome' exista,
+    #    criando-a a partir de 'nome_parcial' e 'sobrenome' se necessário.
+    if 'nome' not in brasil_bruto.columns and 'nome_parcial' in brasil_bruto.columns:
+        brasil_bruto['nome'] = brasil_bruto['nome_parcial'].fillna('') + ' ' + brasil_bruto['sobrenome'].fillna('')
+        brasil_bruto['nome'] = brasil_bruto['nome'].str.strip()
+    # --- FIM DO BLOCO DE AJUSTE LOCAL ---
+
+    colunas_essenciais = ['chapa', 'nome', 'data_efetiva', 'motivo_evento']
+    for df_name, df in [('Brasil', brasil_bruto), ('Espanha', espanha_bruto)]:
+        if not all(col in df.columns for col in colunas_essenciais):
+            return None, ""
+
+    eventos_excluidos = ['EVE001', 'EVE012', 'EVE013']
+
+    for df in [brasil_bruto, espanha_bruto]:
+        df['evento_codigo'] = df['motivo_evento'].astype(str).str.split('-').str[0].str.strip()
+        df.dropna(subset=['data_efetiva', 'chapa'], inplace=True)
+        df.sort_values('data_efetiva', ascending=False, inplace=True)
+        df.drop_duplicates(subset='chapa', keep='first', inplace=True)
+
+    brasil_filtrado = brasil_bruto[~brasil_bruto['evento_codigo'].isin(eventos_excluidos)]
+    espanha_filtrado = espanha_bruto[~espanha_bruto['evento_codigo'].isin(eventos_excluidos)]
+
+    df_merged = pd.merge(
+        brasil_filtrado[['chapa', 'nome', 'motivo_evento', 'evento_codigo']],
+        espanha_filtrado[['chapa', 'motivo_evento', 'evento_codigo']],
+        on='chapa',
+        suffixes=('_br', '_es')
+    )
+
+    df_divergencias = df_merged[df_merged['evento_codigo_br'] != df_merged['evento_codigo_es']].copy()
+
+    if df_divergencias.empty:
+        return None, ""
+    else:
+        colunas_finais = {
+            'chapa': 'chapa',
+            'nome': 'nome_completo',
+            'motivo_evento_br': 'evento_brasil',
+            'motivo_evento_es': 'evento_espanha'
+        }
+        df_relatorio = df_divergencias[list(colunas_finais.keys())].rename(columns=colunas_finais)
+        df_relatorio['chapa'] = df_relatorio['chapa'].astype(str).str.split('.').str[0]
+
+        chapas_para_envio = ';'.join(df_relatorio['chapa'].unique())
+        return df_relatorio, "--------------OUTROS EVENTOS------------\n" + chapas_para_envio
+
+# --- Diferenças declaradas ---
+
+@contextlib.contextmanager
+def _desempate_estavel():
+    # As funções originais ordenam por data_efetiva com o quicksort do pandas (empates em
+    # ordem arbitrária, datas nulas no fim) e tomam o último ou o primeiro registro de cada
+    # chave. Aqui a mesma chamada vira a ordenação estável com as datas nulas no início; a
+    # decrescente é a crescente invertida. _update_inplace é o que o próprio pandas usa no
+    # sort_values(inplace=True).
+    ordenar = pd.DataFrame.sort_values
+
+    def sort_values(self, by, ascending=True, inplace=False, **opcoes):
+        if by != 'data_efetiva' or opcoes:
+            return ordenar(self, by, ascending=ascending, inplace=inplace, **opcoes)
+        ordenado = ordenar(self, by, kind='mergesort', na_position='first')
+        if not ascending:
+            ordenado = ordenado.iloc[::-1]
+        if not inplace:
+            return ordenado
+        self._update_inplace(ordenado)
+
+    pd.DataFrame.sort_values = sort_values
+    try:
+        yield
+    finally:
+        pd.DataFrame.sort_values = ordenar
+
+def _chaves_canonicas(brasil, espanha):
+    # O loader original converte as chaves com astype(str): ausentes viram o texto 'nan' e o
+    # '.0' de números lidos como float fica (a expressão procura uma barra invertida). A
+    # chapa da Espanha ('ID de usuario/empleado') nem passa pela conversão.
+    def canonica(serie):
+        texto = serie.astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+        return texto.mask(serie.isna() | texto.isin(['', 'nan', 'None', '<NA>']))
+    brasil, espanha = brasil.copy(), espanha.copy()
+    for df, colunas in ((brasil, ['id_sistema_local', 'chapa']), (espanha, ['id_sistema_local', 'ID de usuario/empleado'])):
+        for col in colunas:
+            if col in df.columns:
+                df[col] = canonica(df[col])
+    return brasil, espanha
+
+# diferença -> (pedido que a introduziu, descrição). A terceira diferença, as colunas do
+# candidato provável da Espanha nos relatórios de admissões (user-021), não muda linha
+# nenhuma: é a lista COLUNAS_ADICIONAIS do verificar_equivalencia.py.
+DIFERENCAS = {
+    'chaves_canonicas': ('user-014', "Chaves de colaborador no texto canônico: sem espaços e sem o '.0' do Excel, "
+                                     "nulas quando vazias ou ausentes, e a chapa da Espanha no mesmo formato da do Brasil."),
+    'desempate_estavel': ('user-004', "Registro mais recente por data efetiva: empates decididos pela ordem do histórico "
+                                      "e data efetiva nula nunca é a mais recente."),
+}
+
+def _executar(funcao, *bases):
+    # Uma análise original que falha (o run_outros_eventos.py sem as chaves canônicas, por
+    # exemplo) vira um relatório de erro, comparado como qualquer outro.
+    try:
+        return funcao(*[df.copy() for df in bases])
+    except Exception as e:
+        return f"ERRO: {type(e).__name__}: {e}", ""
+
+def analisar(brasil, espanha, data_referencia, diferencas=tuple(DIFERENCAS)):
+    # Os três relatórios do app e os três dos scripts, como o baseline os daria na data de
+    # referência: o relógio parado nela e, nos scripts, o histórico até ela (o cenário
+    # 'scripts' roda com as_of = data de referência). Cada função recebe a sua cópia das
+    # bases: os scripts originais alteram as bases recebidas. Roda sem copy-on-write, como
+    # no baseline.
+    desconhecidas = [d for d in diferencas if d not in DIFERENCAS]
+    if desconhecidas:
+        raise ValueError(f"Diferenças desconhecidas: {desconhecidas}. Opções: {', '.join(DIFERENCAS)}.")
+    data_referencia = pd.Timestamp(data_referencia).normalize()
+    datetime.agora = _datetime.combine(data_referencia.date(), time(12))
+    if 'chaves_canonicas' in diferencas:
+        brasil, espanha = _chaves_canonicas(brasil, espanha)
+    limite = data_referencia + pd.Timedelta(days=1)
+    brasil_ate = brasil[brasil['data_efetiva'].isna() | (brasil['data_efetiva'] < limite)]
+    espanha_ate = espanha[espanha['data_efetiva'].isna() | (espanha['data_efetiva'] < limite)]
+    with (_desempate_estavel() if 'desempate_estavel' in diferencas else contextlib.nullcontext()), \
+            pd.option_context('mode.copy_on_write', False), warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return {
+            'admissoes': _executar(analisar_admissoes_recontratacoes, brasil, espanha),
+            'divergencias': _executar(analisar_divergencias_info, brasil, espanha),
+            'demissoes': _executar(analisar_demissoes, brasil, espanha),
+            'eve001_003_023': _executar(run_analysis_novos_colaboradores, brasil_ate, espanha_ate),
+            'eve012_013': _executar(run_analysis_divergencias, brasil_ate, espanha_ate),
+            'outros_eventos': _executar(run_analysis_outros_eventos, brasil_ate, espanha_ate),
+        }
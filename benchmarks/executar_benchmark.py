@@ -0,0 +1,195 @@
+import argparse
+import functools
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd # type: ignore # noqa: E402
+
+from gerar_dados_sinteticos import gerar_bases, gravar_bases # noqa: E402
+
+PASTA_DADOS = os.path.join(RAIZ, 'benchmarks', '.dados')
+PASTA_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+
+def _pico_rss_mb():
+    # Pico de memória residente do processo até agora (high-water mark).
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil # type: ignore
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+    except Exception:
+        return None
+
+def _linhas(obj):
+    if isinstance(obj, pd.DataFrame):
+        return len(obj)
+    if isinstance(obj, tuple):
+        return sum(_linhas(item) for item in obj if isinstance(item, (pd.DataFrame, tuple)))
+    return None
+
+def _medir(etapas, nome, funcao, *args, linhas_entrada=None):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    etapas.append({
+        'etapa': nome, 'segundos': round(time.perf_counter() - inicio, 4),
+        'linhas_entrada': linhas_entrada, 'linhas_saida': _linhas(resultado), 'pico_rss_mb': _pico_rss_mb(),
+    })
+    return resultado
+
+def _exportar(relatorios, formato):
+    # Mesmo caminho do botão de download do app.
+    from exportacao import relatorio_em_bytes
+    return sum(len(relatorio_em_bytes(df, formato)) for df in relatorios if not df.empty)
+
+def _executar_etapas(pasta_base, motor='pandas'):
+    # Executado em um processo novo para cada tamanho: o pico de RSS não é
+    # contaminado pelas rodadas anteriores.
+    os.chdir(pasta_base)
+    import core_processing as cp
+    import analysis_functions as af
+    import instrumentacao
+    import memoizacao
+    cp.ativar_copy_on_write()  # como nos pontos de entrada
+
+    # Subetapas internas (strip, chaves, merges...) registradas pela instrumentação.
+    coletor = instrumentacao.ColetorMemoria(limite=10_000)
+    instrumentacao.configurar(coletor)
+    etapas = []
+    brasil_bruto, espanha_bruto, mapas = _medir(
+        etapas, 'ingestao', cp.ler_fontes, 'data', cp.detectar_engine_excel(), True)
+    linhas_brutas = len(brasil_bruto) + len(espanha_bruto)
+    brasil, espanha = _medir(etapas, 'padronizacao', cp.padronizar_colunas, brasil_bruto, espanha_bruto,
+                             linhas_entrada=linhas_brutas)
+    brasil = _medir(etapas, 'mapeamento', cp.aplicar_mapeamentos, brasil, mapas, linhas_entrada=len(brasil))
+    brasil, espanha = _medir(etapas, 'finalizacao_limpeza', cp.finalizar_limpeza, brasil, espanha,
+                             linhas_entrada=len(brasil) + len(espanha))
+
+    relatorios = []
+    memoizacao.configurar(None)  # mede a análise, não o cache de resultados
+    for nome in ['analisar_admissoes_recontratacoes', 'analisar_divergencias_info', 'analisar_demissoes']:
+        df_relatorio, _ = _medir(etapas, nome, functools.partial(getattr(af, nome), motor=motor), brasil, espanha,
+                                 linhas_entrada=len(brasil) + len(espanha))
+        relatorios.append(df_relatorio)
+    _medir(etapas, 'analisar_pendencias', functools.partial(af.analisar_pendencias, motor=motor), brasil, espanha, linhas_entrada=len(brasil) + len(espanha))
+    for formato in ['xlsx', 'csv', 'parquet']:
+        _medir(etapas, f'exportacao_{formato}', _exportar, relatorios, formato,
+               linhas_entrada=sum(len(df) for df in relatorios))
+    return {'linhas_brasil': len(brasil), 'linhas_espanha': len(espanha), 'etapas': etapas,
+            'subetapas': coletor.registros}
+
+def versao_gerador():
+    with open(os.path.join(RAIZ, 'benchmarks', 'gerar_dados_sinteticos.py'), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+def preparar_dados(parametros):
+    # Regera as bases quando os parâmetros ou o próprio gerador mudam.
+    assinatura = hashlib.sha256(json.dumps(parametros, sort_keys=True).encode()).hexdigest()[:12]
+    pasta_base = os.path.join(PASTA_DADOS, f"{parametros['colaboradores']}_{assinatura}")
+    caminho_versao = os.path.join(pasta_base, 'versao_gerador.txt')
+    versao = versao_gerador()
+    atual = None
+    if os.path.exists(caminho_versao):
+        with open(caminho_versao, 'r', encoding='utf-8') as f:
+            atual = f.read().strip()
+    if atual != versao or not os.path.exists(os.path.join(pasta_base, 'data', 'mapeamento_valores.xlsx')):
+        print(f"Gerando bases sintéticas para {parametros['colaboradores']} colaboradores...")
+        gravar_bases(os.path.join(pasta_base, 'data'), *gerar_bases(**parametros))
+        with open(caminho_versao, 'w', encoding='utf-8') as f:
+            f.write(versao)
+    return pasta_base
+
+def _commit_git():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def comparar_resultados(atual, referencia, tolerancia=0.25, piso_segundos=0.05):
+    # Regressão = etapa mais lenta (ou com pico de memória maior) que a referência além
+    # da tolerância relativa; diferenças abaixo do piso absoluto são tratadas como ruído.
+    base = {(r['colaboradores'], e['etapa']): e for r in referencia['resultados'] for e in r['etapas']}
+    regressoes = []
+    for resultado in atual['resultados']:
+        for etapa in resultado['etapas']:
+            anterior = base.get((resultado['colaboradores'], etapa['etapa']))
+            if anterior is None:
+                continue
+            if etapa['segundos'] > anterior['segundos'] * (1 + tolerancia) and etapa['segundos'] - anterior['segundos'] > piso_segundos:
+                regressoes.append((resultado['colaboradores'], etapa['etapa'], 'segundos', anterior['segundos'], etapa['segundos']))
+            if etapa['pico_rss_mb'] and anterior['pico_rss_mb'] and etapa['pico_rss_mb'] > anterior['pico_rss_mb'] * (1 + tolerancia):
+                regressoes.append((resultado['colaboradores'], etapa['etapa'], 'pico_rss_mb', anterior['pico_rss_mb'], etapa['pico_rss_mb']))
+    return regressoes
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Mede carga, limpeza, análises e exportação sobre bases sintéticas.")
+    parser.add_argument('--colaboradores', type=int, nargs='+', default=[10_000, 100_000],
+                        help="Tamanhos de quadro a medir (o histórico tem ~colaboradores x eventos linhas).")
+    parser.add_argument('--eventos-por-colaborador', type=float, default=3.0)
+    parser.add_argument('--taxa-expatriados', type=float, default=0.05)
+    parser.add_argument('--taxa-divergencia', type=float, default=0.05)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', default=None, help="Arquivo JSON de resultados.")
+    parser.add_argument('--comparar', default=None, help="JSON de uma execução anterior para detectar regressões.")
+    parser.add_argument('--tolerancia', type=float, default=0.25)
+    parser.add_argument('--motor', choices=['pandas', 'duckdb'], default='pandas', help="Motor das regras nas análises.")
+    return parser.parse_args()
+
+def main():
+    args = _argumentos()
+    resultados = []
+    for colaboradores in args.colaboradores:
+        parametros = {
+            'colaboradores': colaboradores, 'eventos_por_colaborador': args.eventos_por_colaborador,
+            'taxa_expatriados': args.taxa_expatriados, 'taxa_divergencia': args.taxa_divergencia,
+            'semente': args.semente, 'data_referencia': '2025-01-01',
+        }
+        pasta_base = preparar_dados(parametros)
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            medicao = executor.submit(_executar_etapas, pasta_base, args.motor).result()
+        resultados.append({'colaboradores': colaboradores, 'parametros': parametros, **medicao})
+        print(f"\n{colaboradores} colaboradores ({medicao['linhas_brasil']} linhas BR / {medicao['linhas_espanha']} ES)")
+        for etapa in medicao['etapas']:
+            print(f"  {etapa['etapa']:<36} {etapa['segundos']:>9.3f}s  pico RSS {etapa['pico_rss_mb']} MB")
+
+    saida = {
+        'metadados': {
+            'executado_em': datetime.now().isoformat(timespec='seconds'), 'commit': _commit_git(),
+            'python': platform.python_version(), 'pandas': pd.__version__, 'plataforma': platform.platform(),
+            'motor': args.motor,
+        },
+        'resultados': resultados,
+    }
+    caminho_saida = args.saida or os.path.join(PASTA_RESULTADOS, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(caminho_saida)), exist_ok=True)
+    with open(caminho_saida, 'w', encoding='utf-8') as f:
+        json.dump(saida, f, ensure_ascii=False, indent=2)
+    print(f"\n-> Resultados gravados em: {caminho_saida}")
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            regressoes = comparar_resultados(saida, json.load(f), args.tolerancia)
+        if regressoes:
+            print(f"\nREGRESSÕES (tolerância {args.tolerancia:.0%}):")
+            for colaboradores, etapa, metrica, antes, depois in regressoes:
+                print(f"  {colaboradores} colaboradores / {etapa} / {metrica}: {antes} -> {depois}")
+            sys.exit(1)
+        print("\nNenhuma regressão em relação à referência.")
+
+if __name__ == '__main__':
+    main()
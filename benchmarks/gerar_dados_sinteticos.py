@@ -0,0 +1,160 @@
+import argparse
+import os
+import sys
+
+import numpy as np # type: ignore
+import pandas as pd # type: ignore
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core_processing import COLUNAS_BRASIL, COLUNAS_ESPANHA, MAPEAMENTOS_ABAS # noqa: E402
+
+LIMITE_LINHAS_EXCEL = 1_048_575  # 1.048.576 linhas por aba, menos o cabeçalho
+
+# Vocabulários BR -> ES. Cada par vira uma linha da aba correspondente em
+# mapeamento_valores.xlsx, então o mapeamento do loader traduz todos os valores.
+VOCABULARIOS = {
+    'status_empregado': [('Ativo', 'Activo'), ('Demitido', 'Con terminación de contrato'), ('Afastado', 'Suspendido')],
+    'cargo': [(f'CARGO {i:03d}', f'Puesto {i:03d}') for i in range(150)],
+    'familia': [(f'FAMILIA {i:02d}', f'Familia {i:02d}') for i in range(20)],
+    'categoria': [(f'CAT {i}', f'Categoría {i}') for i in range(8)],
+    'tipo_empregado': [('CLT', 'Empleado'), ('Estagiário', 'Becario'), ('Aprendiz', 'Aprendiz')],
+    'tipo_contrato': [('Indeterminado', 'Indefinido'), ('Determinado', 'Temporal'), ('Experiência', 'Prueba'), ('Intermitente', 'Fijo discontinuo')],
+    'business_unit': [(f'UN {i:02d}', f'DN Corporativo {i:02d}') for i in range(15)],
+}
+EXPA_BRASIL = ['expaIn', 'expaOut']
+EXPA_ESPANHA = ['Expatriado entrante', 'Expatriado saliente', 'Expatriado no oficial']
+EVENTOS_COMUNS = ['EVE002 - Cambio de puesto', 'EVE012 - Cambio de datos', 'EVE013 - Cambio organizativo',
+                  'EVE015 - Promoción', 'EVE020 - Cambio salarial']
+EVENTOS_DEMISSAO = ['EVE005 - Despido', 'EVE008 - Baja voluntaria', 'EVE009 - Fin de contrato',
+                    'EVE010 - Jubilación', 'EVE024 - Despido disciplinario']
+
+def gerar_bases(colaboradores=10_000, eventos_por_colaborador=3.0, taxa_expatriados=0.05, taxa_divergencia=0.05,
+                taxa_ausentes_espanha=0.03, taxa_demissao=0.08, semente=42, data_referencia=None):
+    rng = np.random.default_rng(semente)
+    hoje = pd.Timestamp(data_referencia or pd.Timestamp.now().normalize())
+
+    # --- Colaboradores ---
+    n = colaboradores
+    eventos = 1 + rng.poisson(max(eventos_por_colaborador - 1, 0), size=n)
+    admissao = hoje - pd.to_timedelta(rng.integers(0, 3650, size=n), unit='D')
+    demitido = rng.random(n) < taxa_demissao
+    expatriado = rng.random(n) < taxa_expatriados
+    atributos = {col: rng.integers(0, len(pares), size=n) for col, pares in VOCABULARIOS.items() if col != 'status_empregado'}
+
+    # --- Histórico (uma linha por evento) ---
+    colab = np.repeat(np.arange(n), eventos)
+    total = len(colab)
+    inicio_colab = np.repeat(np.cumsum(eventos) - eventos, eventos)
+    ordem_evento = np.arange(total) - inicio_colab
+    ultimo = ordem_evento == (eventos[colab] - 1)
+    dias_ate_hoje = (hoje - admissao).days.to_numpy()
+    fracao = np.where(ordem_evento == 0, 0.0, rng.random(total))
+    deslocamento = (fracao * dias_ate_hoje[colab]).astype(int)
+    # Ordena os eventos de cada colaborador: o primeiro é a admissão.
+    deslocamento = deslocamento[np.lexsort((deslocamento, colab))]
+    data_efetiva = pd.Series(admissao[colab] + pd.to_timedelta(deslocamento, unit='D'))
+
+    valores_br, valores_es = {}, {}
+    for col, pares in VOCABULARIOS.items():
+        if col == 'status_empregado':
+            continue
+        codigo = atributos[col][colab].copy()
+        mudou = (ordem_evento > 0) & (rng.random(total) < 0.15)
+        codigo[mudou] = rng.integers(0, len(pares), size=int(mudou.sum()))
+        br = np.array([p[0] for p in pares], dtype=object)
+        es = np.array([p[1] for p in pares], dtype=object)
+        valores_br[col] = br[codigo]
+        codigo_es = codigo.copy()
+        diverge = ultimo & (rng.random(total) < taxa_divergencia / len(VOCABULARIOS))
+        codigo_es[diverge] = (codigo_es[diverge] + 1) % len(pares)
+        valores_es[col] = es[codigo_es]
+
+    fim = ultimo & demitido[colab]
+    status_br = np.where(fim, 'Demitido', 'Ativo').astype(object)
+    motivo = np.array(EVENTOS_COMUNS, dtype=object)[rng.integers(0, len(EVENTOS_COMUNS), size=total)]
+    motivo[ordem_evento == 0] = 'EVE001 - Contratación'
+    motivo[fim] = np.array(EVENTOS_DEMISSAO, dtype=object)[rng.integers(0, len(EVENTOS_DEMISSAO), size=int(fim.sum()))]
+    pagto_rescisao = (data_efetiva + pd.to_timedelta(rng.integers(0, 10, size=total), unit='D')).where(fim)
+
+    expa_br = np.where(expatriado[colab], np.array(EXPA_BRASIL, dtype=object)[rng.integers(0, 2, size=total)], 'Local')
+    ids = 10_000_000 + colab
+    chapas = 100_000 + colab
+    df_brasil = pd.DataFrame({
+        'LOCAL SYSTEM ID': ids, 'CHAPA': chapas,
+        'FIRST NAME': np.char.add('Nome', colab.astype(str)).astype(object),
+        'LAST NAME': np.char.add('Sobrenome', (colab % 997).astype(str)).astype(object),
+        'HIRE DATE': admissao[colab], 'EFFECTIVE DATE': data_efetiva.to_numpy(), 'STATUS': status_br,
+        'CONTRACT TYPE': valores_br['tipo_contrato'], 'JOB': valores_br['cargo'], 'FAMILY': valores_br['familia'],
+        'CATEGORY': valores_br['categoria'], 'EMPLOYMENT TYPE': valores_br['tipo_empregado'], 'EVENT REASON': motivo,
+        'NATIONALITY': np.where(expatriado[colab], 'Española', 'Brasileña'), 'EXPA/LOCAL': expa_br,
+        'BUSINESS UNIT': valores_br['business_unit'], 'DTPAGTORESCISAO': pagto_rescisao.to_numpy(),
+    })
+
+    # A Espanha replica o histórico de quem foi cadastrado lá. Demissões chegam com
+    # atraso (metade ainda 'Activo') e alguns ativos no BR aparecem terminados.
+    na_espanha = (rng.random(n) >= taxa_ausentes_espanha)[colab]
+    status_es = np.where(status_br == 'Demitido', 'Con terminación de contrato', 'Activo').astype(object)
+    status_es[fim & (rng.random(total) < 0.5)] = 'Activo'
+    status_es[ultimo & ~demitido[colab] & (rng.random(total) < 0.01)] = 'Con terminación de contrato'
+    expa_es = np.where(expatriado[colab], np.array(EXPA_ESPANHA, dtype=object)[rng.integers(0, 3, size=total)], 'Local')
+    # Alguns eventos recentes chegam à Espanha com outro motivo, ou sem motivo (run_outros_eventos.py).
+    motivo_es = motivo.copy()
+    troca = ultimo & ~fim & (rng.random(total) < taxa_divergencia)
+    motivo_es[troca] = np.array(EVENTOS_COMUNS, dtype=object)[rng.integers(0, len(EVENTOS_COMUNS), size=int(troca.sum()))]
+    motivo_es[ultimo & (rng.random(total) < taxa_divergencia / 10)] = None
+    df_espanha = pd.DataFrame({
+        'ID sist. nom. local': ids, 'ID de usuario/empleado': chapas,
+        'Nombre': df_brasil['FIRST NAME'], 'Primer apellido': df_brasil['LAST NAME'], 'Expa/Local': expa_es,
+        'Detalles de empleo Fecha de inicio original': admissao[colab],
+        'Detalles de empleo Fecha de terminación de contrato': data_efetiva.where(fim).to_numpy(),
+        'Fecha del evento': data_efetiva.to_numpy(), 'Estado de empleado': status_es,
+        'Tipo de contrato': valores_es['tipo_contrato'], 'Puesto': valores_es['cargo'], 'Familia': valores_es['familia'],
+        'Categoría': valores_es['categoria'], 'Tipo empleado': valores_es['tipo_empregado'], 'Motivo del evento': motivo_es,
+        'DG / DN corporativo': valores_es['business_unit'], 'Primera nacionalidad': df_brasil['NATIONALITY'],
+    })[na_espanha].reset_index(drop=True)
+
+    assert set(df_brasil.columns) >= set(COLUNAS_BRASIL)
+    assert set(df_espanha.columns) >= set(COLUNAS_ESPANHA)
+    mapas = {aba: pd.DataFrame(VOCABULARIOS[col], columns=['Valor Brasil', 'Valor Espanha'])
+             for col, aba in MAPEAMENTOS_ABAS.items()}
+    return df_brasil, df_espanha, mapas
+
+def gravar_xlsx(df, caminho, nome_aba='Sheet1'):
+    # Escrita linha a linha no modo constant_memory do xlsxwriter: o uso de memória
+    # não cresce com o tamanho da planilha.
+    import xlsxwriter # type: ignore
+    if len(df) > LIMITE_LINHAS_EXCEL:
+        raise ValueError(f"{len(df)} linhas excedem o limite de uma aba do Excel ({LIMITE_LINHAS_EXCEL}).")
+    with xlsxwriter.Workbook(caminho, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd'}) as workbook:
+        aba = workbook.add_worksheet(nome_aba)
+        aba.write_row(0, 0, list(df.columns))
+        for inicio in range(0, len(df), 50_000):
+            bloco = df.iloc[inicio:inicio + 50_000].astype(object)
+            bloco = bloco.where(bloco.notna(), None)
+            for i, linha in enumerate(bloco.itertuples(index=False), start=inicio + 1):
+                aba.write_row(i, 0, linha)
+
+def gravar_bases(pasta_data, df_brasil, df_espanha, mapas):
+    os.makedirs(pasta_data, exist_ok=True)
+    gravar_xlsx(df_brasil, os.path.join(pasta_data, 'Base RM.xlsx'))
+    gravar_xlsx(df_espanha, os.path.join(pasta_data, 'Base SF.xlsx'))
+    with pd.ExcelWriter(os.path.join(pasta_data, 'mapeamento_valores.xlsx'), engine='xlsxwriter') as writer:
+        for aba, df_map in mapas.items():
+            df_map.to_excel(writer, sheet_name=aba, index=False)
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Gera Base RM.xlsx, Base SF.xlsx e mapeamento_valores.xlsx sintéticos.")
+    parser.add_argument('--colaboradores', type=int, default=10_000)
+    parser.add_argument('--eventos-por-colaborador', type=float, default=3.0, help="Profundidade média do histórico.")
+    parser.add_argument('--taxa-expatriados', type=float, default=0.05)
+    parser.add_argument('--taxa-divergencia', type=float, default=0.05)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', default='data', help="Pasta onde os arquivos serão gravados.")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = _argumentos()
+    df_brasil, df_espanha, mapas = gerar_bases(
+        args.colaboradores, args.eventos_por_colaborador, args.taxa_expatriados, args.taxa_divergencia, semente=args.semente)
+    gravar_bases(args.saida, df_brasil, df_espanha, mapas)
+    print(f"Bases geradas em '{args.saida}': {len(df_brasil)} linhas no Brasil, {len(df_espanha)} na Espanha.")
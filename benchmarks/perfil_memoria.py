@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd # type: ignore # noqa: E402
+
+from executar_benchmark import preparar_dados, _commit_git # noqa: E402
+
+PASTA_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+
+# Pico de alocação (tracemalloc: objetos Python e buffers NumPy) de cada função de análise,
+# com e sem copy-on-write do pandas, em relação ao tamanho das bases carregadas. Cada modo
+# roda num processo novo, com a opção definida antes da carga. Também confere que nenhuma
+# função altera as bases recebidas (hash do conteúdo antes e depois).
+
+# função -> (módulo, nome, recebe pasta de saída e formato)
+FUNCOES = {
+    'analisar_admissoes_recontratacoes': ('analysis_functions', 'analisar_admissoes_recontratacoes', False),
+    'analisar_divergencias_info': ('analysis_functions', 'analisar_divergencias_info', False),
+    'analisar_demissoes': ('analysis_functions', 'analisar_demissoes', False),
+    'analisar_pendencias': ('analysis_functions', 'analisar_pendencias', False),
+    'executar_novos_colaboradores': ('run_eve001', 'executar_novos_colaboradores', True),
+    'executar_divergencias': ('run_eve012_013', 'executar_divergencias', True),
+    'executar_outros_eventos': ('run_outros_eventos', 'executar_outros_eventos', True),
+}
+
+def _hash_conteudo(df):
+    return int(pd.util.hash_pandas_object(df, index=True).sum()), tuple(df.columns), tuple(map(str, df.dtypes))
+
+def _perfilar(pasta_base, copy_on_write, funcoes):
+    os.chdir(pasta_base)
+    os.environ['ANALISE_HISTORICO'] = 'nenhum'
+    import importlib
+    import contextlib
+    import io
+    import core_processing as cp
+    import memoizacao
+    pd.set_option('mode.copy_on_write', copy_on_write)
+    memoizacao.configurar(None)
+    brasil, espanha = cp.load_and_prepare_data()
+    dados_mb = (brasil.memory_usage(deep=True).sum() + espanha.memory_usage(deep=True).sum()) / (1024 * 1024)
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta_saida:
+        for nome in funcoes:
+            modulo, atributo, gera_arquivos = FUNCOES[nome]
+            funcao = getattr(importlib.import_module(modulo), atributo)
+            argumentos = (brasil, espanha, pasta_saida, 'csv') if gera_arquivos else (brasil, espanha)
+            # Uma chamada antes da medição: índices por identidade e imports tardios não entram no pico.
+            with contextlib.redirect_stdout(io.StringIO()):
+                funcao(*argumentos)
+            antes = (_hash_conteudo(brasil), _hash_conteudo(espanha))
+            tracemalloc.start()
+            try:
+                inicial = tracemalloc.get_traced_memory()[0]
+                with contextlib.redirect_stdout(io.StringIO()):
+                    funcao(*argumentos)
+                pico = (tracemalloc.get_traced_memory()[1] - inicial) / (1024 * 1024)
+            finally:
+                tracemalloc.stop()
+            resultados[nome] = {'pico_mb': round(pico, 1), 'x_dados': round(pico / dados_mb, 2),
+                                'altera_entradas': antes != (_hash_conteudo(brasil), _hash_conteudo(espanha))}
+    return {'linhas_brasil': len(brasil), 'linhas_espanha': len(espanha), 'dados_mb': round(dados_mb, 1),
+            'funcoes': resultados}
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Pico de memória por função de análise, com e sem copy-on-write.")
+    parser.add_argument('--colaboradores', type=int, default=50_000, help="Base sintética (ignorado com --pasta).")
+    parser.add_argument('--eventos-por-colaborador', type=float, default=3.0)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--pasta', default=None, help="Base gravada: pasta com 'data/Base RM.xlsx' e 'data/Base SF.xlsx'.")
+    parser.add_argument('--funcoes', nargs='*', choices=list(FUNCOES), default=None)
+    parser.add_argument('--modos', nargs='*', choices=['sem_cow', 'com_cow'], default=['sem_cow', 'com_cow'])
+    parser.add_argument('--saida', default=None, help="Arquivo JSON de resultados.")
+    return parser.parse_args()
+
+def main():
+    args = _argumentos()
+    if args.pasta:
+        pasta_base = os.path.abspath(args.pasta)
+    else:
+        pasta_base = preparar_dados({
+            'colaboradores': args.colaboradores, 'eventos_por_colaborador': args.eventos_por_colaborador,
+            'taxa_expatriados': 0.05, 'taxa_divergencia': 0.05, 'semente': args.semente, 'data_referencia': '2025-01-01',
+        })
+    funcoes = args.funcoes or list(FUNCOES)
+    modos = {}
+    for modo in args.modos:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            modos[modo] = executor.submit(_perfilar, pasta_base, modo == 'com_cow', funcoes).result()
+
+    referencia = next(iter(modos.values()))
+    print(f"\n{referencia['linhas_brasil']} linhas BR / {referencia['linhas_espanha']} ES, {referencia['dados_mb']} MB carregados")
+    print(f"  {'função':<36}" + ''.join(f"{modo:>22}" for modo in modos))
+    for nome in funcoes:
+        colunas = ''.join(f"{m['funcoes'][nome]['pico_mb']:>10.1f} MB ({m['funcoes'][nome]['x_dados']:>4.2f}x)"
+                          for m in modos.values())
+        alteradas = [modo for modo, m in modos.items() if m['funcoes'][nome]['altera_entradas']]
+        print(f"  {nome:<36}{colunas}" + (f"  AVISO: altera as bases recebidas ({', '.join(alteradas)})" if alteradas else ''))
+
+    caminho_saida = args.saida or os.path.join(PASTA_RESULTADOS, f"memoria_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(caminho_saida)), exist_ok=True)
+    with open(caminho_saida, 'w', encoding='utf-8') as f:
+        json.dump({'executado_em': datetime.now().isoformat(timespec='seconds'), 'commit': _commit_git(),
+                   'pandas': pd.__version__, 'pasta': pasta_base, 'modos': modos}, f, ensure_ascii=False, indent=2)
+    print(f"\n-> Resultados gravados em: {caminho_saida}")
+    if any(f['altera_entradas'] for m in modos.values() for f in m['funcoes'].values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
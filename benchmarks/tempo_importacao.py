@@ -0,0 +1,66 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos do caminho headless (scripts, lote, jobs): não podem puxar as dependências
+# de interface nem de exportação só por serem importados.
+MODULOS_HEADLESS = ['core_processing', 'reconciliacao', 'analysis_functions', 'exportacao', 'analise_incremental', 'run_lote', 'precalculo', 'navegacao_relatorio', 'correspondencia']
+PROIBIDOS = ['streamlit', 'plotly', 'xlsxwriter', 'openpyxl']
+# Orçamento: tempo de importação além do próprio pandas (o piso inevitável).
+ORCAMENTO_SEGUNDOS = 0.25
+
+def _medir(modulo, repeticoes):
+    # Processo novo por medição (sem módulos já carregados); fica a menor das repetições.
+    codigo = (f"import sys, time; sys.path.insert(0, {RAIZ!r}); inicio = time.perf_counter(); import {modulo}; "
+              f"print(time.perf_counter() - inicio); print(','.join(sorted(m for m in sys.modules if '.' not in m)))")
+    tempos, carregados = [], set()
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-c', codigo], capture_output=True, text=True, check=True, cwd=RAIZ).stdout.split('\n')
+        tempos.append(float(saida[0]))
+        carregados = set(saida[1].split(','))
+    return min(tempos), carregados
+
+def medir_importacoes(repeticoes=3):
+    piso, _ = _medir('pandas', repeticoes)
+    resultados = {'pandas': {'segundos': round(piso, 3)}}
+    for modulo in MODULOS_HEADLESS:
+        segundos, carregados = _medir(modulo, repeticoes)
+        resultados[modulo] = {
+            'segundos': round(segundos, 3), 'alem_do_pandas': round(max(segundos - piso, 0), 3),
+            'proibidos_carregados': sorted(set(PROIBIDOS) & carregados),
+        }
+    return resultados
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Mede o tempo de importação do caminho headless e confere o orçamento.")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--orcamento', type=float, default=ORCAMENTO_SEGUNDOS,
+                        help="Segundos permitidos além da importação do pandas.")
+    parser.add_argument('--saida', default=None, help="Grava as medições em JSON.")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = _argumentos()
+    resultados = medir_importacoes(args.repeticoes)
+    violacoes = []
+    print(f"{'módulo':<22} {'total':>8} {'além do pandas':>15}")
+    for modulo, medida in resultados.items():
+        print(f"{modulo:<22} {medida['segundos']:>7.3f}s {medida.get('alem_do_pandas', 0):>14.3f}s"
+              + (f"  (carregou {', '.join(medida['proibidos_carregados'])})" if medida.get('proibidos_carregados') else ''))
+        if medida.get('alem_do_pandas', 0) > args.orcamento:
+            violacoes.append(f"{modulo}: {medida['alem_do_pandas']:.3f}s além do pandas (orçamento {args.orcamento:.3f}s)")
+        if medida.get('proibidos_carregados'):
+            violacoes.append(f"{modulo}: importa {', '.join(medida['proibidos_carregados'])}")
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+    if violacoes:
+        print("\nORÇAMENTO DE IMPORTAÇÃO EXCEDIDO:")
+        for violacao in violacoes:
+            print(f"  {violacao}")
+        sys.exit(1)
+    print(f"\nDentro do orçamento ({args.orcamento:.2f}s além do pandas, sem {', '.join(PROIBIDOS)}).")
@@ -0,0 +1,537 @@
+import argparse
+import contextlib
+import csv
+import functools
+import hashlib
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd # type: ignore # noqa: E402
+
+from executar_benchmark import preparar_dados, versao_gerador, _commit_git # noqa: E402
+from analises_referencia import DIFERENCAS # noqa: E402
+from correspondencia import COLUNAS_CANDIDATO # noqa: E402
+
+PASTA_ORACULOS = os.path.join(RAIZ, 'benchmarks', 'oraculos')
+PASTA_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+# Relatórios do app (analisar_pendencias) e dos scripts (executar_* de run_lote.py, os
+# arquivos que seguem para o upload).
+SAIDAS_APP = ['admissoes', 'divergencias', 'demissoes']
+SAIDAS_SCRIPTS = ['eve001_003_023', 'eve012_013', 'outros_eventos']
+SAIDAS = SAIDAS_APP + SAIDAS_SCRIPTS
+# Colunas que o código atual acrescenta a um relatório e o baseline não tem (o candidato
+# provável da Espanha, user-021); qualquer outra coluna a mais (ou a menos) é divergência.
+COLUNAS_ADICIONAIS = {'admissoes': COLUNAS_CANDIDATO, 'eve001_003_023': COLUNAS_CANDIDATO}
+
+# Equivalência entre a implementação original e os caminhos otimizados. O original é
+# benchmarks/analises_referencia.py: o loader, as análises e os scripts do baseline (06413d7),
+# copiados sem alteração. Com --congelar, os relatórios e TXT do original viram o oráculo (CSV
+# e TXT em benchmarks/oraculos/<base>/), junto com o efeito de cada diferença declarada
+# (analises_referencia.DIFERENCAS) sobre eles e o tempo e o pico de memória de cada cenário.
+# Nas execuções seguintes:
+# - o original é comparado linha a linha com o oráculo;
+# - o efeito de cada diferença declarada, sozinha e de todas juntas, é comparado com o
+#   congelado: uma diferença que passa a mudar outras linhas (ou deixa de mudar) aparece;
+# - cada caminho otimizado é comparado com a referência, o original com todas as
+#   diferenças declaradas, e com o tempo e a memória congelados.
+# Os oráculos das bases sintéticas são versionados; os das bases gravadas (gravado_*) têm
+# dados pessoais e ficam fora do git.
+
+# carga -> opções de load_and_prepare_data ('original': o loader do baseline). 'cache' é lida
+# duas vezes; vale a segunda leitura.
+CARGAS = {
+    'original': None,
+    'padrao': {'usar_cache': False, 'streaming': False},
+    'cache': {'usar_cache': True, 'streaming': False},
+    'streaming': {'usar_cache': False, 'streaming': True},
+}
+
+def _referencia(brasil, espanha, data_referencia, diferencas=tuple(DIFERENCAS)):
+    import analises_referencia
+    return analises_referencia.analisar(brasil, espanha, data_referencia, diferencas)
+
+def _analisar_pendencias(brasil, espanha, data_referencia, **opcoes):
+    from analysis_functions import analisar_pendencias
+    return analisar_pendencias(brasil, espanha, data_referencia, **opcoes)
+
+def _por_pagina(brasil, espanha, data_referencia):
+    import analysis_functions as af
+    return {
+        'admissoes': af.analisar_admissoes_recontratacoes(brasil, espanha, data_referencia),
+        'divergencias': af.analisar_divergencias_info(brasil, espanha),
+        'demissoes': af.analisar_demissoes(brasil, espanha, data_referencia),
+    }
+
+def _memoizado(brasil, espanha, data_referencia):
+    # A segunda chamada sai do cache: é ela que precisa bater com o oráculo.
+    import memoizacao
+    memoizacao.configurar(memoizacao.BackendLRU())
+    try:
+        _analisar_pendencias(brasil, espanha, data_referencia)
+        return _analisar_pendencias(brasil, espanha, data_referencia)
+    finally:
+        memoizacao.configurar(None)
+
+def _as_of_posterior(brasil, espanha, data_referencia):
+    # O índice temporal numa data posterior a todo o histórico devolve o resultado atual.
+    as_of = max(brasil['data_efetiva'].max(), espanha['data_efetiva'].max()) + pd.Timedelta(days=1)
+    return _analisar_pendencias(brasil, espanha, data_referencia, as_of=as_of)
+
+def _sem_copy_on_write(brasil, espanha, data_referencia):
+    # Os pontos de entrada ligam o copy-on-write (core_processing.ativar_copy_on_write), mas
+    # quem usa as análises como biblioteca pode estar no modo antigo do pandas: sem as cópias
+    # defensivas, ele precisa dar o mesmo resultado, e uma escrita sobre um recorte das
+    # bases (SettingWithCopy) vira erro.
+    with pd.option_context('mode.copy_on_write', False, 'mode.chained_assignment', 'raise'):
+        return {**_analisar_pendencias(brasil, espanha, data_referencia), **_executar_scripts(brasil, espanha, data_referencia)}
+
+def _ler_saida(caminho):
+    if not os.path.exists(caminho):
+        return ''
+    with open(caminho, 'rb') as f:
+        return f.read().decode('utf-8')
+
+# script -> (função, relatório, TXT), como em run_lote.py.
+SCRIPTS = {
+    'eve001_003_023': ('run_eve001.executar_novos_colaboradores', 'eve001_003_023_pendencias', 'chapas_eve001_003_023.txt'),
+    'eve012_013': ('run_eve012_013.executar_divergencias', 'eve012_013_divergencias_detectadas', 'chapas_eve012_013.txt'),
+    'outros_eventos': ('run_outros_eventos.executar_outros_eventos', 'outros_eventos_divergentes', 'chapas_outros_eventos.txt'),
+}
+
+def _executar_scripts(brasil, espanha, data_referencia, scripts=SAIDAS_SCRIPTS, motor=None):
+    # Os arquivos gravados pelos scripts (CSV e TXT), numa pasta temporária. O as_of fixa a
+    # data de referência do prazo de admissão (sem ele seria hoje) e, sem 'historico', nada
+    # é gravado no histórico de resultados.
+    import importlib
+    saidas = {}
+    with tempfile.TemporaryDirectory() as pasta, contextlib.redirect_stdout(io.StringIO()):
+        for nome in scripts:
+            caminho_funcao, relatorio, txt = SCRIPTS[nome]
+            modulo, funcao = caminho_funcao.rsplit('.', 1)
+            opcoes = {'motor': motor} if motor else {}
+            pasta_saida = os.path.join(pasta, nome)
+            os.makedirs(pasta_saida)
+            getattr(importlib.import_module(modulo), funcao)(brasil, espanha, pasta_saida, 'csv', as_of=data_referencia, **opcoes)
+            saidas[nome] = (_ler_saida(os.path.join(pasta_saida, f'{relatorio}.csv')), _ler_saida(os.path.join(pasta_saida, txt)))
+    return saidas
+
+# Limite de cada execução do run_lote.py: uma execução travada vira erro do cenário.
+SEGUNDOS_LIMITE_LOTE = 600
+
+def _executar_lote(brasil, espanha, data_referencia, opcoes=()):
+    # O run_lote.py de verdade, num processo à parte: as análises em threads, cada uma com a
+    # sua carga de trabalho (DuckDB, partições em processos) ao mesmo tempo que as outras.
+    # Ele carrega as bases da pasta atual, como na linha de comando; as bases recebidas não
+    # são usadas.
+    with tempfile.TemporaryDirectory() as pasta:
+        comando = [sys.executable, os.path.join(RAIZ, 'run_lote.py'), '--formato', 'csv', '--pasta-saida', pasta,
+                   '--as-of', data_referencia.date().isoformat(), *opcoes]
+        # Sessão própria: no tempo limite, os processos das partições também são encerrados.
+        processo = subprocess.Popen(comando, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                    start_new_session=True)
+        try:
+            log = processo.communicate(timeout=SEGUNDOS_LIMITE_LOTE)[0]
+        except subprocess.TimeoutExpired:
+            os.killpg(processo.pid, signal.SIGKILL)
+            processo.communicate()
+            raise TimeoutError(f"run_lote.py {' '.join(opcoes)} não terminou em {SEGUNDOS_LIMITE_LOTE}s")
+        if processo.returncode != 0:
+            raise RuntimeError(f"run_lote.py {' '.join(opcoes)} saiu com código {processo.returncode}: {log[-2000:]}")
+        pasta_saida = os.path.join(pasta, os.listdir(pasta)[0])
+        saidas = {nome: (_ler_saida(os.path.join(pasta_saida, f'app_{nome}_pendencias.csv')),
+                         _ler_saida(os.path.join(pasta_saida, f'chapas_app_{nome}.txt'))) for nome in SAIDAS_APP}
+        for nome, (_, relatorio, txt) in SCRIPTS.items():
+            saidas[nome] = (_ler_saida(os.path.join(pasta_saida, f'{relatorio}.csv')), _ler_saida(os.path.join(pasta_saida, txt)))
+    return saidas
+
+# cenário -> (carga, função (brasil, espanha, data_referencia) -> {saída: (df ou CSV já gravado, txt)}).
+CENARIOS = {
+    'original': ('original', functools.partial(_referencia, diferencas=())),
+    'referencia': ('original', _referencia),
+    **{f'diferenca.{d}': ('original', functools.partial(_referencia, diferencas=(d,))) for d in DIFERENCAS},
+    'padrao': ('padrao', _analisar_pendencias),
+    'cache': ('cache', _analisar_pendencias),
+    'streaming': ('streaming', _analisar_pendencias),
+    'por_pagina': ('padrao', _por_pagina),
+    'memoizado': ('padrao', _memoizado),
+    'as_of': ('padrao', _as_of_posterior),
+    'particionado': ('padrao', functools.partial(_analisar_pendencias, particoes=2)),
+    'duckdb': ('padrao', functools.partial(_analisar_pendencias, motor='duckdb')),
+    'sem_copy_on_write': ('padrao', _sem_copy_on_write),
+    'scripts': ('padrao', _executar_scripts),
+    'scripts_streaming': ('streaming', _executar_scripts),
+    'outros_eventos_duckdb': ('padrao', functools.partial(_executar_scripts, scripts=['outros_eventos'], motor='duckdb')),
+    # Motor DuckDB e partições juntos, sob o executor de threads (o padrão do lote).
+    'lote_duckdb_particoes': ('padrao', functools.partial(_executar_lote, opcoes=('--executor', 'threads', '--motor', 'duckdb',
+                                                                                  '--particoes', '3'))),
+}
+# Executados sempre: o original, a referência e cada diferença declarada sozinha.
+CENARIOS_REFERENCIA = ['original', 'referencia'] + [f'diferenca.{d}' for d in DIFERENCAS]
+# Cenários que dependem do pacote opcional duckdb.
+CENARIOS_DUCKDB = ['duckdb', 'outros_eventos_duckdb', 'lote_duckdb_particoes']
+
+def _medir(funcao, *args, memoria=True):
+    # Tempo numa chamada sem rastreamento; pico de memória (alocações Python e NumPy) numa
+    # segunda chamada sob tracemalloc, que deixa o tempo mais lento.
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    segundos = time.perf_counter() - inicio
+    pico_mb = None
+    if memoria:
+        tracemalloc.start()
+        try:
+            funcao(*args)
+            pico_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        finally:
+            tracemalloc.stop()
+    return resultado, {'segundos': round(segundos, 4), 'pico_mb': None if pico_mb is None else round(pico_mb, 1)}
+
+def _carregar(opcoes):
+    if opcoes is None:
+        import analises_referencia
+        return analises_referencia.load_and_prepare_data()
+    import core_processing as cp
+    if opcoes.get('usar_cache'):
+        cp.load_and_prepare_data(**opcoes)
+    return cp.load_and_prepare_data(**opcoes)
+
+def _csv(relatorio):
+    # O que segue para fora: o relatório como CSV (mesmo escritor do download e dos scripts).
+    # Sem relatório (script que não gravou arquivo), texto vazio.
+    from exportacao import relatorio_em_bytes
+    if relatorio is None or isinstance(relatorio, str):
+        return relatorio or ''
+    return relatorio_em_bytes(relatorio, 'csv').decode('utf-8')
+
+def _saidas(resultado):
+    return {nome: {'csv': _csv(relatorio), 'txt': txt} for nome, (relatorio, txt) in resultado.items()}
+
+def _executar_cenarios(pasta_base, data_referencia, cenarios, memoria, memoria_carga):
+    # Executado num processo novo por base: o cache do loader e a memoização não vazam entre bases.
+    os.chdir(pasta_base)
+    # Sem tipos compactos, as colunas de texto geram avisos de depreciação do pandas a cada visão.
+    warnings.simplefilter('ignore', FutureWarning)
+    import core_processing as cp
+    import memoizacao
+    cp.ativar_copy_on_write()
+    memoizacao.configurar(None)
+    cargas, etapas, saidas, erros = {}, {}, {}, {}
+    for cenario in cenarios:
+        nome_carga, funcao = CENARIOS[cenario]
+        try:
+            if nome_carga not in cargas:
+                cargas[nome_carga], etapas[f'carga.{nome_carga}'] = _medir(_carregar, CARGAS[nome_carga],
+                                                                             memoria=memoria_carga)
+            brasil, espanha = cargas[nome_carga]
+            if brasil is None or espanha is None:
+                raise RuntimeError("falha na carga dos dados")
+            resultado, etapas[f'analise.{cenario}'] = _medir(funcao, brasil, espanha, data_referencia, memoria=memoria)
+            saidas[cenario] = _saidas(resultado)
+        except Exception as e:
+            erros[cenario] = f"{type(e).__name__}: {e}"
+    return {'etapas': etapas, 'saidas': saidas, 'erros': erros}
+
+# --- Comparação linha a linha ---
+
+def projetar_csv(texto, colunas):
+    # Só as colunas informadas, na ordem informada, reescritas com o mesmo dialeto.
+    linhas = list(csv.reader(io.StringIO(texto.lstrip('\ufeff')), delimiter=';'))
+    if not linhas:
+        return ''
+    posicoes = [linhas[0].index(col) for col in colunas]
+    saida = io.StringIO()
+    csv.writer(saida, delimiter=';', lineterminator='\n').writerows([linha[p] for p in posicoes] for linha in linhas)
+    return saida.getvalue()
+
+def colunas_csv(texto):
+    return next(csv.reader(io.StringIO(texto.lstrip('\ufeff')), delimiter=';'), [])
+
+def diferencas_csv(referencia, variante, limite=5, adicionais=()):
+    # Relatório de uma análise original que falhou: 'ERRO: ...' (analises_referencia._executar).
+    if referencia.startswith('ERRO:') or variante.startswith('ERRO:'):
+        return [] if referencia == variante else [f"{referencia[:300] or 'sem relatório'} -> {variante[:300] or 'sem relatório'}"]
+    colunas_ref, colunas_var = colunas_csv(referencia), colunas_csv(variante)
+    faltando = [col for col in colunas_ref if col not in colunas_var]
+    sobrando = [col for col in colunas_var if col not in colunas_ref and col not in adicionais]
+    if faltando or sobrando:
+        return [f"cabeçalho: colunas só na referência {faltando}, só na variante {sobrando}"]
+    if colunas_var != colunas_ref:
+        # Colunas adicionais permitidas: compara só as da referência.
+        referencia, variante = projetar_csv(referencia, colunas_ref), projetar_csv(variante, colunas_ref)
+    linhas_ref, linhas_var = referencia.splitlines(), variante.splitlines()
+    if linhas_ref[:1] != linhas_var[:1]:
+        return [f"cabeçalho: {linhas_ref[:1]} -> {linhas_var[:1]}"]
+    contagem_ref, contagem_var = Counter(linhas_ref[1:]), Counter(linhas_var[1:])
+    faltando, sobrando = list((contagem_ref - contagem_var).elements()), list((contagem_var - contagem_ref).elements())
+    diferencas = [f"linha só na referência: {linha}" for linha in faltando[:limite]]
+    diferencas += [f"linha só na variante: {linha}" for linha in sobrando[:limite]]
+    if len(faltando) + len(sobrando) > 2 * limite:
+        diferencas.append(f"... {len(faltando)} linhas faltando e {len(sobrando)} sobrando no total")
+    if not diferencas and linhas_ref != linhas_var:
+        posicao = next(i for i, (a, b) in enumerate(zip(linhas_ref, linhas_var)) if a != b)
+        diferencas.append(f"mesmas linhas em outra ordem, a partir da linha {posicao}: {linhas_ref[posicao]} -> {linhas_var[posicao]}")
+    return diferencas
+
+def secoes_txt(txt):
+    # '--------------EVE012------------' seguido das chapas separadas por ';'.
+    secoes, titulo = {}, None
+    for linha in (txt or '').splitlines():
+        if linha.startswith('---'):
+            titulo = linha.strip('-')
+            secoes[titulo] = []
+        elif linha.strip() and titulo is not None:
+            secoes[titulo].extend(linha.split(';'))
+    return secoes
+
+def diferencas_txt(referencia, variante, limite=10):
+    if referencia == variante:
+        return []
+    secoes_ref, secoes_var = secoes_txt(referencia), secoes_txt(variante)
+    diferencas = []
+    for titulo in list(secoes_ref) + [t for t in secoes_var if t not in secoes_ref]:
+        chapas_ref, chapas_var = secoes_ref.get(titulo, []), secoes_var.get(titulo, [])
+        faltando = [c for c in chapas_ref if c not in set(chapas_var)]
+        sobrando = [c for c in chapas_var if c not in set(chapas_ref)]
+        if faltando:
+            diferencas.append(f"{titulo}: {len(faltando)} chapas só na referência ({';'.join(faltando[:limite])})")
+        if sobrando:
+            diferencas.append(f"{titulo}: {len(sobrando)} chapas só na variante ({';'.join(sobrando[:limite])})")
+        if not faltando and not sobrando and chapas_ref != chapas_var:
+            diferencas.append(f"{titulo}: mesmas chapas em outra ordem")
+    return diferencas or ["TXT com as mesmas chapas, mas texto diferente (títulos ou separadores)"]
+
+def comparar_saidas(oraculo, saidas):
+    # Cada cenário produz parte das saídas (os do app, as três do app; os de scripts, as dos scripts).
+    diferencas = {}
+    for nome in saidas:
+        encontradas = (diferencas_csv(oraculo[nome]['csv'], saidas[nome]['csv'], adicionais=COLUNAS_ADICIONAIS.get(nome, ()))
+                       + [f"TXT {d}" for d in diferencas_txt(oraculo[nome]['txt'], saidas[nome]['txt'])])
+        if encontradas:
+            diferencas[nome] = encontradas
+    return diferencas
+
+def comparar_etapas(etapas, congeladas, tolerancia, piso_segundos, piso_mb):
+    # Mesma regra do executar_benchmark.py: acima da tolerância relativa e do piso absoluto.
+    regressoes = []
+    for etapa, medida in etapas.items():
+        anterior = congeladas.get(etapa)
+        if anterior is None:
+            continue
+        for metrica, piso in [('segundos', piso_segundos), ('pico_mb', piso_mb)]:
+            antes, depois = anterior.get(metrica), medida.get(metrica)
+            if antes is not None and depois is not None and depois > antes * (1 + tolerancia) and depois - antes > piso:
+                regressoes.append((etapa, metrica, antes, depois))
+    return regressoes
+
+# --- Oráculos ---
+
+def impressao_das_fontes(pasta_base):
+    hash_fontes = hashlib.sha256()
+    pasta_data = os.path.join(pasta_base, 'data')
+    for nome in sorted(os.listdir(pasta_data)):
+        caminho = os.path.join(pasta_data, nome)
+        if os.path.isfile(caminho) and nome.lower().endswith(('.xlsx', '.xls', '.csv')):
+            hash_fontes.update(nome.encode())
+            with open(caminho, 'rb') as f:
+                for bloco in iter(lambda: f.read(1 << 20), b''):
+                    hash_fontes.update(bloco)
+    return hash_fontes.hexdigest()[:16]
+
+def impressao_sintetica(parametros):
+    # As planilhas regeradas mudam de bytes (metadados do xlsx) sem mudar de conteúdo: a base
+    # sintética é identificada pelos parâmetros e pela versão do gerador.
+    return hashlib.sha256(json.dumps({**parametros, 'gerador': versao_gerador()}, sort_keys=True).encode()).hexdigest()[:16]
+
+def _maquina():
+    # Metas de tempo e memória só valem na máquina em que o oráculo foi congelado.
+    import platform
+    return f"{platform.node()} | {platform.machine()} | {os.cpu_count()} CPUs | Python {platform.python_version()}"
+
+def ler_oraculo(pasta_oraculo):
+    caminho_manifesto = os.path.join(pasta_oraculo, 'manifesto.json')
+    if not os.path.exists(caminho_manifesto):
+        return None, None
+    with open(caminho_manifesto, 'r', encoding='utf-8') as f:
+        manifesto = json.load(f)
+    saidas = {}
+    for nome in SAIDAS:
+        with open(os.path.join(pasta_oraculo, f'{nome}.csv'), 'r', encoding='utf-8', newline='') as f:
+            relatorio = f.read()
+        with open(os.path.join(pasta_oraculo, f'{nome}.txt'), 'r', encoding='utf-8', newline='') as f:
+            saidas[nome] = {'csv': relatorio, 'txt': f.read()}
+    return manifesto, saidas
+
+def congelar_oraculo(pasta_oraculo, saidas, manifesto):
+    os.makedirs(pasta_oraculo, exist_ok=True)
+    for nome in SAIDAS:
+        with open(os.path.join(pasta_oraculo, f'{nome}.csv'), 'w', encoding='utf-8', newline='') as f:
+            f.write(saidas[nome]['csv'])
+        with open(os.path.join(pasta_oraculo, f'{nome}.txt'), 'w', encoding='utf-8', newline='') as f:
+            f.write(saidas[nome]['txt'])
+    with open(os.path.join(pasta_oraculo, 'manifesto.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+
+def _bases(args):
+    # (nome, pasta com data/, data de referência padrão, impressão das fontes)
+    bases = []
+    for colaboradores in args.colaboradores:
+        parametros = {
+            'colaboradores': colaboradores, 'eventos_por_colaborador': args.eventos_por_colaborador,
+            'taxa_expatriados': 0.05, 'taxa_divergencia': 0.05, 'semente': args.semente, 'data_referencia': '2025-01-01',
+        }
+        pasta_base = preparar_dados(parametros)
+        bases.append((f"sintetico_{os.path.basename(pasta_base)}", pasta_base, parametros['data_referencia'],
+                      impressao_sintetica(parametros)))
+    for pasta in args.pasta:
+        pasta = os.path.abspath(pasta)
+        bases.append((f"gravado_{os.path.basename(pasta)}", pasta, None, impressao_das_fontes(pasta)))
+    return bases
+
+def verificar_base(nome, pasta_base, data_referencia_padrao, impressao, args):
+    pasta_oraculo = os.path.join(args.oraculos, nome)
+    manifesto, oraculo = (None, None) if args.congelar else ler_oraculo(pasta_oraculo)
+    if manifesto is not None and manifesto['impressao_fontes'] != impressao:
+        return {'base': nome, 'erro': f"as bases em '{pasta_base}' mudaram desde o congelamento do oráculo; congele novamente."}
+    data_referencia = (manifesto['data_referencia'] if manifesto else
+                       args.data_referencia or data_referencia_padrao or pd.Timestamp.now().normalize().date().isoformat())
+
+    # O original, a referência e as diferenças rodam sempre; o DuckDB, por padrão, só quando o
+    # pacote opcional está instalado.
+    cenarios = CENARIOS_REFERENCIA + [c for c in (args.cenarios or CENARIOS) if c not in CENARIOS_REFERENCIA]
+    if not args.cenarios:
+        import importlib.util
+        if importlib.util.find_spec('duckdb') is None:
+            cenarios = [c for c in cenarios if c not in CENARIOS_DUCKDB]
+    print(f"\n--- EQUIVALÊNCIA: {nome} (data de referência {data_referencia}, {len(cenarios)} cenários) ---")
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        execucao = executor.submit(_executar_cenarios, pasta_base, pd.Timestamp(data_referencia), cenarios,
+                                   not args.sem_memoria, args.memoria_carga).result()
+
+    resultado = {'base': nome, 'data_referencia': data_referencia, 'etapas': execucao['etapas'], 'cenarios': {},
+                 'diferencas': {}}
+    falhas = {c: execucao['erros'][c] for c in CENARIOS_REFERENCIA if c in execucao['erros']}
+    if falhas:
+        resultado['erro'] = f"o original falhou: {falhas}"
+        return resultado
+    original, referencia = execucao['saidas']['original'], execucao['saidas']['referencia']
+    # Efeito de cada diferença declarada, sozinha e de todas juntas, sobre os relatórios originais.
+    efeitos = {d: comparar_saidas(original, execucao['saidas'][f'diferenca.{d}']) for d in DIFERENCAS}
+    efeitos['todas'] = comparar_saidas(original, referencia)
+    if args.congelar:
+        congelar_oraculo(pasta_oraculo, original, {
+            'base': nome, 'impressao_fontes': impressao, 'data_referencia': data_referencia,
+            'congelado_em': datetime.now().isoformat(timespec='seconds'), 'commit': _commit_git(),
+            'linhas': {n: max(original[n]['csv'].count('\n') - 1, 0) for n in SAIDAS},
+            'diferencas': efeitos, 'maquina': _maquina(), 'etapas': execucao['etapas'],
+        })
+        print(f"-> Oráculo congelado em: {pasta_oraculo}")
+        oraculo, manifesto = original, {'etapas': {}, 'diferencas': efeitos}
+    elif oraculo is None:
+        print(f"AVISO: sem oráculo em '{pasta_oraculo}'; comparando com o original desta execução, sem metas de "
+              f"tempo e memória. Use --congelar a partir de um commit conhecido como correto.")
+        oraculo, manifesto = original, {'etapas': {}, 'diferencas': efeitos}
+    elif manifesto.get('maquina') != _maquina():
+        print(f"AVISO: oráculo congelado em outra máquina ({manifesto.get('maquina')}); só os relatórios são comparados, "
+              f"sem metas de tempo e memória.")
+        manifesto = {**manifesto, 'etapas': {}}
+
+    for diferenca, efeito in efeitos.items():
+        congelado = manifesto.get('diferencas', {}).get(diferenca)
+        resultado['diferencas'][diferenca] = {'status': 'ok' if efeito == congelado else 'alterada', 'efeito': efeito,
+                                              'congelado': congelado}
+    for cenario in cenarios:
+        if cenario in CENARIOS_REFERENCIA and cenario != 'original':
+            continue
+        if cenario in execucao['erros']:
+            resultado['cenarios'][cenario] = {'status': 'erro', 'erro': execucao['erros'][cenario]}
+            continue
+        # O original contra o oráculo; os caminhos otimizados contra a referência.
+        diferencas = comparar_saidas(oraculo if cenario == 'original' else referencia, execucao['saidas'][cenario])
+        resultado['cenarios'][cenario] = {'status': 'divergente' if diferencas else 'ok', 'diferencas': diferencas}
+    resultado['regressoes'] = comparar_etapas(execucao['etapas'], manifesto['etapas'], args.tolerancia,
+                                              args.piso_segundos, args.piso_mb)
+    return resultado
+
+def _imprimir(resultado):
+    if 'erro' in resultado:
+        print(f"ERRO [{resultado['base']}]: {resultado['erro']}")
+        return
+    for diferenca, situacao in resultado['diferencas'].items():
+        pedido = DIFERENCAS[diferenca][0] if diferenca in DIFERENCAS else 'todas as diferenças declaradas'
+        print(f"  diferença {diferenca} ({pedido}): {situacao['status']}")
+        for relatorio, linhas in situacao['efeito'].items():
+            for linha in linhas:
+                print(f"      [{relatorio}] {linha}")
+        if situacao['status'] == 'alterada':
+            print(f"      congelado: {situacao['congelado']}")
+    for cenario, situacao in resultado['cenarios'].items():
+        etapa = resultado['etapas'].get(f'analise.{cenario}', {})
+        print(f"  {cenario:<22} {situacao['status']:<10} {etapa.get('segundos', 0):>8.3f}s  pico {etapa.get('pico_mb')} MB")
+        if situacao['status'] == 'erro':
+            print(f"      {situacao['erro']}")
+        for relatorio, diferencas in situacao.get('diferencas', {}).items():
+            for diferenca in diferencas:
+                print(f"      [{relatorio}] {diferenca}")
+    for etapa, metrica, antes, depois in resultado['regressoes']:
+        print(f"  REGRESSÃO {etapa} / {metrica}: {antes} -> {depois}")
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Compara os caminhos otimizados com a referência congelada (relatórios, TXT, tempo e memória).")
+    parser.add_argument('--colaboradores', type=int, nargs='*', default=[2_000],
+                        help="Bases sintéticas a gerar (uma por tamanho). Use '--colaboradores' sem valores para nenhuma.")
+    parser.add_argument('--eventos-por-colaborador', type=float, default=3.0)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--pasta', nargs='*', default=[], metavar='PASTA',
+                        help="Bases gravadas: pastas com 'data/Base RM.xlsx', 'data/Base SF.xlsx' e o mapeamento.")
+    parser.add_argument('--data-referencia', default=None,
+                        help="Data de referência ao congelar (padrão: a das bases sintéticas, ou hoje). Depois vale a do oráculo.")
+    parser.add_argument('--cenarios', nargs='*', choices=list(CENARIOS), default=None)
+    parser.add_argument('--oraculos', default=PASTA_ORACULOS)
+    parser.add_argument('--congelar', action='store_true', help="Grava a referência desta execução como oráculo.")
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="Aumento relativo de tempo ou memória tolerado.")
+    parser.add_argument('--piso-segundos', type=float, default=0.05, help="Diferenças de tempo abaixo disto são ruído.")
+    parser.add_argument('--piso-mb', type=float, default=5.0, help="Diferenças de memória abaixo disto são ruído.")
+    parser.add_argument('--sem-memoria', action='store_true', help="Não mede o pico de memória das análises (cada uma roda uma vez só).")
+    parser.add_argument('--memoria-carga', action='store_true',
+                        help="Mede também o pico de memória das cargas (sob tracemalloc a leitura das planilhas fica ~5x mais lenta).")
+    parser.add_argument('--saida', default=None, help="Arquivo JSON de resultados.")
+    return parser.parse_args()
+
+def main():
+    args = _argumentos()
+    resultados = [verificar_base(*base, args) for base in _bases(args)]
+    for resultado in resultados:
+        print(f"\n{resultado['base']}")
+        _imprimir(resultado)
+
+    caminho_saida = args.saida or os.path.join(PASTA_RESULTADOS, f"equivalencia_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(caminho_saida)), exist_ok=True)
+    with open(caminho_saida, 'w', encoding='utf-8') as f:
+        json.dump({'executado_em': datetime.now().isoformat(timespec='seconds'), 'commit': _commit_git(),
+                   'resultados': resultados}, f, ensure_ascii=False, indent=2)
+    print(f"\n-> Resultados gravados em: {caminho_saida}")
+
+    falhou = any('erro' in r or r['regressoes'] or any(c['status'] != 'ok' for c in r['cenarios'].values())
+                 or any(d['status'] != 'ok' for d in r['diferencas'].values()) for r in resultados)
+    if falhou:
+        sys.exit(1)
+    print("\nOriginal igual ao oráculo, diferenças declaradas como congeladas e todos os cenários equivalentes à "
+          "referência, dentro das metas de tempo e memória.")
+
+if __name__ == '__main__':
+    main()
@@ -1,47 +1,371 @@
 import pandas as pd # type: ignore
+import numpy as np # type: ignore
 import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 
-def load_and_prepare_data():
-    print("--- CORE: Iniciando carga e preparação dos dados... ---")
-    data_path = 'data'
-    
+from instrumentacao import etapa, medir_etapa
+from memoizacao import registrar_impressao, invalidar_impressao
+
+# Copy-on-write do pandas (o padrão a partir do pandas 3): filtros, seleções de colunas e
+# renomeações compartilham os dados com a base de origem até que alguém escreva neles, e a
+# escrita copia só a coluna alterada. É uma opção global do pandas: os pontos de entrada
+# (app.py, run_*.py, precalculo.py) a ligam, e importar este módulo não muda a configuração
+# de quem o usa como biblioteca. As análises não fazem cópias defensivas e não alteram as
+# bases recebidas em nenhum dos dois modos; sem copy-on-write, só usam mais memória.
+def ativar_copy_on_write():
+    if int(pd.__version__.split('.')[0]) < 3:
+        pd.set_option('mode.copy_on_write', True)
+
+# Incrementar sempre que a renomeação de colunas, o mapeamento de valores ou a
+# limpeza abaixo mudarem, para que snapshots antigos em cache sejam descartados.
+VERSAO_LOGICA_LIMPEZA = 5
+PASTA_CACHE = os.path.join('data', '.cache')
+ARQUIVOS_FONTE = ['Base RM.xlsx', 'Base SF.xlsx', 'mapeamento_valores.xlsx']
+
+COLUNAS_BRASIL = {
+    'LOCAL SYSTEM ID': 'id_sistema_local', 'CHAPA': 'chapa', 'FIRST NAME': 'nome_parcial',
+    'LAST NAME': 'sobrenome', 'HIRE DATE': 'data_admissao', 'EFFECTIVE DATE': 'data_efetiva',
+    'STATUS': 'status_empregado', 'CONTRACT TYPE': 'tipo_contrato', 'JOB': 'cargo',
+    'FAMILY': 'familia', 'CATEGORY': 'categoria', 'EMPLOYMENT TYPE': 'tipo_empregado',
+    'EVENT REASON': 'motivo_evento', 'NATIONALITY': 'nacionalidade', 'EXPA/LOCAL': 'expa_local',
+    'BUSINESS UNIT': 'business_unit',
+    'DTPAGTORESCISAO': 'dt_pagto_rescisao' # <-- NOVA COLUNA ADICIONADA AQUI
+}
+
+COLUNAS_ESPANHA = {
+    'ID sist. nom. local': 'id_sistema_local', 'Nombre': 'nome_parcial', 'Primer apellido': 'sobrenome',
+    'Expa/Local': 'expa_local', 'Detalles de empleo Fecha de inicio original': 'data_admissao',
+    'Detalles de empleo Fecha de terminación de contrato': 'data_demissao', 'Fecha del evento': 'data_efetiva',
+    'Estado de empleado': 'status_empregado', 'Tipo de contrato': 'tipo_contrato', 'Puesto': 'cargo',
+    'Familia': 'familia', 'Categoría': 'categoria', 'Tipo empleado': 'tipo_empregado',
+    'Motivo del evento': 'motivo_evento', 'DG / DN corporativo': 'business_unit',
+    'Primera nacionalidad': 'nacionalidade'
+}
+
+MAPEAMENTOS_ABAS = {
+    'status_empregado': 'Status', 'cargo': 'Cargo', 'familia': 'Familia', 'categoria': 'Categoria',
+    'tipo_empregado': 'Tipo de empregado', 'tipo_contrato': 'Tipo de contrato', 'business_unit': 'Business'
+}
+
+def ordenar_por_data_efetiva(df):
+    # Ordenação estável com datas nulas primeiro: em caso de empate vale a ordem do
+    # arquivo, e registros sem data efetiva nunca são considerados os mais recentes.
+    if 'data_efetiva' not in df.columns:
+        return df
+    return df.sort_values('data_efetiva', kind='mergesort', na_position='first')
+
+def _ordenado_por_data(df):
+    if 'data_efetiva' not in df.columns:
+        return True
+    nulos = df['data_efetiva'].isna().to_numpy()
+    qtd_nulos = int(nulos.sum())
+    return bool(nulos[:qtd_nulos].all()) and df['data_efetiva'].iloc[qtd_nulos:].is_monotonic_increasing
+
+def garantir_ordem_por_data(df):
+    # Os históricos saem do loader já ordenados por data_efetiva e qualquer filtro
+    # booleano preserva essa ordem; só reordena o que chegou de outra fonte.
+    return df if _ordenado_por_data(df) else ordenar_por_data_efetiva(df)
+
+def corte_as_of(datas_ordenadas, qtd_nulos, as_of):
+    # Quantas linhas do histórico ordenado existiam na data: as sem data efetiva (no início
+    # da ordenação) e as com data efetiva até o fim do dia 'as_of'.
+    limite = np.datetime64(pd.Timestamp(as_of).normalize() + pd.Timedelta(days=1), 'ns')
+    return qtd_nulos + int(np.searchsorted(datas_ordenadas[qtd_nulos:], limite, side='left'))
+
+def historico_ate(df, as_of):
+    # O histórico como estava em 'as_of': um prefixo do histórico ordenado, sem cópia nem reordenação.
+    if as_of is None or 'data_efetiva' not in df.columns:
+        return df
+    df = garantir_ordem_por_data(df)
+    datas = df['data_efetiva'].to_numpy(dtype='datetime64[ns]')
+    return df.iloc[:corte_as_of(datas, int(np.isnat(datas).sum()), as_of)]
+
+def registros_mais_recentes(df, chave='id_sistema_local', decrescente=False):
+    # Com o histórico ordenado, o registro mais recente de cada chave é a sua última
+    # ocorrência: uma deduplicação por hash, sem reordenar o histórico.
+    df = garantir_ordem_por_data(df)
+    recentes = df.drop_duplicates(subset=chave, keep='last')
+    return recentes.iloc[::-1] if decrescente else recentes
+
+# Colunas de domínio fechado que viram 'category'. Quando a coluna existe nas duas
+# bases, Brasil e Espanha compartilham as mesmas categorias, o que mantém válidas as
+# comparações '==' / '!=' entre as colunas _br e _es depois dos merges.
+COLUNAS_CATEGORICAS = [
+    'status_empregado', 'cargo', 'familia', 'categoria', 'tipo_empregado', 'tipo_contrato',
+    'business_unit', 'expa_local', 'motivo_evento', 'nacionalidade'
+]
+# Chaves de colaborador: cada família é codificada do mesmo jeito nas duas bases, para
+# que merges, deduplicações e isin comparem valores compactos (Int64 ou categorias
+# compartilhadas) em vez de strings Python. O texto só é gerado no relatório.
+FAMILIAS_CHAVE = {
+    'id_sistema_local': [('Brasil', 'id_sistema_local'), ('Espanha', 'id_sistema_local')],
+    'chapa': [('Brasil', 'chapa'), ('Espanha', 'ID de usuario/empleado')],
+}
+PADRAO_CHAVE_INTEIRA = r'0|[1-9][0-9]{0,17}'
+# Presente só no histórico reduzido (leitura em streaming): quantos registros do
+# histórico completo cada linha representa.
+COLUNA_REGISTROS_AGREGADOS = 'registros_agregados'
+
+def uso_memoria_mb(df):
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
+
+MOTIVOS_CHAVE_INVALIDA = ['ausente', 'vazia', 'não inteira', 'não numérica']
+AUSENTE, VAZIA, NAO_INTEIRA, NAO_NUMERICA = range(len(MOTIVOS_CHAVE_INVALIDA))
+
+def _normalizar_chave(serie):
+    # Devolve a chave como Int64 (nulo quando não é um inteiro válido), o texto canônico
+    # (para colunas numéricas, uma função: só é gerado se a família virar dicionário) e o
+    # código do motivo de cada valor problemático (-1 = chave válida).
+    nula = serie.isna().to_numpy()
+    motivos = np.where(nula, AUSENTE, -1).astype(np.int8)
+    if pd.api.types.is_integer_dtype(serie.dtype):
+        inteiros = serie.astype('Int64')
+        return inteiros, lambda: inteiros.astype('string'), motivos
+    if pd.api.types.is_float_dtype(serie.dtype):
+        inteira = ~nula & (serie == np.floor(serie)).to_numpy() & (serie.abs() < 2 ** 63).to_numpy()
+        motivos[~nula & ~inteira] = NAO_INTEIRA
+        inteiros = serie.where(inteira).astype('Int64')
+        return inteiros, lambda: inteiros.astype('string').where(inteira, serie.astype('string')), motivos
+    # Texto: sem espaços nas pontas e sem o '.0' que o Excel acrescenta a números lidos como float.
+    texto = serie.astype('string').str.strip().str.replace(r'\.0$', '', regex=True)
+    vazia = texto.eq('').to_numpy(dtype=bool, na_value=False)
+    motivos[vazia] = VAZIA
+    texto = texto.mask(vazia)
+    numerica = texto.str.fullmatch(PADRAO_CHAVE_INTEIRA).to_numpy(dtype=bool, na_value=False)
+    motivos[texto.notna().to_numpy() & ~numerica] = NAO_NUMERICA
+    inteiros = pd.to_numeric(texto.where(numerica), errors='coerce').astype('Int64')
+    return inteiros, texto, motivos
+
+def canonicalizar_chaves(bases):
+    # bases: {'Brasil': df, 'Espanha': df}, alterados in-place. Uma família só vira Int64
+    # quando todas as chaves válidas das duas bases são inteiros; se houver alguma
+    # alfanumérica, a família inteira vira uma categoria com o mesmo dicionário nos dois
+    # países (a igualdade continua sendo a do texto). Devolve as chaves inválidas.
+    invalidas = []
+    for familia, colunas in FAMILIAS_CHAVE.items():
+        presentes = [(nome, col) for nome, col in colunas if nome in bases and col in bases[nome].columns]
+        normalizadas = {(nome, col): _normalizar_chave(bases[nome][col]) for nome, col in presentes}
+        alfanumerica = any((motivos == NAO_NUMERICA).any() for _, _, motivos in normalizadas.values())
+        if alfanumerica:
+            normalizadas = {coluna: (inteiros, texto() if callable(texto) else texto, motivos)
+                            for coluna, (inteiros, texto, motivos) in normalizadas.items()}
+            valores = pd.concat([texto for _, texto, _ in normalizadas.values()], ignore_index=True).dropna().unique()
+            tipo = pd.CategoricalDtype(categories=sorted(valores))
+        for (nome, col), (inteiros, texto, motivos) in normalizadas.items():
+            problema = motivos >= 0
+            if problema.any():
+                invalidas.append(pd.DataFrame({
+                    'base': nome, 'coluna': col, 'familia': familia,
+                    'motivo': np.array(MOTIVOS_CHAVE_INVALIDA, dtype=object)[motivos[problema]],
+                    'valor': bases[nome][col].to_numpy(dtype=object)[problema],
+                }))
+            bases[nome][col] = texto.astype(object).where(texto.notna(), np.nan).astype(tipo) if alfanumerica else inteiros
+    if not invalidas:
+        return pd.DataFrame(columns=['base', 'coluna', 'familia', 'motivo', 'valor', 'linhas'])
+    return (pd.concat(invalidas, ignore_index=True).astype({'valor': str})
+            .groupby(['base', 'coluna', 'familia', 'motivo', 'valor'], sort=False).size().rename('linhas').reset_index())
+
+def chave_canonica(serie):
+    # Texto canônico de uma coluna de chave: a mesma igualdade usada por canonicalizar_chaves.
+    _, texto, _ = _normalizar_chave(serie)
+    return texto() if callable(texto) else texto
+
+def avisar_chaves_invalidas(invalidas, exemplos=5):
+    for (base, coluna, motivo), grupo in invalidas.groupby(['base', 'coluna', 'motivo'], sort=False):
+        amostra = ', '.join(map(repr, grupo['valor'].head(exemplos)))
+        print(f"AVISO: {grupo['linhas'].sum()} chave(s) inválida(s) em {base}.{coluna} ({motivo}). Ex.: {amostra}")
+
+def renderizar_chave(serie):
+    # Texto da chave para relatórios e TXT; chaves ausentes saem como 'nan', como antes.
+    return serie.astype(object).where(serie.notna(), np.nan).astype(str)
+
+def normalizar_texto(serie):
+    # Minúsculas e sem acentos: 'JOSÉ' e 'jose' se encontram.
+    return (serie.astype(str).str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+            .str.lower().str.strip())
+
+def compactar_tipos(brasil_limpo, espanha_limpa):
+    for col in COLUNAS_CATEGORICAS:
+        presentes = [df for df in (brasil_limpo, espanha_limpa) if col in df.columns and df[col].dtype == object]
+        if not presentes:
+            continue
+        valores = pd.concat([df[col] for df in presentes], ignore_index=True).dropna().unique()
+        tipo = pd.CategoricalDtype(categories=sorted(valores, key=str))
+        for df in presentes:
+            df[col] = df[col].astype(tipo)
+    return brasil_limpo, espanha_limpa
+
+def codigo_evento(motivo_evento):
+    # 'EVE005 - Despido' -> 'EVE005' (texto antes do primeiro '-', sem espaços nas pontas),
+    # extraído uma vez por valor distinto e devolvido como categoria. Motivo nulo -> código nulo.
+    motivo = motivo_evento if isinstance(motivo_evento.dtype, pd.CategoricalDtype) else motivo_evento.astype('category')
+    textos = pd.Series(motivo.cat.categories).astype(str).str.split('-').str[0].str.strip()
+    codigos_das_categorias, categorias = pd.factorize(textos)
+    codigos = motivo.cat.codes.to_numpy()
+    return pd.Series(pd.Categorical.from_codes(np.where(codigos >= 0, codigos_das_categorias[codigos], -1), categories=categorias),
+                     index=motivo_evento.index, name='evento_codigo')
+
+def codificar_eventos(brasil_limpo, espanha_limpa):
+    # Coluna 'evento_codigo' calculada uma vez na carga, com as mesmas categorias nas duas
+    # bases (para comparar BR x ES); as regras e relatórios de eventos leem essa coluna.
+    codigos = {nome: codigo_evento(df['motivo_evento']) for nome, df in [('brasil', brasil_limpo), ('espanha', espanha_limpa)]
+               if 'motivo_evento' in df.columns}
+    tipo = pd.CategoricalDtype(sorted(set().union(*(serie.cat.categories for serie in codigos.values())), key=str))
+    for nome, df in [('brasil', brasil_limpo), ('espanha', espanha_limpa)]:
+        if nome in codigos:
+            df['evento_codigo'] = codigos[nome].astype(tipo)
+    return brasil_limpo, espanha_limpa
+
+def garantir_codigo_evento(df):
+    # Para bases que não passaram pelo loader (ou snapshots antigos): calcula a coluna sob demanda.
+    if 'evento_codigo' in df.columns or 'motivo_evento' not in df.columns:
+        return df
+    return df.assign(evento_codigo=codigo_evento(df['motivo_evento']))
+
+def detectar_engine_excel():
+    # O calamine (leitor em Rust, somente leitura) é bem mais rápido que o openpyxl;
+    # é usado automaticamente quando o pacote 'python-calamine' estiver instalado.
     try:
-        df_brasil_bruto = pd.read_excel(os.path.join(data_path, 'Base RM.xlsx'))
-        df_espanha_bruto = pd.read_excel(os.path.join(data_path, 'Base SF.xlsx'))
-    except FileNotFoundError as e:
-        print(f"ERRO: Arquivo base não encontrado. Verifique se 'Base RM.xlsx' e 'Base SF.xlsx' estão na pasta 'data/'.\nDetalhe: {e}")
-        return None, None
+        import python_calamine # type: ignore # noqa: F401
+        return 'calamine'
+    except ImportError:
+        return None
+
+def _ler_excel(caminho, engine=None):
+    return pd.read_excel(caminho, engine=engine)
+
+def _ler_mapeamentos(caminho_mapeamento_excel, engine=None):
+    # Abre o arquivo de mapeamento uma única vez e lê todas as abas necessárias.
+    # Abas ausentes ou inválidas são ignoradas, como no carregamento original.
+    mapas = {}
+    try:
+        with pd.ExcelFile(caminho_mapeamento_excel, engine=engine) as xls:
+            for coluna, aba in MAPEAMENTOS_ABAS.items():
+                try:
+                    df_map = xls.parse(aba)
+                    mapas[coluna] = pd.Series(df_map.iloc[:, 1].values, index=df_map.iloc[:, 0]).to_dict()
+                except Exception:
+                    pass
+    except Exception:
+        pass
+    return mapas
+
+def ler_fontes(data_path, engine=None, paralelo=True):
+    caminho_brasil = os.path.join(data_path, 'Base RM.xlsx')
+    caminho_espanha = os.path.join(data_path, 'Base SF.xlsx')
+    caminho_mapeamento = os.path.join(data_path, 'mapeamento_valores.xlsx')
+    for caminho in (caminho_brasil, caminho_espanha):
+        if not os.path.exists(caminho):
+            raise FileNotFoundError(f"Arquivo não encontrado: '{caminho}'")
+
+    if paralelo:
+        try:
+            # As duas bases são lidas ao mesmo tempo em processos separados enquanto
+            # o processo principal lê o arquivo de mapeamento.
+            with ProcessPoolExecutor(max_workers=2) as executor:
+                futuro_brasil = executor.submit(_ler_excel, caminho_brasil, engine)
+                futuro_espanha = executor.submit(_ler_excel, caminho_espanha, engine)
+                mapas = _ler_mapeamentos(caminho_mapeamento, engine)
+                return futuro_brasil.result(), futuro_espanha.result(), mapas
+        except (OSError, RuntimeError) as e:
+            print(f"AVISO: Leitura paralela indisponível, lendo as bases em sequência.\nDetalhe: {e}")
+
+    return _ler_excel(caminho_brasil, engine), _ler_excel(caminho_espanha, engine), _ler_mapeamentos(caminho_mapeamento, engine)
+
+def _hash_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def _calcular_chave_cache(data_path, engine=None, arquivos=ARQUIVOS_FONTE):
+    fontes = []
+    for nome in arquivos:
+        caminho = os.path.join(data_path, nome)
+        if not os.path.exists(caminho):
+            # Sem as bases principais não há o que cachear; o mapeamento é opcional.
+            if nome != 'mapeamento_valores.xlsx':
+                return None
+            fontes.append({'caminho': os.path.abspath(caminho), 'ausente': True})
+            continue
+        info = os.stat(caminho)
+        fontes.append({
+            'caminho': os.path.abspath(caminho), 'tamanho': info.st_size,
+            'mtime_ns': info.st_mtime_ns, 'sha256': _hash_arquivo(caminho)
+        })
+    return {'versao_logica': VERSAO_LOGICA_LIMPEZA, 'engine_excel': engine or 'openpyxl', 'fontes': fontes}
+
+def fontes_alteradas(fontes):
+    # Checagem barata (tamanho e data de modificação, sem reler nem hashear os arquivos).
+    for fonte in fontes:
+        try:
+            info = os.stat(fonte['caminho'])
+        except FileNotFoundError:
+            if not fonte.get('ausente'):
+                return True
+            continue
+        if fonte.get('ausente') or (info.st_size, info.st_mtime_ns) != (fonte['tamanho'], fonte['mtime_ns']):
+            return True
+    return False
+
+def _restaurar_nulos(df):
+    # O Parquet devolve None nas colunas de texto; o loader original produz NaN.
+    for col in df.select_dtypes(include=['object']).columns:
+        df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+def _ler_cache(chave, pasta_cache=PASTA_CACHE):
+    caminho_chave = os.path.join(pasta_cache, 'chave.json')
+    try:
+        with open(caminho_chave, 'r', encoding='utf-8') as f:
+            if json.load(f) != chave:
+                return None
+        brasil_limpo = pd.read_parquet(os.path.join(pasta_cache, 'brasil_limpo.parquet'))
+        espanha_limpa = pd.read_parquet(os.path.join(pasta_cache, 'espanha_limpa.parquet'))
+    except FileNotFoundError:
+        return None
     except Exception as e:
-        print(f"ERRO ao ler os arquivos base.\nDetalhe: {e}")
-        return None, None
+        print(f"AVISO: Cache de dados ignorado por erro de leitura.\nDetalhe: {e}")
+        return None
+    return _restaurar_nulos(brasil_limpo), _restaurar_nulos(espanha_limpa)
 
-    colunas_brasil = {
-        'LOCAL SYSTEM ID': 'id_sistema_local', 'CHAPA': 'chapa', 'FIRST NAME': 'nome_parcial',
-        'LAST NAME': 'sobrenome', 'HIRE DATE': 'data_admissao', 'EFFECTIVE DATE': 'data_efetiva',
-        'STATUS': 'status_empregado', 'CONTRACT TYPE': 'tipo_contrato', 'JOB': 'cargo',
-        'FAMILY': 'familia', 'CATEGORY': 'categoria', 'EMPLOYMENT TYPE': 'tipo_empregado',
-        'EVENT REASON': 'motivo_evento', 'NATIONALITY': 'nacionalidade', 'EXPA/LOCAL': 'expa_local',
-        'BUSINESS UNIT': 'business_unit',
-        'DTPAGTORESCISAO': 'dt_pagto_rescisao' # <-- NOVA COLUNA ADICIONADA AQUI
-    }
-
-    colunas_espanha = {
-        'ID sist. nom. local': 'id_sistema_local', 'Nombre': 'nome_parcial', 'Primer apellido': 'sobrenome',
-        'Expa/Local': 'expa_local', 'Detalles de empleo Fecha de inicio original': 'data_admissao',
-        'Detalles de empleo Fecha de terminación de contrato': 'data_demissao', 'Fecha del evento': 'data_efetiva',
-        'Estado de empleado': 'status_empregado', 'Tipo de contrato': 'tipo_contrato', 'Puesto': 'cargo',
-        'Familia': 'familia', 'Categoría': 'categoria', 'Tipo empleado': 'tipo_empregado',
-        'Motivo del evento': 'motivo_evento', 'DG / DN corporativo': 'business_unit',
-        'Primera nacionalidad': 'nacionalidade'
-    }
-
-    brasil_limpo = df_brasil_bruto.rename(columns=colunas_brasil)
-    espanha_limpa = df_espanha_bruto.rename(columns=colunas_espanha)
+def _gravar_cache(chave, brasil_limpo, espanha_limpa, pasta_cache=PASTA_CACHE):
+    caminho_chave = os.path.join(pasta_cache, 'chave.json')
+    try:
+        os.makedirs(pasta_cache, exist_ok=True)
+        # A chave é removida antes e gravada por último: um snapshot escrito pela
+        # metade nunca é considerado válido.
+        if os.path.exists(caminho_chave):
+            os.remove(caminho_chave)
+        for nome, df in [('brasil_limpo', brasil_limpo), ('espanha_limpa', espanha_limpa)]:
+            destino = os.path.join(pasta_cache, f'{nome}.parquet')
+            df.to_parquet(destino + '.tmp', index=True)
+            os.replace(destino + '.tmp', destino)
+        with open(caminho_chave + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(chave, f, ensure_ascii=False, indent=2)
+        os.replace(caminho_chave + '.tmp', caminho_chave)
+    except Exception as e:
+        print(f"AVISO: Não foi possível gravar o cache de dados limpos.\nDetalhe: {e}")
 
-    if 'nome_parcial' in brasil_limpo.columns and 'sobrenome' in brasil_limpo.columns:
-        brasil_limpo['nome'] = brasil_limpo['nome_parcial'].astype(str) + ' ' + brasil_limpo['sobrenome'].astype(str)
+def padronizar_espanha(df_espanha_bruto):
+    # Também aplicada bloco a bloco na leitura em streaming (reducao_historico.py).
+    espanha_limpa = df_espanha_bruto.rename(columns=COLUNAS_ESPANHA)
     if 'nome_parcial' in espanha_limpa.columns and 'sobrenome' in espanha_limpa.columns:
         espanha_limpa['nome'] = espanha_limpa['nome_parcial'].astype(str) + ' ' + espanha_limpa['sobrenome'].astype(str)
+    datas_espanha = ['data_admissao', 'data_efetiva', 'data_demissao']
+    for data in datas_espanha:
+        if data in espanha_limpa.columns:
+            espanha_limpa[data] = pd.to_datetime(espanha_limpa[data], errors='coerce')
+    return espanha_limpa
+
+def padronizar_brasil(df_brasil_bruto):
+    brasil_limpo = df_brasil_bruto.rename(columns=COLUNAS_BRASIL)
+
+    if 'nome_parcial' in brasil_limpo.columns and 'sobrenome' in brasil_limpo.columns:
+        brasil_limpo['nome'] = brasil_limpo['nome_parcial'].astype(str) + ' ' + brasil_limpo['sobrenome'].astype(str)
 
     if 'chapa' not in brasil_limpo.columns and 'id_sistema_local' in brasil_limpo.columns:
         brasil_limpo['chapa'] = brasil_limpo['id_sistema_local']
@@ -51,35 +375,156 @@ def load_and_prepare_data():
     for data in datas_brasil:
         if data in brasil_limpo.columns:
             brasil_limpo[data] = pd.to_datetime(brasil_limpo[data], errors='coerce')
-    
-    datas_espanha = ['data_admissao', 'data_efetiva', 'data_demissao']
-    for data in datas_espanha:
-        if data in espanha_limpa.columns:
-            espanha_limpa[data] = pd.to_datetime(espanha_limpa[data], errors='coerce')
-    
-    mapeamentos_abas = {
-        'status_empregado': 'Status', 'cargo': 'Cargo', 'familia': 'Familia', 'categoria': 'Categoria', 
-        'tipo_empregado': 'Tipo de empregado', 'tipo_contrato': 'Tipo de contrato', 'business_unit': 'Business'
-    }
-    caminho_mapeamento_excel = os.path.join(data_path, 'mapeamento_valores.xlsx')
-    for coluna, aba in mapeamentos_abas.items():
+    return brasil_limpo
+
+@medir_etapa('limpeza.padronizacao')
+def padronizar_colunas(df_brasil_bruto, df_espanha_bruto):
+    return padronizar_brasil(df_brasil_bruto), padronizar_espanha(df_espanha_bruto)
+
+@medir_etapa('limpeza.mapeamento')
+def aplicar_mapeamentos(brasil_limpo, mapas_valores):
+    for coluna, map_dict in mapas_valores.items():
         if coluna in brasil_limpo.columns:
             try:
-                df_map = pd.read_excel(caminho_mapeamento_excel, sheet_name=aba)
-                map_dict = pd.Series(df_map.iloc[:, 1].values, index=df_map.iloc[:, 0]).to_dict()
                 brasil_limpo[coluna] = brasil_limpo[coluna].map(map_dict).fillna(brasil_limpo[coluna])
             except Exception:
                 pass
+    return brasil_limpo
+
+def finalizar_limpeza(brasil_limpo, espanha_limpa, compactar=True):
+    total_linhas = len(brasil_limpo) + len(espanha_limpa)
+    # As chaves ficam de fora: em colunas mistas o .str.strip() anularia os números, e
+    # canonicalizar_chaves já remove os espaços.
+    colunas_chave = {col for colunas in FAMILIAS_CHAVE.values() for _, col in colunas}
+    with etapa('limpeza.strip', linhas_entrada=total_linhas):
+        for col in brasil_limpo.select_dtypes(include=['object']).columns.difference(colunas_chave, sort=False):
+            brasil_limpo[col] = brasil_limpo[col].str.strip()
+        for col in espanha_limpa.select_dtypes(include=['object']).columns.difference(colunas_chave, sort=False):
+            espanha_limpa[col] = espanha_limpa[col].str.strip()
+
+    with etapa('limpeza.chaves', linhas_entrada=total_linhas):
+        invalidas = canonicalizar_chaves({'Brasil': brasil_limpo, 'Espanha': espanha_limpa})
+    avisar_chaves_invalidas(invalidas)
+
+    if compactar:
+        with etapa('limpeza.compactacao', linhas_entrada=total_linhas):
+            memoria_antes = (uso_memoria_mb(brasil_limpo), uso_memoria_mb(espanha_limpa))
+            brasil_limpo, espanha_limpa = compactar_tipos(brasil_limpo, espanha_limpa)
+            for nome, antes, df in [('Brasil', memoria_antes[0], brasil_limpo), ('Espanha', memoria_antes[1], espanha_limpa)]:
+                depois = uso_memoria_mb(df)
+                reducao = (1 - depois / antes) * 100 if antes else 0
+                print(f"--- CORE: Memória da base {nome}: {antes:.1f} MB -> {depois:.1f} MB (-{reducao:.0f}%). ---")
+
+    with etapa('limpeza.eventos', linhas_entrada=total_linhas):
+        brasil_limpo, espanha_limpa = codificar_eventos(brasil_limpo, espanha_limpa)
+
+    # Ordena os históricos uma única vez; as análises aproveitam essa ordem em
+    # registros_mais_recentes() em vez de reordenar a cada chamada.
+    with etapa('limpeza.ordenacao', linhas_entrada=total_linhas):
+        brasil_limpo = ordenar_por_data_efetiva(brasil_limpo).reset_index(drop=True)
+        espanha_limpa = ordenar_por_data_efetiva(espanha_limpa).reset_index(drop=True)
+    return brasil_limpo, espanha_limpa
+
+def preparar_bases(df_brasil_bruto, df_espanha_bruto, mapas_valores, compactar=True):
+    brasil_limpo, espanha_limpa = padronizar_colunas(df_brasil_bruto, df_espanha_bruto)
+    brasil_limpo = aplicar_mapeamentos(brasil_limpo, mapas_valores)
+    return finalizar_limpeza(brasil_limpo, espanha_limpa, compactar)
+
+class ConjuntoDados:
+    # Resultado da carga: as duas bases e uma impressão digital do conteúdo, derivada da
+    # chave do cache (hash dos arquivos de origem + versão da limpeza) e calculada uma única
+    # vez. A memoização das análises usa essa impressão em vez de hashear as bases. Desempacota
+    # como a tupla de antes: brasil_limpo, espanha_limpa = load_and_prepare_data().
+    __slots__ = ('brasil', 'espanha', 'impressao', 'fontes', 'carregado_em')
+
+    def __init__(self, brasil, espanha, chave_cache):
+        impressao = hashlib.sha256(json.dumps(chave_cache, sort_keys=True).encode()).hexdigest()
+        for nome, valor in [('brasil', brasil), ('espanha', espanha), ('impressao', impressao),
+                            ('fontes', chave_cache['fontes']), ('carregado_em', pd.Timestamp.now())]:
+            object.__setattr__(self, nome, valor)
+        registrar_impressao(brasil, f"{impressao}-brasil")
+        registrar_impressao(espanha, f"{impressao}-espanha")
+
+    def __setattr__(self, nome, valor):
+        raise AttributeError("ConjuntoDados é imutável; carregue as bases novamente.")
+
+    def __iter__(self):
+        return iter((self.brasil, self.espanha))
+
+    def desatualizado(self):
+        return fontes_alteradas(self.fontes)
+
+    def invalidar(self):
+        # Descarta os resultados memoizados calculados sobre estas bases.
+        return invalidar_impressao(f"{self.impressao}-brasil", f"{self.impressao}-espanha")
+
+def ler_fontes_streaming(data_path, engine=None):
+    # O Brasil é lido inteiro; o histórico da Espanha passa pelo redutor em blocos.
+    from reducao_historico import localizar_fonte_espanha, ler_espanha_reduzida
+    caminho_brasil = os.path.join(data_path, 'Base RM.xlsx')
+    caminho_espanha = localizar_fonte_espanha(data_path)
+    if not os.path.exists(caminho_brasil):
+        raise FileNotFoundError(f"Arquivo não encontrado: '{caminho_brasil}'")
+    if caminho_espanha is None:
+        raise FileNotFoundError(f"Arquivo não encontrado: '{os.path.join(data_path, 'Base SF.xlsx')}' (nem .csv / .parquet)")
+    mapas = _ler_mapeamentos(os.path.join(data_path, 'mapeamento_valores.xlsx'), engine)
+    return _ler_excel(caminho_brasil, engine), ler_espanha_reduzida(caminho_espanha), mapas
+
+def _arquivos_fonte(data_path, streaming):
+    if not streaming:
+        return ARQUIVOS_FONTE
+    from reducao_historico import localizar_fonte_espanha
+    caminho_espanha = localizar_fonte_espanha(data_path)
+    return ['Base RM.xlsx', os.path.basename(caminho_espanha) if caminho_espanha else 'Base SF.xlsx', 'mapeamento_valores.xlsx']
+
+def load_and_prepare_data(usar_cache=True, paralelo=True, compactar=True, streaming=None):
+    print("--- CORE: Iniciando carga e preparação dos dados... ---")
+    data_path = 'data'
+    engine = detectar_engine_excel()
+    # Modo streaming: o histórico da Espanha é reduzido durante a leitura (reducao_historico.py).
+    if streaming is None:
+        streaming = os.environ.get('ANALISE_CARGA_STREAMING', '').strip().lower() in ('1', 'sim', 'true')
+
+    # A chave é calculada mesmo sem o cache: ela dá a impressão digital do ConjuntoDados.
+    chave_cache = _calcular_chave_cache(data_path, engine, _arquivos_fonte(data_path, streaming))
+    if chave_cache is not None:
+        chave_cache['tipos_compactos'] = compactar
+        if streaming:
+            chave_cache['streaming'] = True
+    if usar_cache and chave_cache is not None:
+        with etapa('carga.cache_leitura') as registro:
+            dados_cache = _ler_cache(chave_cache)
+            registro.linhas_saida = None if dados_cache is None else len(dados_cache[0]) + len(dados_cache[1])
+        if dados_cache is not None:
+            print("--- CORE: Bases inalteradas, dados limpos carregados do cache. ---")
+            return ConjuntoDados(*dados_cache, chave_cache)
+
+    try:
+        with etapa('carga.ingestao') as registro:
+            if streaming:
+                df_brasil_bruto, espanha_reduzida, mapas_valores = ler_fontes_streaming(data_path, engine)
+                registro.linhas_saida = len(df_brasil_bruto) + len(espanha_reduzida)
+            else:
+                df_brasil_bruto, df_espanha_bruto, mapas_valores = ler_fontes(data_path, engine, paralelo)
+                registro.linhas_saida = len(df_brasil_bruto) + len(df_espanha_bruto)
+    except FileNotFoundError as e:
+        print(f"ERRO: Arquivo base não encontrado. Verifique se 'Base RM.xlsx' e 'Base SF.xlsx' estão na pasta 'data/'.\nDetalhe: {e}")
+        return None, None
+    except Exception as e:
+        print(f"ERRO ao ler os arquivos base.\nDetalhe: {e}")
+        return None, None
 
-    for col in brasil_limpo.select_dtypes(include=['object']).columns:
-        brasil_limpo[col] = brasil_limpo[col].str.strip()
-    for col in espanha_limpa.select_dtypes(include=['object']).columns:
-        espanha_limpa[col] = espanha_limpa[col].str.strip()
+    if streaming:
+        brasil_limpo = aplicar_mapeamentos(padronizar_brasil(df_brasil_bruto), mapas_valores)
+        brasil_limpo, espanha_limpa = finalizar_limpeza(brasil_limpo, espanha_reduzida, compactar)
+    else:
+        brasil_limpo, espanha_limpa = preparar_bases(df_brasil_bruto, df_espanha_bruto, mapas_valores, compactar)
 
-    key_columns = ['id_sistema_local', 'chapa']
-    for df_name, df in [('Brasil', brasil_limpo), ('Espanha', espanha_limpa)]:
-        for col in key_columns:
-            if col in df.columns:
-                df[col] = df[col].astype(str).str.replace(r'\\.0$', '', regex=True).str.strip()
+    if usar_cache and chave_cache is not None:
+        with etapa('carga.cache_gravacao', linhas_entrada=len(brasil_limpo) + len(espanha_limpa)):
+            _gravar_cache(chave_cache, brasil_limpo, espanha_limpa)
 
-    return brasil_limpo, espanha_limpa
\ No newline at end of file
+    if chave_cache is None:
+        # Arquivos removidos durante a leitura: sem a chave não há impressão a registrar.
+        return brasil_limpo, espanha_limpa
+    return ConjuntoDados(brasil_limpo, espanha_limpa, chave_cache)
\ No newline at end of file
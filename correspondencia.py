@@ -0,0 +1,185 @@
+import numpy as np # type: ignore
+import pandas as pd # type: ignore
+
+from core_processing import garantir_ordem_por_data, renderizar_chave, corte_as_of, normalizar_texto
+from instrumentacao import etapa
+from memoizacao import por_identidade
+
+# Candidatos na Espanha para as pendências de EVE001: recontratações e trocas de
+# id_sistema_local aparecem como "nova contratação" porque o ID do Brasil não existe na
+# Espanha. Em vez de comparar cada pendência com todo o histórico, o histórico é indexado
+# por chaves de bloqueio (nome normalizado, primeiro/último nome + data de admissão,
+# primeiro + último nome + nacionalidade) e só os pares que dividem alguma chave recebem
+# pontuação. Blocos muito grandes (nomes comuns sem data) não geram pares.
+# O índice cobre o histórico inteiro e guarda a posição em que cada variante apareceu pela
+# primeira vez: uma consulta 'as_of' só considera as variantes que já existiam na data (o
+# tamanho dos blocos é medido sobre o histórico inteiro).
+
+CHAVES_BLOQUEIO = {
+    'nome': ['nome_chave'],
+    'primeiro_admissao': ['primeiro_nome', 'data_admissao'],
+    'ultimo_admissao': ['ultimo_nome', 'data_admissao'],
+    'nome_nacionalidade': ['primeiro_nome', 'ultimo_nome', 'nacionalidade'],
+}
+TAMANHO_MAXIMO_BLOCO = 50
+PESOS = {'nome': 0.6, 'data_admissao': 0.3, 'nacionalidade': 0.1}
+TOLERANCIA_DIAS_ADMISSAO = 30
+SCORE_MINIMO = 0.5
+CANDIDATOS_POR_REGISTRO = 3
+
+COLUNAS_CANDIDATO = ['candidato_id_espanha', 'candidato_nome_espanha', 'candidato_admissao_espanha',
+                     'candidato_status_espanha', 'score_candidato']
+
+def _por_valor_distinto(serie, funcao):
+    # As transformações de texto rodam uma vez por valor distinto (nomes e nacionalidades se
+    # repetem ao longo do histórico) e são espalhadas de volta com um take.
+    codigos, unicos = pd.factorize(serie.astype(object).fillna(''))
+    return {nome: pd.Series(valores, dtype=object).to_numpy()[codigos] for nome, valores in funcao(pd.Series(unicos, dtype=object)).items()}
+
+def _tokens(nomes):
+    # Tokens do nome sem acentos e em minúsculas; a chave do nome completo usa os tokens
+    # ordenados, então 'Silva, João' e 'João Silva' caem no mesmo bloco.
+    tokens = normalizar_texto(nomes).str.findall(r'[a-z0-9]+').tolist()
+    distintos = [sorted(set(t)) for t in tokens]
+    return {
+        'tokens': distintos,
+        'nome_chave': [' '.join(t) if t else np.nan for t in distintos],
+        'primeiro_nome': [t[0] if t else np.nan for t in tokens],
+        'ultimo_nome': [t[-1] if t else np.nan for t in tokens],
+    }
+
+def _nacionalidade(valores):
+    # RM e SF grafam a nacionalidade de formas diferentes ('BR', 'Brasil', 'Brasileña'): compara-se
+    # o início normalizado, que coincide entre o código e o nome na maior parte dos países.
+    return {'nacionalidade': normalizar_texto(valores).str[:2].replace('', np.nan).tolist()}
+
+def _preparar(nome, data_admissao, nacionalidade):
+    df = pd.DataFrame(_por_valor_distinto(nome, _tokens))
+    df['qtd_tokens'] = df['tokens'].map(len).to_numpy(dtype=np.int64)
+    df['data_admissao'] = pd.to_datetime(data_admissao).to_numpy(dtype='datetime64[ns]')
+    df['nacionalidade'] = _por_valor_distinto(nacionalidade, _nacionalidade)['nacionalidade']
+    return df
+
+class IndiceCandidatos:
+    def __init__(self, espanha_historico):
+        with etapa('correspondencia.indice', linhas_entrada=len(espanha_historico)) as registro:
+            historico = garantir_ordem_por_data(espanha_historico)
+            # Só as colunas do status entram no índice: o histórico recebido não fica preso ao
+            # cache por identidade.
+            self.status = historico[['id_sistema_local', 'status_empregado']]
+            datas = historico['data_efetiva'].to_numpy(dtype='datetime64[ns]')
+            self._datas = (datas, int(np.isnat(datas).sum()))
+            # Cada combinação (ID, nome, admissão, nacionalidade) já vista no histórico entra no
+            # índice: um nome alterado depois da admissão continua encontrando o colaborador.
+            colunas = [col for col in ['id_sistema_local', 'nome', 'data_admissao', 'nacionalidade'] if col in historico.columns]
+            variantes = historico[colunas].reset_index(drop=True).drop_duplicates(keep='first')
+            variantes = variantes[variantes['id_sistema_local'].notna()]
+            self.primeira_posicao = variantes.index.to_numpy()
+            variantes = variantes.reset_index(drop=True)
+            self.ids = variantes['id_sistema_local']
+            self.nomes = variantes['nome']
+            self.dados = _preparar(variantes['nome'], variantes['data_admissao'],
+                                   variantes.get('nacionalidade', pd.Series(np.nan, index=variantes.index)))
+            self.blocos = {}
+            for nome_chave, campos in CHAVES_BLOQUEIO.items():
+                chaves = self.dados[campos].dropna()
+                tamanhos = chaves.groupby(campos, sort=False)[campos[0]].transform('size')
+                self.blocos[nome_chave] = chaves[tamanhos <= TAMANHO_MAXIMO_BLOCO].rename_axis('posicao_es').reset_index()
+            registro.linhas_saida = len(variantes)
+
+    def __len__(self):
+        return len(self.dados)
+
+    def _corte(self, as_of):
+        return len(self.status) if as_of is None else corte_as_of(*self._datas, as_of)
+
+    def _status(self, ids, corte):
+        # Status do registro mais recente de cada ID até o corte.
+        recentes = self.status.iloc[:corte].drop_duplicates(subset='id_sistema_local', keep='last')
+        return recentes.set_index('id_sistema_local')['status_empregado'].reindex(ids).to_numpy(dtype=object)
+
+    def _pares(self, consulta):
+        pares = []
+        for nome_chave, campos in CHAVES_BLOQUEIO.items():
+            lado_br = consulta[campos].dropna().rename_axis('posicao_br').reset_index()
+            pares.append(lado_br.merge(self.blocos[nome_chave], on=campos)[['posicao_br', 'posicao_es']])
+        return pd.concat(pares, ignore_index=True).drop_duplicates(ignore_index=True)
+
+    def _pontuar(self, consulta, pares):
+        br, es = pares['posicao_br'].to_numpy(), pares['posicao_es'].to_numpy()
+        # Similaridade do nome: Jaccard dos tokens, contando os tokens em comum por par.
+        tokens_br = consulta['tokens'].explode().dropna()
+        tokens_es = self.dados['tokens'].iloc[np.unique(es)].explode().dropna()
+        comuns = (pares.reset_index().rename(columns={'index': 'par'})
+                  .merge(pd.DataFrame({'posicao_br': tokens_br.index, 'token': tokens_br.to_numpy()}), on='posicao_br')
+                  .merge(pd.DataFrame({'posicao_es': tokens_es.index, 'token': tokens_es.to_numpy()}),
+                         on=['posicao_es', 'token']))
+        em_comum = np.bincount(comuns['par'].to_numpy(), minlength=len(pares))
+        qtd_br, qtd_es = consulta['qtd_tokens'].to_numpy()[br], self.dados['qtd_tokens'].to_numpy()[es]
+        uniao = np.maximum(qtd_br + qtd_es - em_comum, 1)
+        score_nome = em_comum / uniao
+        # Admissão: 1 na mesma data, caindo linearmente até 0 em TOLERANCIA_DIAS_ADMISSAO dias.
+        datas_br = consulta['data_admissao'].to_numpy()[br]
+        datas_es = self.dados['data_admissao'].to_numpy()[es]
+        dias = np.abs((datas_br - datas_es) / np.timedelta64(1, 'D'))
+        score_data = np.where(np.isnan(dias), 0.0, np.clip(1 - dias / TOLERANCIA_DIAS_ADMISSAO, 0, 1))
+        nacionalidade_br = pd.Series(consulta['nacionalidade'].to_numpy()[br])
+        nacionalidade_es = pd.Series(self.dados['nacionalidade'].to_numpy()[es])
+        score_nacionalidade = (nacionalidade_br.eq(nacionalidade_es) & nacionalidade_br.notna()).to_numpy(dtype=float)
+        return (PESOS['nome'] * score_nome + PESOS['data_admissao'] * score_data
+                + PESOS['nacionalidade'] * score_nacionalidade).round(3)
+
+    def candidatos(self, nome, data_admissao, nacionalidade, limite=CANDIDATOS_POR_REGISTRO, score_minimo=SCORE_MINIMO,
+                   as_of=None):
+        # Candidatos ranqueados por registro: uma linha por (posição do registro, ID da Espanha),
+        # no máximo 'limite' por registro, do maior score para o menor.
+        colunas = ['posicao', 'ranking', 'id_sistema_local', 'nome', 'data_admissao', 'status_empregado', 'score']
+        with etapa('correspondencia.candidatos', linhas_entrada=len(nome)) as registro:
+            consulta = _preparar(pd.Series(nome).reset_index(drop=True), pd.Series(data_admissao).reset_index(drop=True),
+                                 pd.Series(nacionalidade).reset_index(drop=True))
+            corte = self._corte(as_of)
+            pares = self._pares(consulta) if len(consulta) and len(self.dados) else pd.DataFrame()
+            if not pares.empty and corte < len(self.status):
+                pares = pares[self.primeira_posicao[pares['posicao_es'].to_numpy()] < corte].reset_index(drop=True)
+            if pares.empty:
+                registro.linhas_saida = 0
+                return pd.DataFrame(columns=colunas)
+            pares['score'] = self._pontuar(consulta, pares)
+            pares = pares[pares['score'] >= score_minimo]
+            # Empate no score: a variante que apareceu por último no histórico primeiro; cada ID aparece
+            # uma vez por registro.
+            pares = pares.sort_values(['posicao_br', 'score', 'posicao_es'], ascending=[True, False, False], kind='stable')
+            pares['id_sistema_local'] = self.ids.array.take(pares['posicao_es'].to_numpy())
+            pares = pares.drop_duplicates(subset=['posicao_br', 'id_sistema_local'])
+            pares = pares[pares.groupby('posicao_br').cumcount() < limite]
+            posicoes_es = pares['posicao_es'].to_numpy()
+            resultado = pd.DataFrame({
+                'posicao': pares['posicao_br'].to_numpy(),
+                'ranking': pares.groupby('posicao_br').cumcount().to_numpy() + 1,
+                'id_sistema_local': pares['id_sistema_local'].array,
+                'nome': self.nomes.to_numpy()[posicoes_es],
+                'data_admissao': self.dados['data_admissao'].to_numpy()[posicoes_es],
+                'status_empregado': self._status(pares['id_sistema_local'].array, corte),
+                'score': pares['score'].to_numpy(),
+            })
+            registro.linhas_saida = len(resultado)
+            return resultado
+
+    def melhores(self, nome, data_admissao, nacionalidade, index=None, as_of=None):
+        # Colunas do melhor candidato, alinhadas aos registros de entrada (NaN quando não há candidato).
+        index = pd.RangeIndex(len(nome)) if index is None else index
+        melhores = self.candidatos(nome, data_admissao, nacionalidade, limite=1, as_of=as_of).set_index('posicao')
+        melhores = melhores.reindex(np.arange(len(index)))
+        ids = melhores['id_sistema_local']
+        return pd.DataFrame({
+            'candidato_id_espanha': renderizar_chave(ids).where(ids.notna(), np.nan).to_numpy(),
+            'candidato_nome_espanha': melhores['nome'].to_numpy(),
+            'candidato_admissao_espanha': pd.to_datetime(melhores['data_admissao']).to_numpy(),
+            'candidato_status_espanha': melhores['status_empregado'].to_numpy(),
+            'score_candidato': melhores['score'].to_numpy(dtype=float),
+        }, index=index)
+
+# Um índice por histórico vivo: as análises, o incremental e os replays por data o reaproveitam.
+@por_identidade(max_entradas=2)
+def indice_candidatos(espanha_historico):
+    return IndiceCandidatos(espanha_historico)
@@ -0,0 +1,76 @@
+import os
+from io import BytesIO
+
+import pandas as pd # type: ignore
+
+from instrumentacao import etapa
+
+LIMITE_LINHAS_EXCEL = 1_048_575  # 1.048.576 linhas por aba, menos o cabeçalho
+TAMANHO_BLOCO = 50_000
+
+# formato -> (extensão, tipo MIME)
+FORMATOS_EXPORTACAO = {
+    'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('.csv', 'text/csv'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+
+def _blocos_de_linhas(df, inicio, fim):
+    # Converte poucas linhas por vez para objetos Python (NaN/NaT/NA -> célula vazia):
+    # o relatório inteiro nunca é materializado como objeto.
+    for posicao in range(inicio, fim, TAMANHO_BLOCO):
+        bloco = df.iloc[posicao:min(posicao + TAMANHO_BLOCO, fim)].astype(object)
+        yield bloco.where(bloco.notna(), None).itertuples(index=False)
+
+def escrever_xlsx(df, destino, nome_aba='Relatorio'):
+    # Modo constant_memory do xlsxwriter: cada linha vai para o disco assim que é escrita,
+    # então a memória não cresce com o tamanho do relatório. Relatórios acima do limite
+    # de linhas do Excel continuam em novas abas (Relatorio_2, Relatorio_3...).
+    import xlsxwriter # type: ignore
+    opcoes = {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd hh:mm:ss'}
+    with xlsxwriter.Workbook(destino, opcoes) as workbook:
+        cabecalho = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+        for numero_aba, inicio in enumerate(range(0, max(len(df), 1), LIMITE_LINHAS_EXCEL), start=1):
+            aba = workbook.add_worksheet(nome_aba if numero_aba == 1 else f"{nome_aba}_{numero_aba}")
+            aba.write_row(0, 0, [str(col) for col in df.columns], cabecalho)
+            linha_excel = 1
+            for linhas in _blocos_de_linhas(df, inicio, min(inicio + LIMITE_LINHAS_EXCEL, len(df))):
+                for linha in linhas:
+                    aba.write_row(linha_excel, 0, linha)
+                    linha_excel += 1
+
+def escrever_csv(df, destino):
+    # ';' e BOM UTF-8 para o Excel em português abrir o arquivo com acentos e colunas corretos.
+    df.to_csv(destino, index=False, sep=';', encoding='utf-8-sig', chunksize=TAMANHO_BLOCO, date_format='%Y-%m-%d')
+
+def escrever_parquet(df, destino):
+    df.to_parquet(destino, index=False)
+
+ESCRITORES = {'xlsx': escrever_xlsx, 'csv': escrever_csv, 'parquet': escrever_parquet}
+
+def formato_do_caminho(caminho):
+    extensao = os.path.splitext(caminho)[1].lower()
+    for formato, (ext, _) in FORMATOS_EXPORTACAO.items():
+        if ext == extensao:
+            return formato
+    raise ValueError(f"Extensão '{extensao}' não suportada. Use: {', '.join(ext for ext, _ in FORMATOS_EXPORTACAO.values())}.")
+
+def caminho_relatorio(pasta, nome_base, formato='xlsx'):
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato '{formato}' não suportado. Use: {', '.join(FORMATOS_EXPORTACAO)}.")
+    return os.path.join(pasta, nome_base + FORMATOS_EXPORTACAO[formato][0])
+
+def exportar_relatorio(df, destino, formato=None):
+    # destino pode ser um caminho (o formato sai da extensão) ou um arquivo binário aberto.
+    if formato is None:
+        formato = formato_do_caminho(destino)
+    if formato not in ESCRITORES:
+        raise ValueError(f"Formato '{formato}' não suportado. Use: {', '.join(ESCRITORES)}.")
+    with etapa(f'exportacao.{formato}', linhas_entrada=len(df)):
+        ESCRITORES[formato](df, destino)
+    return destino
+
+def relatorio_em_bytes(df, formato='xlsx'):
+    saida = BytesIO()
+    exportar_relatorio(df, saida, formato)
+    return saida.getvalue()
@@ -0,0 +1,227 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd # type: ignore
+
+# Histórico das pendências de todas as execuções, num SQLite local. Cada execução de uma
+# análise grava as suas pendências (uma linha por análise, evento e chapa) e atualiza a
+# tabela 'itens', que guarda para cada pendência quando foi vista pela primeira e pela
+# última vez e quando foi resolvida. As consultas de tendência leem só 'resumo' (contagens
+# por execução) e 'itens', então não crescem com o número de linhas acumuladas.
+# O caminho pode ser trocado por ANALISE_HISTORICO; ANALISE_HISTORICO=nenhum desliga a gravação.
+
+CAMINHO_HISTORICO = os.path.join('data', '.historico', 'resultados.sqlite')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS execucoes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    analise TEXT NOT NULL,
+    executado_em TEXT NOT NULL,
+    data_referencia TEXT,
+    pendencias INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_execucoes_analise ON execucoes (analise, executado_em);
+CREATE TABLE IF NOT EXISTS pendencias (
+    analise TEXT NOT NULL,
+    evento TEXT NOT NULL,
+    chave TEXT NOT NULL,
+    execucao_id INTEGER NOT NULL REFERENCES execucoes (id),
+    nome TEXT,
+    PRIMARY KEY (analise, evento, chave, execucao_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_pendencias_chave ON pendencias (chave);
+CREATE TABLE IF NOT EXISTS resumo (
+    execucao_id INTEGER NOT NULL REFERENCES execucoes (id),
+    evento TEXT NOT NULL,
+    pendencias INTEGER NOT NULL,
+    PRIMARY KEY (execucao_id, evento)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS itens (
+    analise TEXT NOT NULL,
+    evento TEXT NOT NULL,
+    chave TEXT NOT NULL,
+    nome TEXT,
+    primeira_vez TEXT NOT NULL,
+    ultima_vez TEXT NOT NULL,
+    ultima_execucao INTEGER NOT NULL,
+    resolvido_em TEXT,
+    PRIMARY KEY (analise, evento, chave)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_itens_abertos ON itens (analise, resolvido_em);
+"""
+
+# análise -> (coluna da chapa, coluna do evento, coluna do nome) no relatório
+LAYOUTS = {
+    'admissoes': ('chapa', 'evento_sugerido', 'nome'),
+    'divergencias': ('chapa_brasil', 'evento_sugerido', 'nome'),
+    'demissoes': ('chapa_brasil', 'evento_codigo', 'nome_completo'),
+    'eve001_003_023': ('chapa', 'evento_sugerido', 'nome'),
+    'eve012_013': ('chapa', 'evento_sugerido', 'nome'),
+    'outros_eventos': ('chapa', 'evento_brasil', 'nome_completo'),
+}
+
+_PADRAO_EVENTO = re.compile(r'EVE\d{3}(?:/\d{3})?', re.IGNORECASE)
+_trava_esquema = threading.Lock()
+
+def caminho_historico():
+    return os.environ.get('ANALISE_HISTORICO') or CAMINHO_HISTORICO
+
+def historico_ativo():
+    return caminho_historico().strip().lower() != 'nenhum'
+
+def conectar(caminho=None):
+    caminho = caminho or caminho_historico()
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    # Várias análises do lote gravam ao mesmo tempo: WAL deixa as leituras do app
+    # correrem durante a gravação e o timeout espera a vez de escrever.
+    conexao = sqlite3.connect(caminho, timeout=60)
+    conexao.execute("PRAGMA journal_mode=WAL")
+    with _trava_esquema:
+        conexao.executescript(ESQUEMA)
+    return conexao
+
+def codigo_do_evento(texto):
+    # 'EVE001 - Nova Contratação' -> 'EVE001', 'VERIFICAR: EVE003/023 - ...' -> 'EVE003/023',
+    # 'eve012' -> 'EVE012'; outros textos ficam com o código antes do '-'.
+    texto = str(texto)
+    encontrado = _PADRAO_EVENTO.search(texto)
+    return (encontrado.group(0) if encontrado else texto.split('-')[0]).strip().upper()
+
+def _itens_do_relatorio(analise, df_relatorio):
+    coluna_chave, coluna_evento, coluna_nome = LAYOUTS[analise]
+    if df_relatorio.empty:
+        return pd.DataFrame(columns=['evento', 'chave', 'nome'])
+    eventos = df_relatorio[coluna_evento].astype(str)
+    codigos = eventos.map({valor: codigo_do_evento(valor) for valor in eventos.unique()})
+    nomes = df_relatorio[coluna_nome].astype(object) if coluna_nome in df_relatorio.columns else pd.Series(None, index=df_relatorio.index)
+    itens = pd.DataFrame({
+        'evento': codigos.to_numpy(), 'chave': df_relatorio[coluna_chave].astype(str).to_numpy(),
+        'nome': nomes.where(nomes.notna(), None).to_numpy(),
+    })
+    # Uma pendência por (evento, chapa): várias divergências da mesma chapa no mesmo evento contam uma vez.
+    return itens.drop_duplicates(subset=['evento', 'chave'], keep='first')
+
+def registrar_execucao(analise, df_relatorio, executado_em=None, data_referencia=None, caminho=None):
+    # Falhas no histórico não interrompem a análise: a pendência já está no relatório.
+    if analise not in LAYOUTS:
+        raise ValueError(f"Análise '{analise}' sem layout no histórico. Opções: {', '.join(LAYOUTS)}.")
+    if not historico_ativo() and caminho is None:
+        return None
+    if 'Erro' in df_relatorio.columns:
+        return None
+    executado_em = (executado_em or datetime.now()).isoformat(timespec='seconds')
+    data_referencia = None if data_referencia is None else pd.Timestamp(data_referencia).date().isoformat()
+    try:
+        itens = _itens_do_relatorio(analise, df_relatorio)
+        conexao = conectar(caminho)
+        try:
+            with conexao:
+                execucao_id = conexao.execute(
+                    "INSERT INTO execucoes (analise, executado_em, data_referencia, pendencias) VALUES (?, ?, ?, ?)",
+                    (analise, executado_em, data_referencia, len(itens))).lastrowid
+                linhas = list(itens.itertuples(index=False, name=None))
+                conexao.executemany(
+                    "INSERT INTO pendencias (analise, evento, chave, execucao_id, nome) VALUES (?, ?, ?, ?, ?)",
+                    [(analise, evento, chave, execucao_id, nome) for evento, chave, nome in linhas])
+                conexao.executemany(
+                    "INSERT INTO resumo (execucao_id, evento, pendencias) VALUES (?, ?, ?)",
+                    [(execucao_id, evento, int(qtd)) for evento, qtd in itens['evento'].value_counts().items()])
+                # Pendência que volta depois de resolvida recomeça a contagem de dias.
+                conexao.executemany(
+                    "INSERT INTO itens (analise, evento, chave, nome, primeira_vez, ultima_vez, ultima_execucao) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (analise, evento, chave) DO UPDATE SET "
+                    "nome = excluded.nome, ultima_vez = excluded.ultima_vez, ultima_execucao = excluded.ultima_execucao, "
+                    "primeira_vez = CASE WHEN itens.resolvido_em IS NULL THEN itens.primeira_vez ELSE excluded.primeira_vez END, "
+                    "resolvido_em = NULL",
+                    [(analise, evento, chave, nome, executado_em, executado_em, execucao_id) for evento, chave, nome in linhas])
+                conexao.execute(
+                    "UPDATE itens SET resolvido_em = ? WHERE analise = ? AND resolvido_em IS NULL AND ultima_execucao < ?",
+                    (executado_em, analise, execucao_id))
+        finally:
+            conexao.close()
+    except Exception as e:
+        print(f"AVISO: Não foi possível gravar a execução de '{analise}' no histórico ({caminho or caminho_historico()}).\nDetalhe: {e}")
+        return None
+    print(f"--- HISTÓRICO: {len(itens)} pendências de '{analise}' registradas (execução {execucao_id}). ---")
+    return execucao_id
+
+def registrar_resultado(analise, df_relatorio, as_of=None, historico=None):
+    # Execuções do dia vão para o histórico configurado (ou para 'historico', se indicado).
+    # Replays de datas passadas (as_of) só entram num histórico indicado explicitamente e com a
+    # própria data: o controle de resolvidas supõe execuções em ordem cronológica, e um replay
+    # gravado hoje no histórico do dia fecharia pendências que continuam abertas.
+    if as_of is None:
+        return registrar_execucao(analise, df_relatorio, caminho=historico)
+    if historico is None:
+        return None
+    data = pd.Timestamp(as_of).normalize()
+    return registrar_execucao(analise, df_relatorio, executado_em=data.to_pydatetime(), data_referencia=data,
+                              caminho=historico)
+
+def _consultar(sql, parametros=(), caminho=None):
+    caminho = caminho or caminho_historico()
+    if not os.path.exists(caminho):
+        return None
+    conexao = conectar(caminho)
+    try:
+        return pd.read_sql_query(sql, conexao, params=parametros)
+    finally:
+        conexao.close()
+
+def _filtros(condicoes, analise=None, inicio=None, fim=None, coluna_data='executado_em'):
+    parametros = []
+    if analise is not None:
+        condicoes.append("analise = ?")
+        parametros.append(analise)
+    if inicio is not None:
+        condicoes.append(f"{coluna_data} >= ?")
+        parametros.append(pd.Timestamp(inicio).isoformat())
+    if fim is not None:
+        condicoes.append(f"{coluna_data} < ?")
+        parametros.append((pd.Timestamp(fim) + pd.Timedelta(days=1)).isoformat())
+    return (' WHERE ' + ' AND '.join(condicoes)) if condicoes else '', parametros
+
+def contagens_por_execucao(analise=None, inicio=None, fim=None, caminho=None):
+    # Pendências por execução e evento, para a curva de tendência. Um evento ausente numa
+    # execução conta zero (a curva cai a zero quando as pendências são resolvidas).
+    where, parametros = _filtros([], analise, inicio, fim)
+    df = _consultar(
+        "SELECT e.id AS execucao_id, e.executado_em, e.analise, r.evento, r.pendencias FROM "
+        f"(SELECT id, analise, executado_em FROM execucoes{where}) AS e LEFT JOIN resumo AS r ON r.execucao_id = e.id",
+        parametros, caminho)
+    colunas = ['executado_em', 'analise', 'evento', 'pendencias']
+    if df is None or df.empty:
+        return pd.DataFrame(columns=colunas)
+    execucoes = df[['execucao_id', 'executado_em', 'analise']].drop_duplicates()
+    eventos = df[['analise', 'evento']].dropna().drop_duplicates()
+    df = execucoes.merge(eventos, on='analise').merge(df, on=['execucao_id', 'executado_em', 'analise', 'evento'], how='left')
+    df = df.assign(executado_em=pd.to_datetime(df['executado_em']), pendencias=df['pendencias'].fillna(0).astype(int))
+    return df.sort_values(['executado_em', 'execucao_id', 'analise', 'evento'])[colunas].reset_index(drop=True)
+
+def itens(analise=None, abertos=None, caminho=None):
+    # abertos=True: só pendências não resolvidas; False: só resolvidas; None: todas.
+    condicoes = [] if abertos is None else ["resolvido_em IS NULL" if abertos else "resolvido_em IS NOT NULL"]
+    where, parametros = _filtros(condicoes, analise)
+    df = _consultar(
+        "SELECT analise, evento, chave, nome, primeira_vez, ultima_vez, resolvido_em, "
+        "julianday(COALESCE(resolvido_em, ultima_vez)) - julianday(primeira_vez) AS dias_pendente "
+        f"FROM itens{where} ORDER BY dias_pendente DESC, analise, evento, chave", parametros, caminho)
+    if df is None:
+        return pd.DataFrame(columns=['analise', 'evento', 'chave', 'nome', 'primeira_vez', 'ultima_vez',
+                                     'resolvido_em', 'dias_pendente'])
+    for col in ['primeira_vez', 'ultima_vez', 'resolvido_em']:
+        df[col] = pd.to_datetime(df[col])
+    df['dias_pendente'] = df['dias_pendente'].round().astype('Int64')
+    return df
+
+def historico_da_chave(chave, caminho=None):
+    # Todas as execuções em que a chapa apareceu, em qualquer análise.
+    df = _consultar(
+        "SELECT e.executado_em, p.analise, p.evento, p.nome FROM pendencias AS p JOIN execucoes AS e "
+        "ON e.id = p.execucao_id WHERE p.chave = ? ORDER BY e.executado_em, p.analise, p.evento", (str(chave),), caminho)
+    if df is None:
+        return pd.DataFrame(columns=['executado_em', 'analise', 'evento', 'nome'])
+    return df.assign(executado_em=pd.to_datetime(df['executado_em']))
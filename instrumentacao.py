@@ -0,0 +1,157 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd # type: ignore
+
+# Instrumentação leve por etapa (tempo, linhas e variação de memória). Desligada por
+# padrão: nesse estado etapa() e @medir_etapa custam apenas a checagem de uma flag.
+# Ligue com configurar(ColetorLog(), ...) ou com a variável de ambiente
+# ANALISE_INSTRUMENTACAO=log|<caminho.jsonl>.
+
+# configurar() vale para o processo inteiro (scripts, lote, benchmark). adicionar_coletor()
+# vale só para o contexto atual: no app, cada sessão do Streamlit roda na sua própria
+# thread e mede apenas as próprias etapas.
+_coletores = []
+_coletores_do_contexto = contextvars.ContextVar('coletores_do_contexto', default=())
+_trava = threading.Lock()
+
+class ColetorLog:
+    def __init__(self, escrever=print):
+        self.escrever = escrever
+
+    def registrar(self, registro):
+        linhas = ''
+        if registro['linhas_entrada'] is not None or registro['linhas_saida'] is not None:
+            linhas = f" | linhas {registro['linhas_entrada']} -> {registro['linhas_saida']}"
+        memoria = f" | memória {registro['memoria_delta_mb']:+.1f} MB" if registro['memoria_delta_mb'] is not None else ''
+        self.escrever(f"--- ETAPA {registro['etapa']}: {registro['segundos']:.3f}s{linhas}{memoria} ---")
+
+class ColetorJsonl:
+    def __init__(self, caminho):
+        self.caminho = caminho
+
+    def registrar(self, registro):
+        with _trava, open(self.caminho, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+class ColetorMemoria:
+    def __init__(self, limite=500):
+        self.limite = limite
+        self.registros = []
+
+    def registrar(self, registro):
+        with _trava:
+            self.registros.append(registro)
+            del self.registros[:-self.limite]
+
+    def como_dataframe(self):
+        return pd.DataFrame(list(self.registros))
+
+    def limpar(self):
+        with _trava:
+            self.registros.clear()
+
+def configurar(*coletores):
+    _coletores[:] = coletores
+
+def adicionar_coletor(coletor):
+    atuais = _coletores_do_contexto.get()
+    if coletor not in atuais:
+        _coletores_do_contexto.set(atuais + (coletor,))
+
+def remover_coletor(coletor):
+    _coletores_do_contexto.set(tuple(c for c in _coletores_do_contexto.get() if c is not coletor))
+
+def desativar():
+    _coletores.clear()
+    _coletores_do_contexto.set(())
+
+def ativo():
+    return bool(_coletores) or bool(_coletores_do_contexto.get())
+
+def _coletores_ativos():
+    return list(_coletores) + list(_coletores_do_contexto.get())
+
+def _memoria_atual_mb():
+    try:
+        import psutil # type: ignore
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def contar_linhas(obj):
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return len(obj)
+    if isinstance(obj, (tuple, list)):
+        contagens = [contar_linhas(item) for item in obj]
+        contagens = [c for c in contagens if c is not None]
+        return sum(contagens) if contagens else None
+    return None
+
+class _Registro:
+    __slots__ = ('linhas_saida',)
+
+    def __init__(self):
+        self.linhas_saida = None
+
+_REGISTRO_INATIVO = _Registro()
+
+def _publicar(coletores, nome, inicio, contador_inicio, memoria_inicio, linhas_entrada, linhas_saida):
+    # A duração vem do perf_counter (monotônico); o relógio de parede só data o início.
+    segundos = time.perf_counter() - contador_inicio
+    memoria_fim = _memoria_atual_mb()
+    registro = {
+        'etapa': nome, 'inicio': datetime.fromtimestamp(inicio).isoformat(timespec='milliseconds'),
+        'segundos': round(segundos, 4), 'linhas_entrada': linhas_entrada, 'linhas_saida': linhas_saida,
+        'memoria_delta_mb': None if memoria_inicio is None or memoria_fim is None else round(memoria_fim - memoria_inicio, 1),
+    }
+    for coletor in coletores:
+        coletor.registrar(registro)
+
+@contextmanager
+def etapa(nome, linhas_entrada=None):
+    # Uso: with etapa('limpeza.strip', linhas_entrada=len(df)) as registro:
+    #          ...; registro.linhas_saida = len(resultado)
+    if not _coletores and not _coletores_do_contexto.get():
+        yield _REGISTRO_INATIVO
+        return
+    coletores, registro = _coletores_ativos(), _Registro()
+    memoria_inicio, inicio, contador_inicio = _memoria_atual_mb(), time.time(), time.perf_counter()
+    try:
+        yield registro
+    finally:
+        _publicar(coletores, nome, inicio, contador_inicio, memoria_inicio, linhas_entrada, registro.linhas_saida)
+
+def medir_etapa(nome):
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            if not _coletores and not _coletores_do_contexto.get():
+                return funcao(*args, **kwargs)
+            coletores = _coletores_ativos()
+            memoria_inicio, inicio, contador_inicio = _memoria_atual_mb(), time.time(), time.perf_counter()
+            resultado = funcao(*args, **kwargs)
+            _publicar(coletores, nome, inicio, contador_inicio, memoria_inicio,
+                      contar_linhas(list(args) + list(kwargs.values())), contar_linhas(resultado))
+            return resultado
+        return envoltorio
+    return decorador
+
+def _configurar_por_ambiente():
+    destino = os.environ.get('ANALISE_INSTRUMENTACAO', '').strip()
+    if not destino:
+        return
+    configurar(ColetorLog() if destino.lower() == 'log' else ColetorJsonl(destino))
+
+_configurar_por_ambiente()
@@ -0,0 +1,320 @@
+import functools
+import hashlib
+import itertools
+import os
+import pickle
+import threading
+import weakref
+from collections import OrderedDict
+
+import pandas as pd # type: ignore
+import numpy as np # type: ignore
+
+# Memoização das análises sem depender do Streamlit. O backend é escolhido por quem
+# executa: o app usa BackendStreamlit(); scripts e jobs ficam com o LRU em memória
+# (padrão), o cache em disco ou nenhum. Também pode ser escolhido pela variável de
+# ambiente ANALISE_MEMOIZACAO=lru|disco|nenhum (e ANALISE_MEMOIZACAO_MAX_MB para limitar
+# a memória do LRU).
+
+PASTA_CACHE_RESULTADOS = os.path.join('data', '.cache', 'resultados')
+
+class BackendLRU:
+    # Limitado pelo número de resultados e, opcionalmente, pela memória que eles ocupam
+    # (max_mb); os menos usados recentemente saem primeiro.
+    def __init__(self, max_entradas=32, max_mb=None):
+        self.max_entradas = max_entradas
+        self.max_mb = max_mb
+        self._entradas = OrderedDict()
+        self._tamanhos = {}
+        self._trava = threading.Lock()
+
+    def obter(self, chave, calcular):
+        # Cada chamador recebe a sua cópia, como no st.cache_data: alterar um resultado não
+        # muda o que os próximos recebem.
+        with self._trava:
+            if chave in self._entradas:
+                self._entradas.move_to_end(chave)
+                return copiar_resultado(self._entradas[chave])
+        resultado = calcular()
+        with self._trava:
+            self._entradas[chave] = resultado
+            self._tamanhos[chave] = tamanho_mb(resultado) if self.max_mb is not None else 0.0
+            while len(self._entradas) > 1 and (
+                len(self._entradas) > self.max_entradas
+                or (self.max_mb is not None and sum(self._tamanhos.values()) > self.max_mb)
+            ):
+                antiga, _ = self._entradas.popitem(last=False)
+                self._tamanhos.pop(antiga, None)
+        return copiar_resultado(resultado)
+
+    def remover(self, chave):
+        with self._trava:
+            self._entradas.pop(chave, None)
+            self._tamanhos.pop(chave, None)
+
+    def limpar(self):
+        with self._trava:
+            self._entradas.clear()
+            self._tamanhos.clear()
+
+class BackendDisco:
+    por_conteudo = True
+
+    def __init__(self, pasta=PASTA_CACHE_RESULTADOS):
+        self.pasta = pasta
+
+    def obter(self, chave, calcular):
+        caminho = os.path.join(self.pasta, f"{chave}.pkl")
+        try:
+            with open(caminho, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"AVISO: Resultado em cache ilegível ({caminho}); será recalculado.\nDetalhe: {e}")
+        resultado = calcular()
+        os.makedirs(self.pasta, exist_ok=True)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, 'wb') as f:
+            pickle.dump(resultado, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, caminho)
+        return resultado
+
+    def remover(self, chave):
+        try:
+            os.remove(os.path.join(self.pasta, f"{chave}.pkl"))
+        except FileNotFoundError:
+            pass
+
+    def limpar(self):
+        if os.path.isdir(self.pasta):
+            for nome in os.listdir(self.pasta):
+                if nome.endswith('.pkl'):
+                    os.remove(os.path.join(self.pasta, nome))
+
+class BackendStreamlit:
+    # Guarda os resultados no st.cache_data, keyed só pela chave já calculada aqui: o
+    # Streamlit não hasheia os DataFrames a cada chamada, e o "Clear cache" do app
+    # continua limpando as análises. As bases do app vêm de um st.cache_resource, então
+    # são os mesmos objetos em todas as sessões e o token por objeto basta.
+    def __init__(self, max_entradas=32):
+        import streamlit as st # type: ignore
+
+        @st.cache_data(max_entries=max_entradas, show_spinner=False)
+        def _obter(chave, _calcular):
+            return _calcular()
+        self._obter = _obter
+
+    def obter(self, chave, calcular):
+        return self._obter(chave, calcular)
+
+    def remover(self, chave):
+        # O st.cache_data não remove entradas isoladas.
+        self._obter.clear()
+
+    def limpar(self):
+        self._obter.clear()
+
+class SemMemoizacao:
+    def obter(self, chave, calcular):
+        return calcular()
+
+    def remover(self, chave):
+        pass
+
+    def limpar(self):
+        pass
+
+_backend = [BackendLRU()]
+
+def configurar(backend):
+    _backend[0] = backend if backend is not None else SemMemoizacao()
+
+def backend_atual():
+    return _backend[0]
+
+def limpar():
+    _backend[0].limpar()
+    with _trava_impressoes:
+        _chaves_por_impressao.clear()
+
+def copiar_resultado(resultado):
+    # Com copy-on-write a cópia rasa já isola quem a recebe (a escrita copia só a coluna
+    # alterada); sem ele, a cópia precisa ser profunda.
+    if isinstance(resultado, (pd.DataFrame, pd.Series)):
+        return resultado.copy(deep=not _copy_on_write_ativo())
+    if isinstance(resultado, dict):
+        return {nome: copiar_resultado(valor) for nome, valor in resultado.items()}
+    if isinstance(resultado, (tuple, list)):
+        return type(resultado)(copiar_resultado(valor) for valor in resultado)
+    return resultado
+
+def _copy_on_write_ativo():
+    return int(pd.__version__.split('.')[0]) >= 3 or pd.get_option('mode.copy_on_write') is True
+
+def tamanho_mb(resultado):
+    if isinstance(resultado, (pd.DataFrame, pd.Series)):
+        return float(np.sum(resultado.memory_usage(index=True, deep=True))) / 1024 ** 2
+    if isinstance(resultado, dict):
+        return sum(tamanho_mb(valor) for valor in resultado.values())
+    if isinstance(resultado, (tuple, list)):
+        return sum(tamanho_mb(valor) for valor in resultado)
+    if isinstance(resultado, str):
+        return len(resultado) / 1024 ** 2
+    return 0.0
+
+# Impressão digital de DataFrames, guardada por objeto (as bases não são alteradas
+# in-place depois da carga). Backends em memória usam um token único por objeto vivo
+# (custo zero); o cache em disco precisa do conteúdo, que vem da carga (registrada a
+# partir do hash dos arquivos) ou, para outros DataFrames, do hash de todas as linhas.
+_impressoes = {}
+# impressão -> chaves de resultados calculados a partir dela (para invalidar_impressao).
+_chaves_por_impressao = {}
+_trava_impressoes = threading.Lock()
+_contador = itertools.count()
+
+def _retirar(registro):
+    # O objeto foi coletado: seu token não volta a aparecer numa chave, e a impressão de
+    # conteúdo só continua valendo se outro objeto vivo a tiver.
+    _chaves_por_impressao.pop(registro['token'], None)
+    conteudo = registro['conteudo']
+    if conteudo is not None and all(outro['conteudo'] != conteudo for outro in _impressoes.values()):
+        _chaves_por_impressao.pop(conteudo, None)
+
+def _esquecer(id_objeto, token):
+    with _trava_impressoes:
+        registro = _impressoes.get(id_objeto)
+        # O id pode já ter sido reaproveitado por outro objeto, que ficou com um registro novo.
+        if registro is not None and registro['token'] == token:
+            del _impressoes[id_objeto]
+            _retirar(registro)
+        else:
+            _chaves_por_impressao.pop(token, None)
+
+def _registro(df):
+    with _trava_impressoes:
+        registro = _impressoes.get(id(df))
+        if registro is None or registro['ref']() is not df:
+            if registro is not None:
+                del _impressoes[id(df)]
+                _retirar(registro)
+            token = f"{os.getpid()}-{next(_contador)}"
+            registro = {'ref': weakref.ref(df, lambda _, chave=id(df), token=token: _esquecer(chave, token)),
+                        'token': token, 'conteudo': None}
+            _impressoes[id(df)] = registro
+        return registro
+
+def registrar_impressao(df, impressao):
+    _registro(df)['conteudo'] = impressao
+    return df
+
+def _hash_conteudo(df):
+    digest = hashlib.sha256()
+    digest.update(repr((df.shape, list(map(str, df.columns)), list(map(str, df.dtypes)))).encode())
+    if len(df):
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def impressao_dataframe(df, por_conteudo=False):
+    registro = _registro(df)
+    if registro['conteudo'] is not None:
+        return registro['conteudo']
+    if not por_conteudo:
+        return registro['token']
+    registro['conteudo'] = _hash_conteudo(df)
+    return registro['conteudo']
+
+def _parte_da_chave(valor, por_conteudo):
+    if isinstance(valor, pd.DataFrame):
+        return ('df', impressao_dataframe(valor, por_conteudo))
+    return ('py', repr(valor))
+
+# Módulos cuja lógica define os resultados das análises. O cache em disco sobrevive às
+# atualizações do código: sua chave leva o hash do fonte deles (o de core_processing traz
+# VERSAO_LOGICA_LIMPEZA), assim como a chave do cache das bases leva a versão da limpeza.
+MODULOS_ANALISE = ('analysis_functions', 'reconciliacao', 'correspondencia', 'motor_duckdb', 'particionamento',
+                   'core_processing')
+
+@functools.lru_cache(maxsize=None)
+def versao_analises():
+    digest = hashlib.sha256()
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    for nome in MODULOS_ANALISE:
+        with open(os.path.join(pasta, f"{nome}.py"), 'rb') as f:
+            digest.update(nome.encode() + b'\0' + f.read())
+    return digest.hexdigest()[:16]
+
+def chave_da_chamada(funcao, args, kwargs, por_conteudo=False):
+    partes = [funcao.__module__, funcao.__qualname__]
+    if por_conteudo:
+        partes.append(('versao', versao_analises()))
+    partes += [_parte_da_chave(valor, por_conteudo) for valor in args]
+    partes += [(nome, _parte_da_chave(valor, por_conteudo)) for nome, valor in sorted(kwargs.items())]
+    impressoes = [impressao_dataframe(valor, por_conteudo) for valor in [*args, *kwargs.values()]
+                  if isinstance(valor, pd.DataFrame)]
+    return hashlib.sha256(repr(partes).encode()).hexdigest()[:32], impressoes
+
+def invalidar_impressao(*impressoes):
+    # Descarta do backend atual os resultados calculados sobre os dados com estas impressões.
+    with _trava_impressoes:
+        chaves = set().union(*[_chaves_por_impressao.pop(impressao, set()) for impressao in impressoes])
+    for chave in chaves:
+        _backend[0].remover(chave)
+    return len(chaves)
+
+def memoizar(funcao):
+    @functools.wraps(funcao)
+    def envoltorio(*args, **kwargs):
+        backend = _backend[0]
+        chave, impressoes = chave_da_chamada(funcao, args, kwargs, getattr(backend, 'por_conteudo', False))
+        chave = f"{funcao.__name__}_{chave}"
+        with _trava_impressoes:
+            for impressao in impressoes:
+                _chaves_por_impressao.setdefault(impressao, set()).add(chave)
+        return backend.obter(chave, lambda: funcao(*args, **kwargs))
+    return envoltorio
+
+def por_identidade(max_entradas=2):
+    # Cache pela identidade dos argumentos (as bases vivas), para estruturas derivadas delas,
+    # como índices, que valem enquanto os mesmos objetos estiverem em uso e não entram no backend.
+    # A entrada sai do cache assim que um dos objetos é coletado; por isso os valores não
+    # podem guardar referências aos próprios objetos recebidos (só aos seus arrays).
+    def decorador(funcao):
+        entradas, trava = OrderedDict(), threading.RLock()
+
+        def descartar(chave):
+            with trava:
+                item = entradas.get(chave)
+                if item is not None and any(ref() is None for ref in item[0]):
+                    del entradas[chave]
+
+        @functools.wraps(funcao)
+        def envoltorio(*objetos):
+            chave = tuple(map(id, objetos))
+            with trava:
+                item = entradas.get(chave)
+                if item is not None and all(ref() is objeto for ref, objeto in zip(item[0], objetos)):
+                    entradas.move_to_end(chave)
+                    return item[1]
+            resultado = funcao(*objetos)
+            with trava:
+                entradas[chave] = ([weakref.ref(objeto, lambda _, chave=chave: descartar(chave)) for objeto in objetos],
+                                   resultado)
+                while len(entradas) > max_entradas:
+                    entradas.popitem(last=False)
+            return resultado
+        envoltorio.limpar = entradas.clear
+        return envoltorio
+    return decorador
+
+def _configurar_por_ambiente():
+    escolha = os.environ.get('ANALISE_MEMOIZACAO', '').strip().lower()
+    limite_mb = os.environ.get('ANALISE_MEMOIZACAO_MAX_MB')
+    if limite_mb:
+        configurar(BackendLRU(max_mb=float(limite_mb)))
+    if escolha == 'disco':
+        configurar(BackendDisco())
+    elif escolha == 'nenhum':
+        configurar(None)
+
+_configurar_por_ambiente()
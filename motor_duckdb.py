@@ -0,0 +1,219 @@
+import os
+
+import numpy as np # type: ignore
+import pandas as pd # type: ignore
+import pyarrow as pa # type: ignore
+
+from pandas.api.extensions import take # type: ignore
+
+from core_processing import garantir_ordem_por_data, garantir_codigo_evento, COLUNA_REGISTROS_AGREGADOS
+from instrumentacao import etapa
+from reconciliacao import (
+    VISOES, REGRAS, EVENTOS, EXPATS_BRASIL, EXPATS_ESPANHA,
+    codificar_chaves, coluna, calcular_limites, visoes_necessarias, visao_da_condicao
+)
+
+# Motor DuckDB (opcional: pip install duckdb). As bases limpas são registradas como
+# tabelas Arrow em memória e as regras rodam em SQL: "registro mais recente por chave"
+# é uma window function sobre a posição no histórico já ordenado por data_efetiva. O SQL
+# devolve só chaves e posições; os valores do relatório são lidos das próprias bases por
+# posição, então tipos, categorias e ordem saem idênticos aos do motor pandas.
+
+PASTA_TEMPORARIA_DUCKDB = os.path.join('data', '.cache', 'duckdb')
+
+# Colunas que as regras filtram ou comparam. Vão para o SQL como texto, com a mesma
+# conversão de serie.astype(str) (nulos viram 'nan'), que é o que as regras em pandas
+# comparam; assim '=', 'IN' e 'NOT IN' não precisam tratar NULL.
+COLUNAS_TEXTO = ['status_empregado', 'expa_local', 'evento_codigo']
+COLUNAS_DATA = ['data_admissao', 'dt_pagto_rescisao']
+
+def _lista_sql(valores):
+    return ', '.join("'" + str(valor).replace("'", "''") + "'" for valor in valores)
+
+# visão -> filtro SQL equivalente ao filtro da visão em reconciliacao.VISOES
+FILTROS_SQL = {
+    'br_ativo_local': f"status_empregado = 'Activo' AND expa_local NOT IN ({_lista_sql(EXPATS_BRASIL)})",
+    'br_ativo': "status_empregado = 'Activo'",
+    'br': "TRUE",
+    'es_local': f"expa_local NOT IN ({_lista_sql(EXPATS_ESPANHA)})",
+    'es_ativo': "status_empregado = 'Activo'",
+}
+
+def _campo_da_condicao(condicao):
+    if condicao[0] == 'evento_em':
+        return 'evento_codigo'
+    return None if condicao[0] in ('existe', 'ausente') else condicao[1]
+
+def _colunas_das_visoes():
+    colunas = {visao: [] for visao in VISOES}
+    for condicoes, _, _ in REGRAS.values():
+        for condicao in condicoes:
+            campo = _campo_da_condicao(condicao)
+            if campo is not None and campo not in colunas[visao_da_condicao(condicao)]:
+                colunas[visao_da_condicao(condicao)].append(campo)
+    return colunas
+
+# visão -> colunas que as regras do registro leem da visão (levar só o necessário barateia a window function)
+COLUNAS_DAS_VISOES = _colunas_das_visoes()
+
+def conectar():
+    try:
+        import duckdb # type: ignore
+    except ImportError:
+        raise ImportError("O motor 'duckdb' requer o pacote opcional 'duckdb' (pip install duckdb).") from None
+    conexao = duckdb.connect()
+    # Consultas que não cabem na memória fazem spill para esta pasta; o limite pode ser
+    # ajustado por ANALISE_DUCKDB_MEMORIA (ex.: '4GB'). As threads seguem o padrão do DuckDB (todos os núcleos).
+    os.makedirs(PASTA_TEMPORARIA_DUCKDB, exist_ok=True)
+    conexao.execute(f"SET temp_directory = '{os.path.abspath(PASTA_TEMPORARIA_DUCKDB)}'")
+    if os.environ.get('ANALISE_DUCKDB_MEMORIA'):
+        conexao.execute(f"SET memory_limit = '{os.environ['ANALISE_DUCKDB_MEMORIA']}'")
+    return conexao
+
+def _texto_arrow(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Convertida uma vez por categoria; as linhas levam só os códigos (dicionário Arrow).
+        categorias = [str(valor) for valor in serie.cat.categories] + ['nan']
+        codigos = serie.cat.codes.to_numpy().astype(np.int32)
+        codigos[codigos < 0] = len(categorias) - 1
+        return pa.DictionaryArray.from_arrays(codigos, pa.array(categorias, type=pa.string()))
+    return pa.array(serie.astype(str).to_numpy(dtype=object), type=pa.string())
+
+def _tabela_arrow(df, codigos, colunas):
+    arrays = {'chave': pa.array(codigos, type=pa.int64()), 'posicao': pa.array(np.arange(len(df), dtype=np.int64))}
+    for col in colunas:
+        if col not in df.columns:
+            continue
+        if col in COLUNAS_TEXTO:
+            arrays[col] = _texto_arrow(df[col])
+        elif col in COLUNAS_DATA:
+            arrays[col] = pa.array(pd.to_datetime(df[col]).to_numpy(dtype='datetime64[ns]'), type=pa.timestamp('ns'))
+        else:
+            arrays[col] = pa.array(df[col].to_numpy(dtype=np.int64), type=pa.int64())
+    return pa.table(arrays)
+
+def _sql_visao(visao, colunas_disponiveis):
+    nome_base, _, _ = VISOES[visao]
+    colunas = [col for col in COLUNAS_DAS_VISOES[visao] if col in colunas_disponiveis[nome_base]]
+    registros = ''
+    if visao == 'es_ativo':
+        peso = f"SUM({COLUNA_REGISTROS_AGREGADOS})" if COLUNA_REGISTROS_AGREGADOS in colunas_disponiveis[nome_base] else "COUNT(*)"
+        registros = f", {peso} OVER (PARTITION BY chave) AS registros"
+    return (f"CREATE TEMP TABLE {visao} AS SELECT chave, posicao{''.join(', ' + col for col in colunas)}{registros} "
+            f"FROM {nome_base} WHERE {FILTROS_SQL[visao]} "
+            f"QUALIFY ROW_NUMBER() OVER (PARTITION BY chave ORDER BY posicao DESC) = 1")
+
+def _sql_condicao(condicao):
+    tipo = condicao[0]
+    if tipo == 'evento_em':
+        return f"lower({condicao[1]}.evento_codigo) IN ({_lista_sql(evento.lower() for evento in EVENTOS[condicao[2]])})"
+    campo = f"{condicao[2]}.{condicao[1]}"
+    if tipo == 'igual':
+        return f"{campo} = {_lista_sql([condicao[3]])}"
+    return f"{campo} {'<=' if tipo == 'ate' else '<'} $limite_{condicao[3]}"
+
+def _sql_regra(regra):
+    # Compila a regra do registro (reconciliacao.REGRAS): 'existe' vira JOIN, 'ausente' vira
+    # ANTI JOIN e as demais condições vão para o WHERE. Devolve também as visões cujas
+    # posições a consulta seleciona.
+    condicoes = REGRAS[regra][0]
+    existentes = [condicao[1] for condicao in condicoes if condicao[0] == 'existe']
+    ausentes = [condicao[1] for condicao in condicoes if condicao[0] == 'ausente']
+    filtros = [_sql_condicao(condicao) for condicao in condicoes if condicao[0] not in ('existe', 'ausente')]
+    corpo = f"FROM {existentes[0]}" + ''.join(f" JOIN {visao} USING (chave)" for visao in existentes[1:])
+    corpo += ''.join(f" ANTI JOIN {visao} USING (chave)" for visao in ausentes)
+    if filtros:
+        corpo += " WHERE " + " AND ".join(filtros)
+    return corpo, existentes
+
+def _montar_pendencias(selecao, bases, chaves, visoes):
+    # Mesmo layout das linhas selecionadas da base de conciliação.
+    colunas = {}
+    for visao in visoes:
+        nome_base, _, colunas_visao = VISOES[visao]
+        if f"posicao_{visao}" in selecao.columns:
+            posicoes = selecao[f"posicao_{visao}"].to_numpy(dtype=np.int64)
+        else:
+            posicoes = np.full(len(selecao), -1, dtype=np.int64)
+        df = bases[nome_base]
+        colunas.update({coluna(col, visao): take(df[col].array, posicoes, allow_fill=True)
+                        for col in colunas_visao if col in df.columns})
+        colunas[coluna('ordem', visao)] = posicoes
+        colunas[coluna('existe', visao)] = posicoes >= 0
+        if visao == 'es_ativo':
+            colunas[coluna('registros', visao)] = (selecao['registros'].to_numpy(dtype=np.int64) if 'registros' in selecao.columns
+                                                   else np.zeros(len(selecao), dtype=np.int64))
+    return pd.DataFrame(colunas, index=chaves.take(selecao['chave'].to_numpy(dtype=np.int64)))
+
+def selecionar_pendencias_sql(brasil_limpo, espanha_historico, regras, data_referencia, dias_limite_admissao, dias_limite_rescisao):
+    bases = {'brasil': garantir_codigo_evento(garantir_ordem_por_data(brasil_limpo)),
+             'espanha': garantir_codigo_evento(garantir_ordem_por_data(espanha_historico))}
+    with etapa('duckdb.registro', linhas_entrada=len(brasil_limpo) + len(espanha_historico)) as registro:
+        codigos, chaves = codificar_chaves(bases)
+        conexao = conectar()
+        colunas_disponiveis = {}
+        for nome_base, df in bases.items():
+            colunas = COLUNAS_TEXTO + COLUNAS_DATA + [COLUNA_REGISTROS_AGREGADOS]
+            conexao.register(nome_base, _tabela_arrow(df, codigos[nome_base], colunas))
+            colunas_disponiveis[nome_base] = [col for col in colunas if col in df.columns]
+        registro.linhas_saida = len(chaves)
+    parametros = {f"limite_{prazo}": limite.to_pydatetime()
+                  for prazo, limite in calcular_limites(data_referencia, dias_limite_admissao, dias_limite_rescisao).items()}
+    pendencias = {}
+    try:
+        with etapa('duckdb.visoes', linhas_entrada=len(brasil_limpo) + len(espanha_historico)):
+            # Cada visão é calculada uma vez e compartilhada pelas regras que dependem dela.
+            for visao in visoes_necessarias(*regras):
+                conexao.execute(_sql_visao(visao, colunas_disponiveis))
+        with etapa('duckdb.regras', linhas_entrada=len(chaves)) as registro:
+            for regra in regras:
+                corpo, visoes_da_regra = _sql_regra(regra)
+                _, visao_ordem, decrescente = REGRAS[regra]
+                selecionadas = [f"{visao}.posicao AS posicao_{visao}" for visao in visoes_da_regra]
+                if 'es_ativo' in visoes_da_regra:
+                    selecionadas.append("es_ativo.registros")
+                sql = (f"SELECT chave, {', '.join(selecionadas)} {corpo} "
+                       f"ORDER BY {visao_ordem}.posicao {'DESC' if decrescente else 'ASC'}")
+                usados = {nome: valor for nome, valor in parametros.items() if f"${nome}" in sql}
+                selecao = conexao.execute(sql, usados).df()
+                pendencias[regra] = _montar_pendencias(selecao, bases, chaves, visoes_necessarias(regra))
+            registro.linhas_saida = sum(len(df) for df in pendencias.values())
+    finally:
+        conexao.close()
+    return pendencias
+
+def divergencias_de_eventos_sql(brasil, espanha, eventos_excluidos=EVENTOS['outros_eventos_excluidos']):
+    # Regra de run_outros_eventos.py: registro mais recente por chapa (com data efetiva) em
+    # cada base, sem os eventos excluídos, e chapas cujo código de evento difere entre BR e ES.
+    bases = {nome: garantir_codigo_evento(garantir_ordem_por_data(df)) for nome, df in [('brasil', brasil), ('espanha', espanha)]}
+    with etapa('duckdb.outros_eventos', linhas_entrada=len(brasil) + len(espanha)) as registro:
+        codigos, _ = codificar_chaves(bases, chave='chapa')
+        conexao = conectar()
+        try:
+            for nome, df in bases.items():
+                tabela = _tabela_arrow(df, codigos[nome], ['evento_codigo'])
+                tabela = tabela.append_column('valida', pa.array((df['chapa'].notna() & df['data_efetiva'].notna()).to_numpy()))
+                conexao.register(nome, tabela)
+            recentes = ("SELECT chave, posicao, evento_codigo FROM {} WHERE valida "
+                        "QUALIFY ROW_NUMBER() OVER (PARTITION BY chave ORDER BY posicao DESC) = 1")
+            excluidos = _lista_sql(eventos_excluidos)
+            # O merge do pandas mantém a ordem do Brasil (mais recente primeiro) e numera as
+            # linhas antes do filtro de divergência: o índice do relatório é essa numeração.
+            selecao = conexao.execute(
+                f"WITH br AS ({recentes.format('brasil')}), es AS ({recentes.format('espanha')}), "
+                f"pares AS (SELECT br.posicao AS posicao_br, es.posicao AS posicao_es, br.evento_codigo AS evento_br, "
+                f"es.evento_codigo AS evento_es, ROW_NUMBER() OVER (ORDER BY br.posicao DESC) - 1 AS indice "
+                f"FROM br JOIN es USING (chave) WHERE br.evento_codigo NOT IN ({excluidos}) AND es.evento_codigo NOT IN ({excluidos})) "
+                f"SELECT posicao_br, posicao_es, indice FROM pares WHERE evento_br <> evento_es ORDER BY indice"
+            ).df()
+        finally:
+            conexao.close()
+        posicoes_br, posicoes_es = selecao['posicao_br'].to_numpy(dtype=np.int64), selecao['posicao_es'].to_numpy(dtype=np.int64)
+        df_divergencias = pd.DataFrame({
+            'chapa': take(bases['brasil']['chapa'].array, posicoes_br),
+            'nome': take(bases['brasil']['nome'].array, posicoes_br),
+            'motivo_evento_br': take(bases['brasil']['motivo_evento'].array, posicoes_br),
+            'motivo_evento_es': take(bases['espanha']['motivo_evento'].array, posicoes_es),
+        }, index=pd.Index(selecao['indice'].to_numpy(dtype=np.int64)))
+        registro.linhas_saida = len(df_divergencias)
+    return df_divergencias
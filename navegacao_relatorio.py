@@ -0,0 +1,129 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np # type: ignore
+import pandas as pd # type: ignore
+from numpy.dtypes import StringDType # type: ignore
+
+from core_processing import normalizar_texto
+
+# Índice de um relatório para a grade do app: filtro por categoria, busca por chapa/nome,
+# ordenação e paginação sem percorrer o relatório inteiro a cada interação. O índice é
+# montado uma vez por resultado; as consultas devolvem posições e só a página pedida
+# vira DataFrame.
+
+COLUNAS_BUSCA = ['chapa', 'chapa_brasil', 'id_sistema_local', 'nome', 'nome_completo']
+TAMANHO_GRAMA = 3
+ORDENACOES_EM_CACHE = 16
+_BITS_CARACTERE = 21  # maior code point Unicode: 0x10FFFF
+
+def _gramas(codigos):
+    # codigos: code points (um texto por linha, ou vários concatenados); devolve os trigramas empacotados em 63 bits.
+    codigos = codigos.astype(np.uint64)
+    return ((codigos[..., :-2] << np.uint64(2 * _BITS_CARACTERE)) | (codigos[..., 1:-1] << np.uint64(_BITS_CARACTERE))
+            | codigos[..., 2:])
+
+class IndiceRelatorio:
+    def __init__(self, df_relatorio, coluna_filtro=None):
+        self.df = df_relatorio
+        self.coluna_filtro = coluna_filtro
+        self._trava = threading.Lock()
+        self._ordenacoes = OrderedDict()
+        self._posicoes = np.arange(len(df_relatorio))
+        # Opções na mesma ordem de antes (ordem de aparição); os grupos guardam as posições de cada valor.
+        if coluna_filtro is not None and coluna_filtro in df_relatorio.columns:
+            self.opcoes = df_relatorio[coluna_filtro].dropna().unique().tolist()
+            self._grupos = df_relatorio.groupby(coluna_filtro, observed=True, sort=False, dropna=True).indices
+        else:
+            self.opcoes, self._grupos = [], {}
+        self._indexar_busca()
+
+    def __len__(self):
+        return len(self.df)
+
+    def _indexar_busca(self):
+        colunas = [col for col in COLUNAS_BUSCA if col in self.df.columns]
+        if not colunas or self.df.empty:
+            self._textos, self._gramas_ordenados, self._linhas_dos_gramas = np.array([], dtype=StringDType()), None, None
+            return
+        textos = [normalizar_texto(self.df[col].astype(object).fillna('')) for col in colunas]
+        textos = textos[0].str.cat(textos[1:], sep='\n') if len(textos) > 1 else textos[0]
+        # Strings de largura variável: com largura fixa, uma única célula longa faria o índice
+        # ocupar o tamanho dela em todas as linhas.
+        self._textos = textos.to_numpy(dtype=object).astype(StringDType())
+        tamanhos = textos.str.len().to_numpy(dtype=np.int64)
+        if tamanhos.max() < TAMANHO_GRAMA:
+            self._gramas_ordenados, self._linhas_dos_gramas = None, None
+            return
+        # Índice invertido de trigramas: (trigrama, linha) ordenado por trigrama, a partir dos textos
+        # concatenados; só valem os trigramas que começam e terminam na mesma linha.
+        codigos = np.frombuffer(''.join(textos).encode('utf-32-le'), dtype=np.uint32)
+        linha_do_caractere = np.repeat(np.arange(len(tamanhos)), tamanhos)
+        validos = linha_do_caractere[:-2] == linha_do_caractere[2:]
+        gramas, linhas = _gramas(codigos)[validos], linha_do_caractere[:-2][validos]
+        ordem = np.lexsort((linhas, gramas))
+        gramas, linhas = gramas[ordem], linhas[ordem]
+        unicos = np.ones(len(gramas), dtype=bool)
+        unicos[1:] = (gramas[1:] != gramas[:-1]) | (linhas[1:] != linhas[:-1])
+        self._gramas_ordenados, self._linhas_dos_gramas = gramas[unicos], linhas[unicos]
+
+    def buscar(self, termo):
+        # Posições (crescentes) das linhas cuja chapa ou nome contém o termo.
+        termo = normalizar_texto(pd.Series([termo])).iloc[0]
+        if not termo:
+            return self._posicoes
+        if self._gramas_ordenados is None or len(termo) < TAMANHO_GRAMA:
+            # Termos curtos casam com boa parte do relatório: a varredura vetorizada é o caminho direto.
+            return np.flatnonzero(np.char.find(self._textos, termo) >= 0)
+        codigos = np.frombuffer(termo.encode('utf-32-le'), dtype=np.uint32)[None, :]
+        listas = []
+        for grama in np.unique(_gramas(codigos)):
+            inicio = np.searchsorted(self._gramas_ordenados, grama, side='left')
+            fim = np.searchsorted(self._gramas_ordenados, grama, side='right')
+            if inicio == fim:
+                return self._posicoes[:0]
+            listas.append(self._linhas_dos_gramas[inicio:fim])
+        # Interseção a partir da lista mais curta: o custo acompanha o trigrama mais raro.
+        listas.sort(key=len)
+        candidatas = listas[0]
+        for lista in listas[1:]:
+            candidatas = np.intersect1d(candidatas, lista, assume_unique=True)
+        # Os trigramas só indicam candidatas: a confirmação é feita no texto delas.
+        return candidatas[np.char.find(self._textos[candidatas], termo) >= 0]
+
+    def filtrar(self, valor=None):
+        if valor is None:
+            return self._posicoes
+        return self._grupos.get(valor, self._posicoes[:0])
+
+    def _ordem(self, coluna, decrescente):
+        # Posição de cada linha na ordenação pela coluna; calculada uma vez por (coluna, sentido).
+        chave = (coluna, decrescente)
+        with self._trava:
+            if chave in self._ordenacoes:
+                self._ordenacoes.move_to_end(chave)
+                return self._ordenacoes[chave]
+        ordenadas = self.df[coluna].reset_index(drop=True).sort_values(
+            ascending=not decrescente, kind='stable', na_position='last').index.to_numpy()
+        posto = np.empty(len(ordenadas), dtype=np.int64)
+        posto[ordenadas] = np.arange(len(ordenadas))
+        with self._trava:
+            self._ordenacoes[chave] = posto
+            while len(self._ordenacoes) > ORDENACOES_EM_CACHE:
+                self._ordenacoes.popitem(last=False)
+        return posto
+
+    def consultar(self, filtro=None, busca='', ordenar_por=None, decrescente=False):
+        posicoes = self.filtrar(filtro)
+        if busca and busca.strip():
+            posicoes = np.intersect1d(posicoes, self.buscar(busca), assume_unique=True)
+        if ordenar_por is not None:
+            posicoes = posicoes[np.argsort(self._ordem(ordenar_por, decrescente)[posicoes], kind='stable')]
+        return posicoes
+
+    def linhas(self, posicoes):
+        return self.df.iloc[posicoes]
+
+    def pagina(self, posicoes, numero, tamanho):
+        inicio = (numero - 1) * tamanho
+        return self.df.iloc[posicoes[inicio:inicio + tamanho]]
@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np # type: ignore
+import pandas as pd # type: ignore
+
+from core_processing import garantir_ordem_por_data, garantir_codigo_evento
+from instrumentacao import etapa
+from reconciliacao import selecionar_pendencias, coluna, VISOES, ORDEM_DAS_REGRAS
+
+# Execução particionada das regras: toda regra olha só para os registros de um mesmo
+# id_sistema_local, então as bases podem ser divididas pelo hash da chave (a mesma chave cai
+# na mesma partição no Brasil e na Espanha) e cada partição conciliada num processo.
+# Cada partição é um subconjunto do histórico ordenado, na mesma ordem; as colunas
+# 'ordem__<visão>' voltam para a posição no histórico completo e as linhas de cada regra
+# são reordenadas por elas, exatamente como na execução serial. Os relatórios e os TXT são
+# montados depois, sobre as pendências juntadas (os candidatos de EVE001 precisam do
+# histórico inteiro da Espanha).
+# Os processos são iniciados por 'spawn', nunca por 'fork': a execução particionada é chamada
+# de dentro das threads do run_lote.py e do Streamlit, e um fork feito enquanto outra thread
+# segura um lock (do DuckDB, do pandas, do allocator) deixa o processo filho travado nele.
+
+def _inicializar_particao(copy_on_write):
+    # O processo novo não herda as opções do pandas: segue a do processo que particionou.
+    pd.set_option('mode.copy_on_write', copy_on_write)
+
+def particao_da_chave(chaves, particoes):
+    # Hash do valor (e não do código do factorize): estável entre execuções e entre as duas bases.
+    return (pd.util.hash_pandas_object(chaves, index=False).to_numpy() % np.uint64(particoes)).astype(np.int64)
+
+def particionar(bases, particoes, chave='id_sistema_local'):
+    # -> uma lista de (bases da partição, posições de cada linha no histórico completo).
+    posicoes_por_base = {}
+    for nome, df in bases.items():
+        particao = particao_da_chave(df[chave], particoes)
+        ordem = np.argsort(particao, kind='stable')
+        inicio = np.searchsorted(particao[ordem], np.arange(particoes + 1), side='left')
+        posicoes_por_base[nome] = [ordem[inicio[p]:inicio[p + 1]] for p in range(particoes)]
+    return [({nome: bases[nome].iloc[posicoes_por_base[nome][p]] for nome in bases},
+             {nome: posicoes_por_base[nome][p] for nome in bases}) for p in range(particoes)]
+
+def _posicoes_globais(df, posicoes):
+    novas = {}
+    for visao, (nome_base, _, _) in VISOES.items():
+        ordem = coluna('ordem', visao)
+        if ordem in df.columns:
+            local = df[ordem].to_numpy(dtype=np.int64)
+            globais = np.full(len(local), -1, dtype=np.int64)
+            existe = local >= 0
+            globais[existe] = posicoes[nome_base][local[existe]]
+            novas[ordem] = globais
+    return df.assign(**novas)
+
+def _selecionar_particao(bases, posicoes, regras, data_referencia, dias_limite_admissao, dias_limite_rescisao, motor, as_of):
+    pendencias = selecionar_pendencias(bases['brasil'], bases['espanha'], regras, data_referencia,
+                                       dias_limite_admissao, dias_limite_rescisao, motor, as_of)
+    return {regra: _posicoes_globais(df, posicoes) for regra, df in pendencias.items()}
+
+def _juntar(partes, regra):
+    frames = [pendencias[regra] for pendencias in partes]
+    frames = [df for df in frames if len(df)] or frames[:1]
+    visao, decrescente = ORDEM_DAS_REGRAS[regra]
+    # A posição no histórico é única por chave selecionada: a ordenação não tem empates.
+    return pd.concat(frames).sort_values(coluna('ordem', visao), ascending=not decrescente, kind='mergesort')
+
+def selecionar_pendencias_particionado(brasil_limpo, espanha_historico, regras, data_referencia, dias_limite_admissao,
+                                       dias_limite_rescisao, motor, as_of, particoes, max_workers=None):
+    # Ordenação e códigos de evento antes de dividir: as posições e as categorias valem para o histórico completo.
+    bases = {'brasil': garantir_codigo_evento(garantir_ordem_por_data(brasil_limpo)),
+             'espanha': garantir_codigo_evento(garantir_ordem_por_data(espanha_historico))}
+    with etapa('conciliacao.particoes', linhas_entrada=len(bases['brasil']) + len(bases['espanha'])) as registro:
+        divisao = particionar(bases, particoes)
+        max_workers = min(particoes, max_workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_inicializar_particao,
+                                 initargs=(pd.get_option('mode.copy_on_write'),)) as pool:
+            futuros = [pool.submit(_selecionar_particao, bases_particao, posicoes, regras, data_referencia,
+                                   dias_limite_admissao, dias_limite_rescisao, motor, as_of)
+                       for bases_particao, posicoes in divisao]
+            # Resultados na ordem das partições, independentemente de qual termina primeiro.
+            partes = [futuro.result() for futuro in futuros]
+        pendencias = {regra: _juntar(partes, regra) for regra in regras}
+        registro.linhas_saida = sum(len(df) for df in pendencias.values())
+    return pendencias
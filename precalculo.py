@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd # type: ignore
+
+from core_processing import load_and_prepare_data, fontes_alteradas, ConjuntoDados, ARQUIVOS_FONTE, ativar_copy_on_write
+from analysis_functions import analisar_pendencias
+from reconciliacao import data_de_referencia, resolver_motor, MOTORES
+from reducao_historico import FONTES_HISTORICO_ESPANHA
+
+# Pré-cálculo das análises do app. Um processo em segundo plano (python precalculo.py) vigia
+# a pasta 'data', espera os arquivos pararem de mudar e recalcula a carga e as três análises.
+# Cada resultado vai para uma pasta própria em data/.precalculo/ e só depois 'atual.json'
+# passa a apontar para ela: o app nunca lê um pré-cálculo pela metade. O app usa o
+# pré-cálculo enquanto ele corresponde aos arquivos de 'data' e à data de hoje; fora disso
+# calcula as análises na hora, como antes.
+
+PASTA_PRECALCULO = os.path.join('data', '.precalculo')
+ANALISES_PRECALCULADAS = ['admissoes', 'divergencias', 'demissoes']
+# Pré-cálculos mantidos além do atual: uma sessão do app pode ainda estar lendo o anterior.
+PRECALCULOS_ANTERIORES = 1
+ESPERA_ESTABILIZACAO = 5.0
+INTERVALO_VERIFICACAO = 2.0
+# Com o watchdog o laço acorda por eventos; o intervalo só serve para notar a virada do dia.
+INTERVALO_MAXIMO = 60.0
+
+def arquivos_vigiados(data_path='data'):
+    nomes = dict.fromkeys(ARQUIVOS_FONTE + FONTES_HISTORICO_ESPANHA)
+    return [os.path.join(data_path, nome) for nome in nomes]
+
+def assinatura_fontes(data_path='data'):
+    # Tamanho e data de modificação de cada arquivo vigiado; None para os ausentes.
+    assinatura = []
+    for caminho in arquivos_vigiados(data_path):
+        try:
+            info = os.stat(caminho)
+            assinatura.append((info.st_size, info.st_mtime_ns))
+        except FileNotFoundError:
+            assinatura.append(None)
+    return tuple(assinatura)
+
+def _arquivos_legiveis(data_path='data'):
+    # Uma cópia em andamento costuma deixar o arquivo bloqueado (Windows) ou com o .xlsx
+    # ainda sem o diretório central do zip.
+    import zipfile
+    for caminho in arquivos_vigiados(data_path):
+        if not os.path.exists(caminho):
+            continue
+        try:
+            with open(caminho, 'rb'):
+                pass
+            if caminho.endswith('.xlsx') and not zipfile.is_zipfile(caminho):
+                return False
+        except OSError:
+            return False
+    return True
+
+class Precalculo:
+    # Um pré-cálculo gravado: o manifesto é lido na abertura e cada relatório na primeira consulta.
+    __slots__ = ('pasta', 'manifesto', '_relatorios')
+
+    def __init__(self, pasta, manifesto):
+        self.pasta, self.manifesto, self._relatorios = pasta, manifesto, {}
+
+    @property
+    def identificador(self):
+        return os.path.basename(self.pasta)
+
+    def relatorio(self, nome):
+        if nome not in self._relatorios:
+            df_relatorio = pd.read_pickle(os.path.join(self.pasta, f'{nome}.pkl'))
+            with open(os.path.join(self.pasta, f'{nome}.txt'), 'r', encoding='utf-8') as f:
+                self._relatorios[nome] = (df_relatorio, f.read())
+        return self._relatorios[nome]
+
+    def relatorios(self):
+        return {nome: self.relatorio(nome) for nome in ANALISES_PRECALCULADAS}
+
+    def desatualizado(self):
+        return (fontes_alteradas(self.manifesto['fontes'])
+                or self.manifesto['data_referencia'] != data_de_referencia().date().isoformat())
+
+def precalculo_atual(pasta_precalculo=PASTA_PRECALCULO):
+    # Identificador do pré-cálculo vigente, ou None se ainda não houver um.
+    try:
+        with open(os.path.join(pasta_precalculo, 'atual.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)['precalculo']
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"AVISO: Ponteiro do pré-cálculo ilegível; as análises serão calculadas na hora.\nDetalhe: {e}")
+        return None
+
+def abrir_precalculo(identificador, pasta_precalculo=PASTA_PRECALCULO):
+    if identificador is None:
+        return None
+    pasta = os.path.join(pasta_precalculo, identificador)
+    try:
+        with open(os.path.join(pasta, 'manifesto.json'), 'r', encoding='utf-8') as f:
+            return Precalculo(pasta, json.load(f))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"AVISO: Pré-cálculo '{identificador}' ignorado por erro de leitura.\nDetalhe: {e}")
+        return None
+
+def _limpar_anteriores(pasta_precalculo, atual):
+    pastas = sorted(nome for nome in os.listdir(pasta_precalculo)
+                    if os.path.isdir(os.path.join(pasta_precalculo, nome)) and nome != atual)
+    # Pastas .tmp são de gravações interrompidas; as demais saem das mais antigas para as mais novas.
+    temporarias = [nome for nome in pastas if nome.endswith('.tmp')]
+    completas = [nome for nome in pastas if not nome.endswith('.tmp') and nome < atual]
+    for nome in temporarias + completas[:max(len(completas) - PRECALCULOS_ANTERIORES, 0)]:
+        shutil.rmtree(os.path.join(pasta_precalculo, nome), ignore_errors=True)
+
+def precalcular(motor=None, streaming=None, pasta_precalculo=PASTA_PRECALCULO):
+    inicio = time.perf_counter()
+    conjunto_dados = load_and_prepare_data(streaming=streaming)
+    if not isinstance(conjunto_dados, ConjuntoDados):
+        print("ERRO: Pré-cálculo interrompido devido a erro na carga dos dados.")
+        return None
+    motor, data_referencia, agora = resolver_motor(motor), data_de_referencia(), datetime.now()
+    resultados = analisar_pendencias(conjunto_dados.brasil, conjunto_dados.espanha, data_referencia, motor=motor)
+
+    identificador = agora.strftime('%Y%m%d_%H%M%S_%f')
+    pasta_final = os.path.join(pasta_precalculo, identificador)
+    pasta_temporaria = pasta_final + '.tmp'
+    os.makedirs(pasta_temporaria)
+    for nome, (df_relatorio, txt) in resultados.items():
+        df_relatorio.to_pickle(os.path.join(pasta_temporaria, f'{nome}.pkl'))
+        with open(os.path.join(pasta_temporaria, f'{nome}.txt'), 'w', encoding='utf-8') as f:
+            f.write(txt)
+    manifesto = {
+        'gerado_em': agora.isoformat(timespec='seconds'), 'data_referencia': data_referencia.date().isoformat(),
+        'motor': motor, 'impressao': conjunto_dados.impressao, 'fontes': conjunto_dados.fontes,
+        'analises': {nome: len(df_relatorio) for nome, (df_relatorio, _) in resultados.items()},
+        'segundos': round(time.perf_counter() - inicio, 3),
+    }
+    with open(os.path.join(pasta_temporaria, 'manifesto.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    # A pasta completa ganha o nome definitivo e só então o ponteiro muda.
+    os.replace(pasta_temporaria, pasta_final)
+    caminho_ponteiro = os.path.join(pasta_precalculo, 'atual.json')
+    with open(caminho_ponteiro + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'precalculo': identificador}, f)
+    os.replace(caminho_ponteiro + '.tmp', caminho_ponteiro)
+    _limpar_anteriores(pasta_precalculo, identificador)
+
+    print(f"--- PRÉ-CÁLCULO: '{identificador}' pronto em {manifesto['segundos']:.1f}s "
+          f"({', '.join(f'{nome}: {linhas}' for nome, linhas in manifesto['analises'].items())}). ---")
+    return identificador
+
+def _observar_com_watchdog(data_path, alterado):
+    # Devolve o observer iniciado, ou None se o pacote watchdog não estiver disponível.
+    try:
+        from watchdog.observers import Observer # type: ignore
+        from watchdog.events import FileSystemEventHandler # type: ignore
+    except ImportError:
+        return None
+    vigiados = {os.path.normcase(os.path.abspath(caminho)) for caminho in arquivos_vigiados(data_path)}
+
+    class Sinalizador(FileSystemEventHandler):
+        def on_any_event(self, evento):
+            # Cópias que gravam num temporário e renomeiam chegam como 'moved' com dest_path.
+            caminhos = [evento.src_path, getattr(evento, 'dest_path', '')]
+            if any(os.path.normcase(os.path.abspath(c)) in vigiados for c in caminhos if c):
+                alterado.set()
+
+    observer = Observer()
+    observer.schedule(Sinalizador(), os.path.abspath(data_path), recursive=False)
+    observer.start()
+    return observer
+
+def _aguardar_estabilizar(data_path, assinatura, alterado, espera):
+    # Debounce: só segue quando nenhum evento chegou e a assinatura não mudou por 'espera' segundos.
+    while True:
+        alterado.clear()
+        time.sleep(espera)
+        nova = assinatura_fontes(data_path)
+        if nova == assinatura and not alterado.is_set() and _arquivos_legiveis(data_path):
+            return nova
+        assinatura = nova
+
+def vigiar(motor=None, streaming=None, espera=ESPERA_ESTABILIZACAO, intervalo=INTERVALO_VERIFICACAO,
+           usar_watchdog=True, data_path='data', pasta_precalculo=PASTA_PRECALCULO):
+    alterado = threading.Event()
+    observer = _observar_com_watchdog(data_path, alterado) if usar_watchdog else None
+    modo = 'eventos do sistema de arquivos (watchdog)' if observer else f'verificação a cada {intervalo:.0f}s'
+    print(f"--- PRÉ-CÁLCULO: Vigiando '{os.path.abspath(data_path)}' por {modo}. Ctrl+C encerra. ---")
+
+    precalculo = abrir_precalculo(precalculo_atual(pasta_precalculo), pasta_precalculo)
+    processada = None if precalculo is None or precalculo.desatualizado() else assinatura_fontes(data_path)
+    dia_processado = data_de_referencia() if processada is not None else None
+    try:
+        while True:
+            if processada is not None:
+                alterado.wait(INTERVALO_MAXIMO if observer else intervalo)
+            assinatura = assinatura_fontes(data_path)
+            if assinatura == processada and data_de_referencia() == dia_processado:
+                alterado.clear()
+                continue
+            if processada is not None:
+                print("--- PRÉ-CÁLCULO: Alteração detectada, aguardando os arquivos estabilizarem... ---")
+            assinatura = _aguardar_estabilizar(data_path, assinatura, alterado, espera)
+            try:
+                precalcular(motor, streaming, pasta_precalculo)
+            except Exception as e:
+                print(f"ERRO no pré-cálculo: {type(e).__name__}: {e}")
+            # Mesmo após um erro a assinatura é marcada: a próxima tentativa espera uma nova alteração.
+            processada, dia_processado = assinatura, data_de_referencia()
+    except KeyboardInterrupt:
+        print("--- PRÉ-CÁLCULO: Encerrado. ---")
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Vigia a pasta 'data' e pré-calcula as análises do app a cada base nova.")
+    parser.add_argument('--uma-vez', action='store_true', help="Pré-calcula uma vez e encerra, sem vigiar a pasta.")
+    parser.add_argument('--espera', type=float, default=ESPERA_ESTABILIZACAO,
+                        help="Segundos sem alterações nos arquivos antes de recalcular (padrão: %(default)s).")
+    parser.add_argument('--intervalo', type=float, default=INTERVALO_VERIFICACAO,
+                        help="Intervalo da verificação por polling, sem o watchdog (padrão: %(default)s).")
+    parser.add_argument('--polling', action='store_true', help="Não usa o watchdog, só a verificação periódica.")
+    parser.add_argument('--streaming', action='store_true', default=None,
+                        help="Lê o histórico da Espanha em blocos, mantendo só os registros usados pelas análises.")
+    parser.add_argument('--motor', choices=list(MOTORES), default=None,
+                        help="Motor das regras (padrão: ANALISE_MOTOR ou pandas).")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    ativar_copy_on_write()
+    args = _argumentos()
+    if args.uma_vez:
+        if precalcular(args.motor, args.streaming) is None:
+            raise SystemExit(1)
+    else:
+        vigiar(args.motor, args.streaming, args.espera, args.intervalo, usar_watchdog=not args.polling)
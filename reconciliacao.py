@@ -0,0 +1,344 @@
+import os
+import threading
+
+import pandas as pd # type: ignore
+import numpy as np # type: ignore
+
+from pandas.api.extensions import take # type: ignore
+
+from core_processing import garantir_ordem_por_data, garantir_codigo_evento, corte_as_of, COLUNA_REGISTROS_AGREGADOS
+from instrumentacao import etapa
+from memoizacao import por_identidade
+
+DIAS_LIMITE_ADMISSAO = 7
+DIAS_LIMITE_RESCISAO = 5
+COLUNAS_PARA_COMPARAR = ['cargo', 'categoria', 'familia', 'tipo_empregado', 'tipo_contrato', 'business_unit']
+EXPATS_BRASIL = ['expaIn', 'expaOut']
+EXPATS_ESPANHA = ['Expatriado entrante', 'Expatriado no oficial', 'Expatriado saliente']
+# Conjuntos de códigos de evento usados pelas regras.
+EVENTOS = {
+    # Comparado sem diferenciar maiúsculas (condição 'evento_em').
+    'demissao': ['EVE005', 'EVE008', 'EVE009', 'EVE010', 'EVE011', 'EVE024', 'EVE025', 'EVE026', 'EVE027'],
+    # Eventos tratados pelas outras análises e ignorados em run_outros_eventos.py (código exato).
+    'outros_eventos_excluidos': ['EVE001', 'EVE012', 'EVE013'],
+}
+EVENTOS_DEMISSAO = EVENTOS['demissao']
+
+# Cada regra olha para "o registro mais recente" de um recorte diferente do histórico
+# (só ativos, sem expatriados...). Uma visão = (base, filtro, colunas levadas para a
+# base de conciliação). A base de conciliação tem uma linha por id_sistema_local
+# presente no Brasil ou na Espanha (um outer join) e, para cada visão, as colunas
+# '<campo>__<visão>' do registro mais recente e a flag 'existe__<visão>'.
+VISOES = {
+    'br_ativo_local': ('brasil', lambda df: (df['status_empregado'] == 'Activo') & ~df['expa_local'].isin(EXPATS_BRASIL),
+                       ['chapa', 'nome', 'data_admissao', 'status_empregado', 'nacionalidade']),
+    'br_ativo': ('brasil', lambda df: df['status_empregado'] == 'Activo', ['chapa', 'nome'] + COLUNAS_PARA_COMPARAR),
+    'br': ('brasil', None, ['chapa', 'nome', 'status_empregado', 'motivo_evento', 'evento_codigo', 'dt_pagto_rescisao']),
+    'es_local': ('espanha', lambda df: ~df['expa_local'].isin(EXPATS_ESPANHA), ['status_empregado']),
+    'es_ativo': ('espanha', lambda df: df['status_empregado'] == 'Activo', ['status_empregado'] + COLUNAS_PARA_COMPARAR),
+}
+
+def coluna(campo, visao):
+    return f"{campo}__{visao}"
+
+def codificar_chaves(bases, chave='id_sistema_local'):
+    # Um único factorize sobre as chaves das duas bases: cada id_sistema_local vira um
+    # inteiro denso, e alinhar BR x ES passa a ser indexação de arrays em vez de joins.
+    # Chaves nulas formam um grupo próprio, como no pd.merge / drop_duplicates.
+    chaves = pd.concat([df[chave] for df in bases.values()], ignore_index=True)
+    codigos, valores = pd.factorize(chaves, use_na_sentinel=False)
+    codigos_por_base, inicio = {}, 0
+    for nome, df in bases.items():
+        codigos_por_base[nome] = codigos[inicio:inicio + len(df)]
+        inicio += len(df)
+    return codigos_por_base, pd.Index(valores, name=chave)
+
+def _posicoes_da_visao(df, filtro):
+    return np.arange(len(df)) if filtro is None else np.flatnonzero(filtro(df).to_numpy(dtype=bool, na_value=False))
+
+def _pesos_da_visao(df, posicoes):
+    # No histórico reduzido, cada linha informa quantos registros representa.
+    return df[COLUNA_REGISTROS_AGREGADOS].to_numpy()[posicoes] if COLUNA_REGISTROS_AGREGADOS in df.columns else None
+
+def _colunas_da_visao(df, ultima, colunas, visao, registros=None):
+    resultado = {coluna(col, visao): take(df[col].array, ultima, allow_fill=True)
+                 for col in colunas if col in df.columns}
+    # A posição no histórico também dá a ordem de saída de registros_mais_recentes: as
+    # regras a usam para devolver os relatórios na mesma sequência dos merges originais.
+    resultado[coluna('ordem', visao)] = ultima
+    resultado[coluna('existe', visao)] = ultima >= 0
+    if visao == 'es_ativo':
+        # O relatório de demissões traz uma linha por registro 'Activo' do histórico da Espanha.
+        resultado[coluna('registros', visao)] = registros
+    return resultado
+
+def _visao_mais_recente(df, codigos, qtd_chaves, filtro, colunas, visao):
+    # Com o histórico ordenado por data_efetiva, o registro mais recente de cada chave é
+    # a sua última posição (a mesma linha que registros_mais_recentes escolhe).
+    posicoes = _posicoes_da_visao(df, filtro)
+    ultima = np.full(qtd_chaves, -1, dtype=np.int64)
+    np.maximum.at(ultima, codigos[posicoes], posicoes)
+    registros = None
+    if visao == 'es_ativo':
+        registros = np.bincount(codigos[posicoes], weights=_pesos_da_visao(df, posicoes), minlength=qtd_chaves).astype(np.int64)
+    return _colunas_da_visao(df, ultima, colunas, visao, registros)
+
+def montar_base_conciliacao(brasil_limpo, espanha_historico, visoes=None):
+    bases = {'brasil': garantir_codigo_evento(garantir_ordem_por_data(brasil_limpo)),
+             'espanha': garantir_codigo_evento(garantir_ordem_por_data(espanha_historico))}
+    visoes = list(VISOES) if visoes is None else visoes
+    with etapa('conciliacao.chaves', linhas_entrada=len(brasil_limpo) + len(espanha_historico)) as registro:
+        codigos, chaves = codificar_chaves(bases)
+        registro.linhas_saida = len(chaves)
+    with etapa('conciliacao.visoes', linhas_entrada=len(brasil_limpo) + len(espanha_historico)) as registro:
+        colunas = {}
+        for visao in visoes:
+            nome_base, filtro, colunas_visao = VISOES[visao]
+            colunas.update(_visao_mais_recente(bases[nome_base], codigos[nome_base], len(chaves), filtro, colunas_visao, visao))
+        base = pd.DataFrame(colunas, index=chaves)
+        registro.linhas_saida = len(base)
+    return base
+
+# Índice temporal ("as of"): a mesma base de conciliação, mas com o registro mais recente de
+# cada chave até uma data. Para cada visão, as posições do histórico ficam ordenadas por
+# (chave, posição) uma única vez; como o histórico está ordenado por data_efetiva, "até a
+# data" é "antes da posição de corte", e o último registro de cada chave sai de um
+# searchsorted por chave (o mesmo que um merge_asof), sem reordenar nem refazer joins a
+# cada data consultada.
+class IndiceTemporal:
+    def __init__(self, brasil_limpo, espanha_historico):
+        # Cópias rasas: o índice compartilha os arrays das bases sem manter vivos os objetos
+        # recebidos, e sai do cache por identidade quando eles são descartados.
+        self.bases = {'brasil': garantir_codigo_evento(garantir_ordem_por_data(brasil_limpo)).copy(deep=False),
+                      'espanha': garantir_codigo_evento(garantir_ordem_por_data(espanha_historico)).copy(deep=False)}
+        with etapa('conciliacao.indice_temporal', linhas_entrada=len(brasil_limpo) + len(espanha_historico)) as registro:
+            self.codigos, self.chaves = codificar_chaves(self.bases)
+            self._datas = {}
+            for nome, df in self.bases.items():
+                datas = (df['data_efetiva'].to_numpy(dtype='datetime64[ns]') if 'data_efetiva' in df.columns
+                         else np.full(len(df), np.datetime64('NaT'), dtype='datetime64[ns]'))
+                self._datas[nome] = (datas, int(np.isnat(datas).sum()))
+            registro.linhas_saida = len(self.chaves)
+        self._visoes = {}
+        self._trava = threading.Lock()
+
+    def corte(self, nome_base, as_of):
+        if as_of is None:
+            return len(self.bases[nome_base])
+        datas, qtd_nulos = self._datas[nome_base]
+        return corte_as_of(datas, qtd_nulos, as_of)
+
+    def bases_ate(self, as_of):
+        return {nome: df.iloc[:self.corte(nome, as_of)] for nome, df in self.bases.items()}
+
+    def _indice_da_visao(self, visao):
+        with self._trava:
+            if visao in self._visoes:
+                return self._visoes[visao]
+        nome_base, filtro, _ = VISOES[visao]
+        df = self.bases[nome_base]
+        posicoes = _posicoes_da_visao(df, filtro)
+        codigos = self.codigos[nome_base][posicoes]
+        ordem = np.argsort(codigos, kind='stable')
+        posicoes, codigos = posicoes[ordem], codigos[ordem].astype(np.int64)
+        # Chave composta crescente: código * (linhas + 1) + posição.
+        composta = codigos * (len(df) + 1) + posicoes
+        inicio = np.searchsorted(codigos, np.arange(len(self.chaves)), side='left')
+        pesos = None
+        if visao == 'es_ativo':
+            pesos = _pesos_da_visao(df, posicoes)
+            pesos = np.concatenate([[0], np.cumsum(np.ones(len(posicoes)) if pesos is None else pesos)])
+        indice = (posicoes, composta, inicio, pesos)
+        with self._trava:
+            self._visoes[visao] = indice
+        return indice
+
+    def visao_ate(self, visao, as_of):
+        nome_base, _, colunas_visao = VISOES[visao]
+        df = self.bases[nome_base]
+        posicoes, composta, inicio, pesos = self._indice_da_visao(visao)
+        multiplicador = np.arange(len(self.chaves), dtype=np.int64) * (len(df) + 1)
+        fim = np.searchsorted(composta, multiplicador + self.corte(nome_base, as_of), side='left')
+        ultima = np.where(fim > inicio, posicoes[np.maximum(fim - 1, 0)] if len(posicoes) else -1, -1)
+        registros = None if pesos is None else (pesos[fim] - pesos[inicio]).astype(np.int64)
+        return _colunas_da_visao(df, ultima, colunas_visao, visao, registros)
+
+    def base_conciliacao(self, as_of, visoes=None):
+        # Chaves que só aparecem depois de 'as_of' ficam na base sem registro em nenhuma visão;
+        # como toda regra exige a existência em alguma visão, elas nunca são selecionadas.
+        visoes = list(VISOES) if visoes is None else visoes
+        with etapa('conciliacao.visoes_as_of', linhas_entrada=len(self.chaves)) as registro:
+            colunas = {}
+            for visao in visoes:
+                colunas.update(self.visao_ate(visao, as_of))
+            base = pd.DataFrame(colunas, index=self.chaves)
+            registro.linhas_saida = len(base)
+        return base
+
+# Um índice por par de bases vivo: replays de várias datas sobre as mesmas bases (app,
+# reprocessamento, análises em sequência) reaproveitam o índice.
+@por_identidade(max_entradas=2)
+def indice_temporal(brasil_limpo, espanha_historico):
+    return IndiceTemporal(brasil_limpo, espanha_historico)
+
+# --- Regras: predicados vetorizados sobre a base de conciliação ---
+
+# As janelas contam em dias inteiros a partir da data de referência (por padrão, hoje, ou a
+# data 'as_of' quando a análise é reproduzida para uma data passada): o resultado só muda
+# quando o dia muda, e a data entra na chave da memoização.
+def data_de_referencia(data_referencia=None, as_of=None):
+    data_referencia = as_of if data_referencia is None else data_referencia
+    return pd.Timestamp.now().normalize() if data_referencia is None else pd.Timestamp(data_referencia).normalize()
+
+def resolver_as_of(as_of=None):
+    return None if as_of is None else pd.Timestamp(as_of).normalize()
+
+def limite_admissao(data_referencia, dias_limite=DIAS_LIMITE_ADMISSAO):
+    return data_referencia - pd.Timedelta(days=dias_limite)
+
+def limite_rescisao(data_referencia, dias_limite=DIAS_LIMITE_RESCISAO):
+    # Pagamentos até o fim do dia (referência - dias_limite), exclusive.
+    return data_referencia + pd.Timedelta(days=1) - pd.Timedelta(days=dias_limite)
+
+# prazo -> (função do limite, dias padrão). Os dias podem ser trocados por chamada
+# (dias_limite_admissao / dias_limite_rescisao das análises).
+PRAZOS = {
+    'admissao': (limite_admissao, DIAS_LIMITE_ADMISSAO),
+    'rescisao': (limite_rescisao, DIAS_LIMITE_RESCISAO),
+}
+
+# Registro das regras: regra -> (condições, visão cuja posição no histórico dá a ordem do
+# relatório, decrescente). Todas as condições precisam valer. Tipos de condição:
+#   ('existe', visão) / ('ausente', visão): a chave tem (ou não) registro na visão;
+#   ('igual', campo, visão, valor): o campo do registro mais recente da visão vale 'valor';
+#   ('evento_em', visão, conjunto): o código de evento está em EVENTOS[conjunto];
+#   ('ate', campo, visão, prazo) / ('antes', campo, visão, prazo): a data é <= / < o limite do prazo.
+# O motor pandas compila cada condição numa máscara vetorizada; o DuckDB, num trecho de SQL
+# (motor_duckdb.py). Uma verificação nova é uma entrada aqui, avaliada na mesma passada das outras.
+REGRAS = {
+    'eve001': ([('existe', 'br_ativo_local'), ('ausente', 'es_local'), ('ate', 'data_admissao', 'br_ativo_local', 'admissao')],
+               'br_ativo_local', False),
+    'eve003_023': ([('existe', 'br_ativo_local'), ('existe', 'es_local'),
+                    ('igual', 'status_empregado', 'br_ativo_local', 'Activo'),
+                    ('igual', 'status_empregado', 'es_local', 'Con terminación de contrato')],
+                   'br_ativo_local', False),
+    'divergencia_cadastro': ([('existe', 'br_ativo'), ('existe', 'es_ativo')], 'br_ativo', True),
+    'demissao': ([('existe', 'br'), ('existe', 'es_ativo'), ('evento_em', 'br', 'demissao'),
+                  ('antes', 'dt_pagto_rescisao', 'br', 'rescisao')],
+                 'br', True),
+}
+# regra -> (visão que dá a ordem do relatório, decrescente)
+ORDEM_DAS_REGRAS = {regra: (visao, decrescente) for regra, (_, visao, decrescente) in REGRAS.items()}
+
+def visao_da_condicao(condicao):
+    return condicao[1] if condicao[0] in ('existe', 'ausente', 'evento_em') else condicao[2]
+
+def visoes_necessarias(*regras):
+    usadas = {visao_da_condicao(condicao) for regra in regras for condicao in REGRAS[regra][0]}
+    return [visao for visao in VISOES if visao in usadas]
+
+def evento_em(codigos_evento, eventos):
+    # Em colunas categóricas a comparação é feita uma vez por categoria, não por linha.
+    eventos = [evento.lower() for evento in eventos]
+    if isinstance(codigos_evento.dtype, pd.CategoricalDtype):
+        nas_categorias = pd.Series(codigos_evento.cat.categories).astype(str).str.lower().isin(eventos).to_numpy()
+        codigos = codigos_evento.cat.codes.to_numpy()
+        return pd.Series(np.where(codigos >= 0, nas_categorias[codigos], False), index=codigos_evento.index)
+    return codigos_evento.astype(str).str.lower().isin(eventos) & codigos_evento.notna()
+
+def _compilar_condicao(condicao):
+    tipo = condicao[0]
+    if tipo in ('existe', 'ausente'):
+        existe = coluna('existe', condicao[1])
+        return (lambda base, limites: base[existe]) if tipo == 'existe' else (lambda base, limites: ~base[existe])
+    if tipo == 'evento_em':
+        codigos, eventos = coluna('evento_codigo', condicao[1]), EVENTOS[condicao[2]]
+        return lambda base, limites: evento_em(base[codigos], eventos)
+    campo = coluna(condicao[1], condicao[2])
+    if tipo == 'igual':
+        valor = condicao[3]
+        return lambda base, limites: base[campo] == valor
+    if tipo == 'ate':
+        prazo = condicao[3]
+        return lambda base, limites: base[campo] <= limites[prazo]
+    if tipo == 'antes':
+        prazo = condicao[3]
+        return lambda base, limites: base[campo].notna() & (base[campo] < limites[prazo])
+    raise ValueError(f"Condição desconhecida no registro de regras: {condicao}")
+
+# Compilado uma vez, na importação: condição -> função (base, limites) -> máscara.
+CONDICOES_COMPILADAS = {condicao: _compilar_condicao(condicao) for condicoes, _, _ in REGRAS.values() for condicao in condicoes}
+
+def selecionar(base, mascara, visao_ordem, decrescente=False):
+    selecionados = base[mascara]
+    return selecionados.sort_values(coluna('ordem', visao_ordem), ascending=not decrescente, kind='mergesort')
+
+def calcular_limites(data_referencia, dias_limite_admissao=DIAS_LIMITE_ADMISSAO, dias_limite_rescisao=DIAS_LIMITE_RESCISAO):
+    if data_referencia is None:
+        return {}
+    dias = {'admissao': dias_limite_admissao, 'rescisao': dias_limite_rescisao}
+    return {prazo: funcao(data_referencia, dias.get(prazo, padrao)) for prazo, (funcao, padrao) in PRAZOS.items()}
+
+def aplicar_regras(base, regras, data_referencia, dias_limite_admissao=DIAS_LIMITE_ADMISSAO,
+                   dias_limite_rescisao=DIAS_LIMITE_RESCISAO):
+    # Uma passada: cada condição é avaliada uma vez, mesmo quando várias regras a usam.
+    limites = calcular_limites(data_referencia, dias_limite_admissao, dias_limite_rescisao)
+    mascaras, pendencias = {}, {}
+    for regra in regras:
+        condicoes, visao_ordem, decrescente = REGRAS[regra]
+        for condicao in condicoes:
+            if condicao not in mascaras:
+                mascaras[condicao] = CONDICOES_COMPILADAS[condicao](base, limites).to_numpy(dtype=bool, na_value=False)
+        mascara = np.logical_and.reduce([mascaras[condicao] for condicao in condicoes])
+        pendencias[regra] = selecionar(base, mascara, visao_ordem, decrescente)
+    return pendencias
+
+# Motores de execução das regras. 'pandas' monta a base de conciliação acima; 'duckdb'
+# (motor_duckdb.py, pacote opcional) executa as mesmas regras em SQL, com várias threads
+# e spill em disco, e devolve exatamente as mesmas linhas, na mesma ordem.
+MOTORES = ('pandas', 'duckdb')
+
+def resolver_motor(motor=None):
+    motor = (motor or os.environ.get('ANALISE_MOTOR') or 'pandas').strip().lower()
+    if motor not in MOTORES:
+        raise ValueError(f"Motor '{motor}' não suportado. Use: {', '.join(MOTORES)}.")
+    return motor
+
+# Partições por hash de id_sistema_local conciliadas em paralelo (particionamento.py). O
+# resultado é idêntico ao da execução serial; ANALISE_PARTICOES=auto usa uma por núcleo.
+def resolver_particoes(particoes=None):
+    particoes = str(particoes or os.environ.get('ANALISE_PARTICOES') or 1).strip().lower()
+    particoes = (os.cpu_count() or 1) if particoes == 'auto' else int(particoes)
+    if particoes < 1:
+        raise ValueError(f"Número de partições inválido: {particoes}. Use um inteiro >= 1 ou 'auto'.")
+    return particoes
+
+def motores_disponiveis():
+    import importlib.util
+    return [motor for motor in MOTORES if motor == 'pandas' or importlib.util.find_spec(motor) is not None]
+
+def selecionar_pendencias(brasil_limpo, espanha_historico, regras, data_referencia,
+                          dias_limite_admissao=DIAS_LIMITE_ADMISSAO, dias_limite_rescisao=DIAS_LIMITE_RESCISAO, motor='pandas',
+                          as_of=None, particoes=1):
+    # regra -> linhas selecionadas, no layout da base de conciliação (colunas '<campo>__<visão>',
+    # índice id_sistema_local), já na ordem do relatório. Com 'as_of', o registro mais recente
+    # de cada chave é o último com data efetiva até essa data (índice temporal).
+    if particoes > 1:
+        from particionamento import selecionar_pendencias_particionado
+        return selecionar_pendencias_particionado(brasil_limpo, espanha_historico, regras, data_referencia,
+                                                  dias_limite_admissao, dias_limite_rescisao, motor, as_of, particoes)
+    if resolver_motor(motor) == 'duckdb':
+        from motor_duckdb import selecionar_pendencias_sql
+        if as_of is not None:
+            bases = indice_temporal(brasil_limpo, espanha_historico).bases_ate(as_of)
+            brasil_limpo, espanha_historico = bases['brasil'], bases['espanha']
+        return selecionar_pendencias_sql(brasil_limpo, espanha_historico, regras, data_referencia,
+                                         dias_limite_admissao, dias_limite_rescisao)
+    if as_of is None:
+        base = montar_base_conciliacao(brasil_limpo, espanha_historico, visoes_necessarias(*regras))
+    else:
+        base = indice_temporal(brasil_limpo, espanha_historico).base_conciliacao(as_of, visoes_necessarias(*regras))
+    with etapa('conciliacao.regras', linhas_entrada=len(base)) as registro:
+        pendencias = aplicar_regras(base, regras, data_referencia, dias_limite_admissao, dias_limite_rescisao)
+        registro.linhas_saida = sum(len(df) for df in pendencias.values())
+    return pendencias
@@ -0,0 +1,134 @@
+import os
+
+import numpy as np # type: ignore
+import pandas as pd # type: ignore
+
+from core_processing import (
+    padronizar_espanha, ordenar_por_data_efetiva, chave_canonica, COLUNA_REGISTROS_AGREGADOS
+)
+from instrumentacao import etapa
+from reconciliacao import EXPATS_ESPANHA
+
+# Leitura em streaming do histórico da Espanha: o arquivo é lido em blocos e só fica em
+# memória o que as análises usam. Isso é, para cada colaborador, o registro mais recente
+# de cada combinação (ativo?, expatriado?) e o mais recente por chapa (outros eventos).
+# Qualquer visão das análises (só ativos, sem expatriados, todos) escolhe o mesmo registro
+# que escolheria no histórico completo, e a existência da chave em cada visão também se
+# mantém. A linha mais recente de cada grupo carrega em 'registros_agregados' quantos
+# registros do histórico ela representa (a contagem de ativos do relatório de demissões).
+
+TAMANHO_BLOCO_HISTORICO = 50_000
+# Em ordem de preferência: exportações colunares/CSV são lidas mais rápido que o Excel.
+FONTES_HISTORICO_ESPANHA = ['Base SF.parquet', 'Base SF.csv', 'Base SF.xlsx']
+
+_CHAVE, _CHAPA, _ATIVO, _EXPATRIADO = '_chave_reducao', '_chapa_reducao', '_ativo_reducao', '_expatriado_reducao'
+_GRUPO = [_CHAVE, _ATIVO, _EXPATRIADO]
+
+def localizar_fonte_espanha(data_path):
+    for nome in FONTES_HISTORICO_ESPANHA:
+        caminho = os.path.join(data_path, nome)
+        if os.path.exists(caminho):
+            return caminho
+    return None
+
+def _converter_celula(valor):
+    # Mesma conversão do pd.read_excel: vazio -> '' (vira NaN no parser), float inteiro -> int.
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+def _blocos_excel(caminho, tamanho_bloco):
+    import openpyxl # type: ignore
+    livro = openpyxl.load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        linhas = livro.worksheets[0].iter_rows(values_only=True)
+        cabecalho = [_converter_celula(valor) for valor in next(linhas, ())]
+        bloco, vazias = [], []
+        for linha in linhas:
+            linha = [_converter_celula(valor) for valor in linha]
+            if all(valor == '' for valor in linha):
+                # Linhas vazias no fim da planilha são descartadas, como no read_excel.
+                vazias.append(linha)
+                continue
+            bloco.extend(vazias)
+            vazias = []
+            bloco.append(linha)
+            if len(bloco) >= tamanho_bloco:
+                yield pd.io.parsers.TextParser([cabecalho] + bloco, header=0).read()
+                bloco = []
+        if bloco:
+            yield pd.io.parsers.TextParser([cabecalho] + bloco, header=0).read()
+    finally:
+        livro.close()
+
+def _blocos_csv(caminho, tamanho_bloco):
+    with open(caminho, 'r', encoding='utf-8-sig') as f:
+        primeira_linha = f.readline()
+    separador = ';' if primeira_linha.count(';') > primeira_linha.count(',') else ','
+    yield from pd.read_csv(caminho, sep=separador, encoding='utf-8-sig', chunksize=tamanho_bloco)
+
+def _blocos_parquet(caminho, tamanho_bloco):
+    import pyarrow.parquet as pq # type: ignore
+    arquivo = pq.ParquetFile(caminho)
+    for lote in arquivo.iter_batches(batch_size=tamanho_bloco):
+        yield lote.to_pandas()
+
+LEITORES_EM_BLOCOS = {'.xlsx': _blocos_excel, '.csv': _blocos_csv, '.parquet': _blocos_parquet}
+
+def ler_em_blocos(caminho, tamanho_bloco=TAMANHO_BLOCO_HISTORICO):
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao not in LEITORES_EM_BLOCOS:
+        raise ValueError(f"Formato '{extensao}' não suportado na leitura em streaming. Use: {', '.join(LEITORES_EM_BLOCOS)}.")
+    return LEITORES_EM_BLOCOS[extensao](caminho, tamanho_bloco)
+
+def _marcar_grupos(bloco):
+    colunas = {
+        _CHAVE: chave_canonica(bloco['id_sistema_local']).astype(object) if 'id_sistema_local' in bloco.columns else np.nan,
+        _CHAPA: (chave_canonica(bloco['ID de usuario/empleado']).astype(object)
+                 if 'ID de usuario/empleado' in bloco.columns else np.nan),
+        _ATIVO: (bloco['status_empregado'].astype(str).str.strip() == 'Activo') if 'status_empregado' in bloco.columns else False,
+        _EXPATRIADO: (bloco['expa_local'].astype(str).str.strip().isin(EXPATS_ESPANHA)) if 'expa_local' in bloco.columns else False,
+        COLUNA_REGISTROS_AGREGADOS: 1,
+    }
+    return bloco.assign(**colunas)
+
+def _reduzir(historico):
+    # O histórico acumulado vem antes do bloco novo: a ordenação estável por data mantém a
+    # ordem do arquivo nos empates, como no loader completo.
+    historico = ordenar_por_data_efetiva(historico).reset_index(drop=True)
+    ultimo_do_grupo = ~historico.duplicated(subset=_GRUPO, keep='last')
+    registros = historico.groupby(_GRUPO, dropna=False, sort=False)[COLUNA_REGISTROS_AGREGADOS].transform('sum')
+    com_chapa = historico[_CHAPA].notna() & historico['data_efetiva'].notna() if 'data_efetiva' in historico.columns \
+        else historico[_CHAPA].notna()
+    ultimo_da_chapa = com_chapa & ~historico[_CHAPA].where(com_chapa).duplicated(keep='last')
+    historico[COLUNA_REGISTROS_AGREGADOS] = np.where(ultimo_do_grupo, registros, 0)
+    return historico[ultimo_do_grupo | ultimo_da_chapa]
+
+class RedutorHistorico:
+    # Mantém o estado reduzido enquanto os blocos chegam: memória proporcional ao número
+    # de colaboradores, não ao tamanho do histórico.
+    def __init__(self):
+        self.estado = None
+        self.linhas_lidas = 0
+
+    def adicionar(self, bloco):
+        self.linhas_lidas += len(bloco)
+        bloco = _marcar_grupos(padronizar_espanha(bloco))
+        self.estado = _reduzir(bloco if self.estado is None else pd.concat([self.estado, bloco], ignore_index=True))
+
+    def resultado(self):
+        if self.estado is None:
+            return pd.DataFrame()
+        return self.estado.drop(columns=[_CHAVE, _CHAPA, _ATIVO, _EXPATRIADO]).reset_index(drop=True)
+
+def ler_espanha_reduzida(caminho, tamanho_bloco=TAMANHO_BLOCO_HISTORICO):
+    redutor = RedutorHistorico()
+    with etapa('carga.streaming_espanha') as registro:
+        for bloco in ler_em_blocos(caminho, tamanho_bloco):
+            redutor.adicionar(bloco)
+        espanha = redutor.resultado()
+        registro.linhas_saida = len(espanha)
+    print(f"--- CORE: Histórico da Espanha lido em streaming: {redutor.linhas_lidas} registros -> {len(espanha)} mantidos. ---")
+    return espanha
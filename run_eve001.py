@@ -1,23 +1,20 @@
 import pandas as pd # type: ignore
 import numpy as np # type: ignore
 import os
+import sys
 from datetime import datetime
-from core_processing import load_and_prepare_data
-
-def run_analysis_novos_colaboradores():
-    print("--- EXECUTANDO ANÁLISE EVE001, 003 e 023 ---")
-    agora = datetime.now()
-    nome_pasta_saida = f"eve001_003_023_{agora.strftime('%d_%m_%y_%Hh%M')}"
-    output_dir = os.path.join('output', nome_pasta_saida)
-    os.makedirs(output_dir, exist_ok=True)
-    print(f"Diretório de saída para esta execução: '{output_dir}'")
-
-    brasil_limpo, espanha_historico = load_and_prepare_data()
-
-    if brasil_limpo is None or espanha_historico is None:
-        print("Execução interrompida devido a erro na carga dos dados.")
-        return
-
+from core_processing import load_and_prepare_data, registros_mais_recentes, renderizar_chave, historico_ate, ativar_copy_on_write
+from correspondencia import indice_candidatos, COLUNAS_CANDIDATO
+from reconciliacao import data_de_referencia, limite_admissao
+from exportacao import exportar_relatorio, caminho_relatorio
+from historico_resultados import registrar_resultado
+
+def executar_novos_colaboradores(brasil_limpo, espanha_historico, output_dir, formato='xlsx', as_of=None, historico=None):
+    # as_of: a análise como estaria nessa data (histórico até a data e prazo contado a partir dela).
+    # historico: SQLite onde gravar a execução (obrigatório para gravar um replay com as_of).
+    arquivos = []
+    candidatos = indice_candidatos(espanha_historico)
+    brasil_limpo, espanha_historico = historico_ate(brasil_limpo, as_of), historico_ate(espanha_historico, as_of)
     print("\nRegra 3: Removendo expatriados da análise...")
     
     expats_br_list = ['expaIn', 'expaOut']
@@ -26,62 +23,62 @@ def run_analysis_novos_colaboradores():
     expats_es_list = ['Expatriado entrante', 'Expatriado no oficial', 'Expatriado saliente']
     filtro_es_expat = espanha_historico['expa_local'].isin(expats_es_list)
 
-    brasil_para_analise = brasil_limpo[~filtro_br_expat].copy()
-    espanha_para_analise = espanha_historico[~filtro_es_expat].copy()
+    brasil_para_analise = brasil_limpo[~filtro_br_expat]
+    espanha_para_analise = espanha_historico[~filtro_es_expat]
     print(f"  - Análise seguirá com {len(brasil_para_analise)} registros do Brasil e {len(espanha_para_analise)} da Espanha.")
 
     lista_pendencias = []
 
     print("\nRegra 1: Verificando novas contratações (EVE001)...")
-    brasil_recente_para_novos = brasil_para_analise.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
+    brasil_recente = registros_mais_recentes(brasil_para_analise)
+    espanha_recente = registros_mais_recentes(espanha_para_analise)
     
-    df_merged_novos = pd.merge(brasil_recente_para_novos, espanha_para_analise[['id_sistema_local']].drop_duplicates(), on='id_sistema_local', how='left', indicator=True)
-    novos_nao_encontrados = df_merged_novos[df_merged_novos['_merge'] == 'left_only'].copy()
+    df_merged_novos = pd.merge(brasil_recente, espanha_recente[['id_sistema_local']], on='id_sistema_local', how='left', indicator=True)
+    novos_nao_encontrados = df_merged_novos[df_merged_novos['_merge'] == 'left_only']
 
-    hoje = pd.to_datetime(datetime.now().date())
-    data_limite_admissao = hoje - pd.Timedelta(days=7)
+    data_limite_admissao = limite_admissao(data_de_referencia(as_of=as_of))
     
-    pendencias_eve001 = novos_nao_encontrados[novos_nao_encontrados['data_admissao'] <= data_limite_admissao].copy()
-    pendencias_eve001['evento_sugerido'] = 'EVE001 - Nova Contratação'
+    pendencias_eve001 = novos_nao_encontrados[novos_nao_encontrados['data_admissao'] <= data_limite_admissao].assign(
+        evento_sugerido='EVE001 - Nova Contratação')
+    # Candidatos no histórico completo da Espanha (recontratação ou troca de ID).
+    pendencias_eve001 = pendencias_eve001.join(candidatos.melhores(
+        pendencias_eve001['nome'], pendencias_eve001['data_admissao'], pendencias_eve001['nacionalidade'],
+        index=pendencias_eve001.index, as_of=as_of))
     lista_pendencias.append(pendencias_eve001)
-    print(f"  - {len(pendencias_eve001)} pendências de EVE001 encontradas.")
+    print(f"  - {len(pendencias_eve001)} pendências de EVE001 encontradas, "
+          f"{pendencias_eve001['score_candidato'].notna().sum()} com candidato na Espanha.")
 
     print("\nRegra 2: Verificando divergência de status (EVE003/023)...")
-    brasil_recente = brasil_para_analise.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
-    espanha_recente = espanha_para_analise.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
-
     df_merged_status = pd.merge(brasil_recente, espanha_recente, on='id_sistema_local', suffixes=('_br', '_es'))
     
     filtro_status = (df_merged_status['status_empregado_br'] == 'Activo') & (df_merged_status['status_empregado_es'] == 'Con terminación de contrato')
-    pendencias_eve003_023 = df_merged_status[filtro_status].copy()
-
-    pendencias_eve003_023['nome'] = pendencias_eve003_023['nome_br']
-    
-    pendencias_eve003_023['evento_sugerido'] = 'VERIFICAR: EVE003/023 - Ativo no BR, Terminado na ES'
+    pendencias_eve003_023 = df_merged_status[filtro_status].assign(
+        nome=lambda df: df['nome_br'], evento_sugerido='VERIFICAR: EVE003/023 - Ativo no BR, Terminado na ES')
     lista_pendencias.append(pendencias_eve003_023)
     print(f"  - {len(pendencias_eve003_023)} pendências de EVE003/023 encontradas.")
 
     if not lista_pendencias:
         print("\nNenhuma pendência encontrada. Análise concluída.")
-        return
+        return {'linhas': 0, 'arquivos': arquivos}
 
     df_relatorio_final = pd.concat(lista_pendencias, ignore_index=True)
 
     colunas_relatorio = ['chapa', 'nome', 'data_admissao', 'evento_sugerido']
-    for col in ['status_empregado_br', 'status_empregado_es']:
+    for col in COLUNAS_CANDIDATO + ['status_empregado_br', 'status_empregado_es']:
         if col in df_relatorio_final.columns and col not in colunas_relatorio:
             colunas_relatorio.append(col)
 
-    df_relatorio_final = df_relatorio_final[colunas_relatorio].copy()
-    df_relatorio_final.rename(columns={'status_empregado_br': 'status_brasil', 'status_empregado_es': 'status_espanha'}, inplace=True)
-    df_relatorio_final['chapa'] = df_relatorio_final['chapa'].astype(str).str.split('.').str[0]
+    df_relatorio_final = df_relatorio_final[colunas_relatorio].rename(
+        columns={'status_empregado_br': 'status_brasil', 'status_empregado_es': 'status_espanha'})
+    df_relatorio_final['chapa'] = renderizar_chave(df_relatorio_final['chapa'])
+    registrar_resultado('eve001_003_023', df_relatorio_final, as_of, historico)
 
     print("\nPrévia do Relatório de Pendências:")
     print(df_relatorio_final.head())
 
-    caminho_excel = os.path.join(output_dir, 'eve001_003_023_pendencias.xlsx')
-    df_relatorio_final.to_excel(caminho_excel, index=False)
-    print(f"\n-> Relatório Excel gerado em: {caminho_excel}")
+    caminho_saida = exportar_relatorio(df_relatorio_final, caminho_relatorio(output_dir, 'eve001_003_023_pendencias', formato))
+    print(f"\n-> Relatório gerado em: {caminho_saida}")
+    arquivos.append(caminho_saida)
 
     chapas_eve001 = df_relatorio_final[df_relatorio_final['evento_sugerido'].str.contains('EVE001')]['chapa'].unique()
     chapas_verificar = df_relatorio_final[df_relatorio_final['evento_sugerido'].str.contains('VERIFICAR')]['chapa'].unique()
@@ -100,6 +97,25 @@ def run_analysis_novos_colaboradores():
         with open(caminho_txt, 'w', encoding='utf-8') as f:
             f.write('\n'.join(conteudo_txt))
         print(f"-> Arquivo TXT com chapas para EVE001/003/023 gerado em: {caminho_txt}")
+        arquivos.append(caminho_txt)
+    return {'linhas': len(df_relatorio_final), 'arquivos': arquivos}
+
+def run_analysis_novos_colaboradores(formato='xlsx'):
+    print("--- EXECUTANDO ANÁLISE EVE001, 003 e 023 ---")
+    agora = datetime.now()
+    nome_pasta_saida = f"eve001_003_023_{agora.strftime('%d_%m_%y_%Hh%M')}"
+    output_dir = os.path.join('output', nome_pasta_saida)
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"Diretório de saída para esta execução: '{output_dir}'")
+
+    brasil_limpo, espanha_historico = load_and_prepare_data()
+
+    if brasil_limpo is None or espanha_historico is None:
+        print("Execução interrompida devido a erro na carga dos dados.")
+        return
+
+    executar_novos_colaboradores(brasil_limpo, espanha_historico, output_dir, formato)
 
 if __name__ == '__main__':
-    run_analysis_novos_colaboradores()
\ No newline at end of file
+    ativar_copy_on_write()
+    run_analysis_novos_colaboradores(sys.argv[1] if len(sys.argv) > 1 else 'xlsx')
\ No newline at end of file
@@ -1,33 +1,27 @@
 import pandas as pd # type: ignore
 import numpy as np # type: ignore
 import os
+import sys
 from datetime import datetime
-from core_processing import load_and_prepare_data
+from core_processing import load_and_prepare_data, registros_mais_recentes, renderizar_chave, historico_ate, ativar_copy_on_write
+from analysis_functions import calcular_divergencias
+from exportacao import exportar_relatorio, caminho_relatorio
+from historico_resultados import registrar_resultado
 
-def run_analysis_divergencias():
-    print("--- EXECUTANDO ANÁLISE EVE012 & EVE013 (DIVERGÊNCIAS) ---")
-    agora = datetime.now()
-    nome_pasta_saida = f"eve012_013_{agora.strftime('%d_%m_%y_%Hh%M')}"
-    output_dir = os.path.join('output', nome_pasta_saida)
-    os.makedirs(output_dir, exist_ok=True)
-    print(f"Diretório de saída para esta execução: '{output_dir}'")
-
-    brasil_limpo, espanha_historico = load_and_prepare_data()
-
-    if brasil_limpo is None or espanha_historico is None:
-        print("Execução interrompida devido a erro na carga dos dados.")
-        return
-
-    espanha_ativos = espanha_historico[espanha_historico['status_empregado'] == 'Activo'].copy()
+def executar_divergencias(brasil_limpo, espanha_historico, output_dir, formato='xlsx', as_of=None, historico=None):
+    # as_of: compara os registros mais recentes até essa data; historico: como em run_eve001.
+    arquivos = []
+    brasil_limpo, espanha_historico = historico_ate(brasil_limpo, as_of), historico_ate(espanha_historico, as_of)
+    espanha_ativos = espanha_historico[espanha_historico['status_empregado'] == 'Activo']
     
     print("\nRemovendo duplicados e mantendo apenas o registro mais recente por data efetiva...")
     
     if 'data_efetiva' not in brasil_limpo.columns or 'data_efetiva' not in espanha_ativos.columns:
         print("ERRO CRÍTICO: A coluna 'data_efetiva' é necessária para a análise, mas não foi encontrada em uma das bases.")
-        return
+        return {'linhas': 0, 'arquivos': arquivos, 'erro': "Coluna 'data_efetiva' não encontrada."}
         
-    brasil_limpo = brasil_limpo.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
-    espanha_ativos = espanha_ativos.sort_values('data_efetiva').drop_duplicates(subset='id_sistema_local', keep='last')
+    brasil_limpo = registros_mais_recentes(brasil_limpo)
+    espanha_ativos = registros_mais_recentes(espanha_ativos)
     
     print(f"  - Registros únicos na base Brasil para análise: {brasil_limpo.shape[0]}")
     print(f"  - Registros únicos na base Espanha para análise: {espanha_ativos.shape[0]}")
@@ -40,6 +34,8 @@ def run_analysis_divergencias():
         suffixes=('_br', '_es')
     )
 
+    # Ordem própria do script (familia antes de categoria): é a ordem dos campos de cada
+    # colaborador no relatório, diferente da do app (analysis_functions.COLUNAS_PARA_COMPARAR).
     colunas_para_comparar = [
         'cargo', 'familia', 'categoria', 'tipo_empregado', 
         'tipo_contrato', 'business_unit'
@@ -54,37 +50,27 @@ def run_analysis_divergencias():
         colunas_ignoradas = set(colunas_para_comparar) - set(colunas_comparaveis)
         print(f"\nAVISO: As seguintes colunas serão ignoradas por não existirem em ambas as bases: {list(colunas_ignoradas)}")
 
-    divergencias = []
-
-    for index, row in df_merged.iterrows():
-        for coluna in colunas_comparaveis:
-            valor_br = row[f'{coluna}_br']
-            valor_es = row[f'{coluna}_es']
-            
-            if pd.notna(valor_br) and pd.notna(valor_es) and valor_br != valor_es:
-                divergencias.append({
-                    'id_sistema_local': row['id_sistema_local'],
-                    'chapa': row['chapa'],
-                    'nome': row.get('nome_br', row.get('nome_es')),
-                    'campo_divergente': coluna,
-                    'valor_brasil': valor_br,
-                    'valor_espanha': valor_es
-                })
+    # Pares com valor nulo em algum dos lados não são considerados divergência.
+    # A ordenação estável pelo índice devolve a ordem colaborador -> campo.
+    df_relatorio_final = calcular_divergencias(df_merged, colunas_comparaveis, tratamento_nan='ignorar')
+    df_relatorio_final = df_relatorio_final.sort_index(kind='stable').reset_index(drop=True)
 
-    if not divergencias:
+    if df_relatorio_final.empty:
         print("\nNenhuma divergência encontrada entre as bases Brasil e Espanha para as colunas analisadas.")
-        return
+        registrar_resultado('eve012_013', df_relatorio_final, as_of, historico)
+        return {'linhas': 0, 'arquivos': arquivos}
 
-    df_relatorio_final = pd.DataFrame(divergencias)
-    df_relatorio_final['chapa'] = df_relatorio_final['chapa'].astype(str).str.split('.').str[0]
+    df_relatorio_final['id_sistema_local'] = renderizar_chave(df_relatorio_final['id_sistema_local'])
+    df_relatorio_final['chapa'] = renderizar_chave(df_relatorio_final['chapa'])
     df_relatorio_final['evento_sugerido'] = np.where(df_relatorio_final['campo_divergente'] == 'business_unit', 'eve013', 'eve012')
+    registrar_resultado('eve012_013', df_relatorio_final, as_of, historico)
 
     print("\nPrévia do Relatório de Divergências:")
     print(df_relatorio_final.head())
 
-    caminho_excel = os.path.join(output_dir, 'eve012_013_divergencias_detectadas.xlsx')
-    df_relatorio_final.to_excel(caminho_excel, index=False)
-    print(f"\n-> Relatório Excel gerado em: {caminho_excel}")
+    caminho_saida = exportar_relatorio(df_relatorio_final, caminho_relatorio(output_dir, 'eve012_013_divergencias_detectadas', formato))
+    print(f"\n-> Relatório gerado em: {caminho_saida}")
+    arquivos.append(caminho_saida)
     
     chapas_eve012 = df_relatorio_final[df_relatorio_final['evento_sugerido'] == 'eve012']['chapa'].unique()
     chapas_eve013 = df_relatorio_final[df_relatorio_final['evento_sugerido'] == 'eve013']['chapa'].unique()
@@ -103,6 +89,25 @@ def run_analysis_divergencias():
         with open(caminho_txt, 'w', encoding='utf-8') as f:
             f.write('\n'.join(conteudo_txt))
         print(f"-> Arquivo TXT com chapas para EVE012/013 gerado em: {caminho_txt}")
+        arquivos.append(caminho_txt)
+    return {'linhas': len(df_relatorio_final), 'arquivos': arquivos}
+
+def run_analysis_divergencias(formato='xlsx'):
+    print("--- EXECUTANDO ANÁLISE EVE012 & EVE013 (DIVERGÊNCIAS) ---")
+    agora = datetime.now()
+    nome_pasta_saida = f"eve012_013_{agora.strftime('%d_%m_%y_%Hh%M')}"
+    output_dir = os.path.join('output', nome_pasta_saida)
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"Diretório de saída para esta execução: '{output_dir}'")
+
+    brasil_limpo, espanha_historico = load_and_prepare_data()
+
+    if brasil_limpo is None or espanha_historico is None:
+        print("Execução interrompida devido a erro na carga dos dados.")
+        return
+
+    executar_divergencias(brasil_limpo, espanha_historico, output_dir, formato)
 
 if __name__ == '__main__':
-    run_analysis_divergencias()
\ No newline at end of file
+    ativar_copy_on_write()
+    run_analysis_divergencias(sys.argv[1] if len(sys.argv) > 1 else 'xlsx')
\ No newline at end of file
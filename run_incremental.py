@@ -0,0 +1,48 @@
+import os
+import sys
+from datetime import datetime
+from core_processing import load_and_prepare_data, ativar_copy_on_write
+from analise_incremental import executar_incremental
+from exportacao import exportar_relatorio, caminho_relatorio
+from historico_resultados import registrar_execucao
+
+def run_analise_incremental(formato='xlsx'):
+    print("--- EXECUTANDO ANÁLISES EM MODO INCREMENTAL ---")
+    agora = datetime.now()
+    nome_pasta_saida = f"incremental_{agora.strftime('%d_%m_%y_%Hh%M')}"
+    output_dir = os.path.join('output', nome_pasta_saida)
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"Diretório de saída para esta execução: '{output_dir}'")
+
+    brasil_limpo, espanha_limpa = load_and_prepare_data()
+
+    if brasil_limpo is None or espanha_limpa is None:
+        print("Execução interrompida devido a erro na carga dos dados.")
+        return
+
+    resultados = executar_incremental(brasil_limpo, espanha_limpa)
+
+    for nome, (df_relatorio, txt, df_resolvidos) in resultados.items():
+        if 'Erro' in df_relatorio.columns:
+            print(f"\n[{nome}] {df_relatorio['Erro'].iloc[0]}")
+            continue
+        registrar_execucao(nome, df_relatorio)
+        novos = int(df_relatorio['novo_desde_ultima_execucao'].sum()) if not df_relatorio.empty else 0
+        print(f"\n[{nome}] {len(df_relatorio)} pendências ({novos} novas desde a última execução), "
+              f"{len(df_resolvidos)} resolvidas desde a última execução.")
+
+        if not df_relatorio.empty:
+            caminho_saida = exportar_relatorio(df_relatorio, caminho_relatorio(output_dir, f'{nome}_pendencias', formato))
+            print(f"-> Relatório gerado em: {caminho_saida}")
+        if not df_resolvidos.empty:
+            caminho_resolvidos = exportar_relatorio(df_resolvidos, caminho_relatorio(output_dir, f'{nome}_resolvidas', formato))
+            print(f"-> Pendências resolvidas salvas em: {caminho_resolvidos}")
+        if txt:
+            caminho_txt = os.path.join(output_dir, f'chapas_{nome}.txt')
+            with open(caminho_txt, 'w', encoding='utf-8') as f:
+                f.write(txt)
+            print(f"-> Arquivo TXT com chapas gerado em: {caminho_txt}")
+
+if __name__ == '__main__':
+    ativar_copy_on_write()
+    run_analise_incremental(sys.argv[1] if len(sys.argv) > 1 else 'xlsx')
@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from core_processing import load_and_prepare_data, ativar_copy_on_write
+from analysis_functions import analisar_pendencias
+from reconciliacao import resolver_motor, resolver_as_of, resolver_particoes, MOTORES
+from exportacao import exportar_relatorio, caminho_relatorio, FORMATOS_EXPORTACAO
+from historico_resultados import registrar_resultado
+from run_eve001 import executar_novos_colaboradores
+from run_eve012_013 import executar_divergencias
+from run_outros_eventos import executar_outros_eventos
+
+def executar_pendencias_app(brasil_limpo, espanha_historico, output_dir, formato='xlsx', motor=None, as_of=None, particoes=None,
+                            historico=None):
+    # Os três relatórios do app (admissões, divergências e demissões) numa passada só.
+    arquivos, linhas = [], 0
+    pendencias = analisar_pendencias(brasil_limpo, espanha_historico, motor=motor, as_of=as_of, particoes=particoes)
+    for nome, (df_relatorio, txt) in pendencias.items():
+        if 'Erro' in df_relatorio.columns:
+            print(f"ERRO [app_{nome}]: {df_relatorio['Erro'].iloc[0]}")
+            continue
+        registrar_resultado(nome, df_relatorio, as_of, historico)
+        linhas += len(df_relatorio)
+        if not df_relatorio.empty:
+            arquivos.append(exportar_relatorio(df_relatorio, caminho_relatorio(output_dir, f'app_{nome}_pendencias', formato)))
+        if txt:
+            caminho_txt = os.path.join(output_dir, f'chapas_app_{nome}.txt')
+            with open(caminho_txt, 'w', encoding='utf-8') as f:
+                f.write(txt)
+            arquivos.append(caminho_txt)
+    return {'linhas': linhas, 'arquivos': arquivos}
+
+ANALISES_LOTE = {
+    'eve001_003_023': executar_novos_colaboradores,
+    'eve012_013': executar_divergencias,
+    'outros_eventos': executar_outros_eventos,
+    'pendencias_app': executar_pendencias_app,
+}
+# Análises que aceitam o motor DuckDB; eve001_003_023 e eve012_013 rodam sempre em pandas.
+ANALISES_COM_MOTOR = {'outros_eventos', 'pendencias_app'}
+# Análises sobre o registro de regras, que podem ser conciliadas em partições paralelas.
+ANALISES_COM_PARTICOES = {'pendencias_app'}
+
+# No modo 'processos' cada worker recebe as bases uma única vez, no initializer.
+_bases_do_worker = {}
+
+def _inicializar_worker(brasil_limpo, espanha_historico):
+    # Processos iniciados por 'spawn' não executam o bloco __main__.
+    ativar_copy_on_write()
+    _bases_do_worker['brasil'], _bases_do_worker['espanha'] = brasil_limpo, espanha_historico
+
+def _executar_analise(nome, brasil_limpo, espanha_historico, output_dir, formato, motor='pandas', as_of=None, particoes=1,
+                      historico=None):
+    if brasil_limpo is None:
+        brasil_limpo, espanha_historico = _bases_do_worker['brasil'], _bases_do_worker['espanha']
+    inicio = time.perf_counter()
+    try:
+        opcoes = {'motor': motor} if nome in ANALISES_COM_MOTOR else {}
+        if as_of is not None:
+            opcoes['as_of'] = as_of
+        if nome in ANALISES_COM_PARTICOES:
+            opcoes['particoes'] = particoes
+        if historico is not None:
+            opcoes['historico'] = historico
+        resumo = ANALISES_LOTE[nome](brasil_limpo, espanha_historico, output_dir, formato, **opcoes) or {}
+        status = 'erro' if resumo.get('erro') else 'ok'
+    except Exception as e:
+        resumo, status = {'erro': f"{type(e).__name__}: {e}"}, 'erro'
+        print(f"ERRO na análise '{nome}': {resumo['erro']}")
+    return {
+        'analise': nome, 'status': status, 'segundos': round(time.perf_counter() - inicio, 3),
+        'linhas': resumo.get('linhas'), 'erro': resumo.get('erro'),
+        'arquivos': [os.path.relpath(caminho, output_dir) for caminho in resumo.get('arquivos', [])],
+    }
+
+def executar_lote(analises=None, formato='xlsx', executor='threads', max_workers=None, pasta_saida='output',
+                 streaming=None, motor=None, as_of=None, particoes=None, historico=None):
+    analises = list(ANALISES_LOTE) if not analises else analises
+    desconhecidas = [nome for nome in analises if nome not in ANALISES_LOTE]
+    if desconhecidas:
+        raise ValueError(f"Análises desconhecidas: {desconhecidas}. Opções: {', '.join(ANALISES_LOTE)}.")
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato '{formato}' não suportado. Use: {', '.join(FORMATOS_EXPORTACAO)}.")
+    motor, particoes = resolver_motor(motor), resolver_particoes(particoes)
+    if as_of is not None:
+        # O histórico reduzido do streaming só guarda os registros mais recentes: datas passadas
+        # precisam do histórico completo.
+        if streaming:
+            raise ValueError("--as-of requer o histórico completo; não é possível combiná-lo com --streaming.")
+        streaming = False
+        if historico is None:
+            print("AVISO: execução com --as-of não é gravada no histórico de pendências; use --historico para gravá-la "
+                  "com a própria data num SQLite separado.")
+
+    print("--- LOTE: EXECUTANDO ANÁLISES SOBRE UMA ÚNICA CARGA ---")
+    inicio_lote, agora = time.perf_counter(), datetime.now()
+    output_dir = os.path.join(pasta_saida, f"lote_{agora.strftime('%d_%m_%y_%Hh%M%S')}")
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"Diretório de saída para esta execução: '{output_dir}'")
+
+    inicio_carga = time.perf_counter()
+    brasil_limpo, espanha_historico = load_and_prepare_data(streaming=streaming)
+    manifesto = {
+        'executado_em': agora.isoformat(timespec='seconds'), 'formato': formato, 'executor': executor, 'motor': motor,
+        'particoes': particoes, 'historico': historico,
+        'as_of': None if as_of is None else resolver_as_of(as_of).date().isoformat(),
+        'carga': {'segundos': round(time.perf_counter() - inicio_carga, 3),
+                  'linhas_brasil': None if brasil_limpo is None else len(brasil_limpo),
+                  'linhas_espanha': None if espanha_historico is None else len(espanha_historico)},
+        'analises': {},
+    }
+
+    if brasil_limpo is None or espanha_historico is None:
+        print("Execução interrompida devido a erro na carga dos dados.")
+        manifesto['carga']['erro'] = "Falha na carga dos dados."
+    else:
+        max_workers = max_workers or len(analises)
+        if executor == 'processos':
+            pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_inicializar_worker,
+                                       initargs=(brasil_limpo, espanha_historico))
+            argumentos = (None, None)
+        else:
+            pool = ThreadPoolExecutor(max_workers=max_workers)
+            argumentos = (brasil_limpo, espanha_historico)
+        with pool:
+            futuros = [pool.submit(_executar_analise, nome, *argumentos, output_dir, formato, motor, as_of, particoes,
+                                       historico)
+                       for nome in analises]
+            for futuro in as_completed(futuros):
+                resultado = futuro.result()
+                manifesto['analises'][resultado.pop('analise')] = resultado
+        manifesto['analises'] = {nome: manifesto['analises'][nome] for nome in analises}
+
+    manifesto['total_segundos'] = round(time.perf_counter() - inicio_lote, 3)
+    caminho_manifesto = os.path.join(output_dir, 'manifesto.json')
+    with open(caminho_manifesto, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+
+    print(f"\n--- LOTE: Carga em {manifesto['carga']['segundos']:.1f}s, total {manifesto['total_segundos']:.1f}s ---")
+    for nome, resultado in manifesto['analises'].items():
+        detalhe = resultado['erro'] if resultado['status'] == 'erro' else f"{resultado['linhas']} linhas"
+        print(f"  {nome:<16} {resultado['status']:<5} {resultado['segundos']:>7.2f}s  {detalhe}")
+    print(f"-> Manifesto gravado em: {caminho_manifesto}")
+    return manifesto
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Carrega as bases uma vez e executa as análises selecionadas em paralelo.")
+    parser.add_argument('analises', nargs='*', metavar='ANALISE',
+                        help=f"Análises a executar (padrão: todas). Opções: {', '.join(ANALISES_LOTE)}.")
+    parser.add_argument('--formato', choices=list(FORMATOS_EXPORTACAO), default='xlsx')
+    parser.add_argument('--executor', choices=['threads', 'processos'], default='threads',
+                        help="'processos' evita disputa pelo GIL, ao custo de copiar as bases para cada worker.")
+    parser.add_argument('--max-workers', type=int, default=None)
+    parser.add_argument('--pasta-saida', default='output', metavar='PASTA',
+                        help="Pasta onde criar o diretório desta execução (padrão: output).")
+    parser.add_argument('--streaming', action='store_true', default=None,
+                        help="Lê o histórico da Espanha em blocos, mantendo só os registros usados pelas análises.")
+    parser.add_argument('--motor', choices=list(MOTORES), default=None,
+                        help="Motor das regras (padrão: ANALISE_MOTOR ou pandas). 'duckdb' requer o pacote opcional duckdb.")
+    parser.add_argument('--as-of', type=resolver_as_of, default=None, metavar='AAAA-MM-DD',
+                        help="Reproduz as análises como estariam nessa data (histórico até a data e prazos contados a partir dela).")
+    parser.add_argument('--particoes', type=resolver_particoes, default=None, metavar='N',
+                        help="Concilia as bases em N partições por id_sistema_local, em processos paralelos "
+                             "(padrão: ANALISE_PARTICOES ou 1; 'auto' = uma por núcleo). Vale para pendencias_app.")
+    parser.add_argument('--historico', default=None, metavar='CAMINHO',
+                        help="SQLite de histórico onde gravar as execuções. Com --as-of é obrigatório para gravar: "
+                             "as execuções entram com a data do replay. Use um arquivo separado do histórico do dia.")
+    args = parser.parse_args()
+    desconhecidas = [nome for nome in args.analises if nome not in ANALISES_LOTE]
+    if desconhecidas:
+        parser.error(f"análises desconhecidas: {', '.join(desconhecidas)}. Opções: {', '.join(ANALISES_LOTE)}.")
+    return args
+
+if __name__ == '__main__':
+    ativar_copy_on_write()
+    args = _argumentos()
+    manifesto = executar_lote(args.analises, args.formato, args.executor, args.max_workers, args.pasta_saida,
+                              streaming=args.streaming, motor=args.motor, as_of=args.as_of, particoes=args.particoes,
+                              historico=args.historico)
+    if any(resultado['status'] == 'erro' for resultado in manifesto['analises'].values()) or 'erro' in manifesto['carga']:
+        raise SystemExit(1)
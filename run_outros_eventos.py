@@ -1,35 +1,33 @@
 import pandas as pd # type: ignore
 import os
+import sys
 from datetime import datetime
-from core_processing import load_and_prepare_data
-
-def run_analysis_outros_eventos():
-    print("--- EXECUTANDO ANÁLISE GERAL DE DIVERGÊNCIA DE EVENTOS ---")
-    agora = datetime.now()
-    nome_pasta_saida = f"outros_eventos_{agora.strftime('%d_%m_%y_%Hh%M')}"
-    output_dir = os.path.join('output', nome_pasta_saida)
-    os.makedirs(output_dir, exist_ok=True)
-    print(f"Diretório de saída para esta execução: '{output_dir}'")
-
-    brasil_bruto, espanha_bruto = load_and_prepare_data()
-
-    if brasil_bruto is None or espanha_bruto is None:
-        print("Execução interrompida devido a erro na carga dos dados.")
-        return
-
+from core_processing import (
+    load_and_prepare_data, registros_mais_recentes, renderizar_chave, garantir_codigo_evento, historico_ate, ativar_copy_on_write
+)
+from exportacao import exportar_relatorio, caminho_relatorio
+from reconciliacao import resolver_motor, EVENTOS
+from historico_resultados import registrar_resultado
+
+def executar_outros_eventos(brasil_bruto, espanha_bruto, output_dir, formato='xlsx', motor=None, as_of=None, historico=None):
+    # Os ajustes locais devolvem objetos novos (rename / assign), nunca alteram as bases
+    # recebidas: elas podem estar sendo usadas por outras análises ao mesmo tempo (run_lote.py). as_of: eventos mais recentes até essa data;
+    # historico: como em run_eve001.
+    arquivos = []
+    brasil_bruto, espanha_bruto = historico_ate(brasil_bruto, as_of), historico_ate(espanha_bruto, as_of)
     mapeamento_local_espanha = {
         'ID de usuario/empleado': 'chapa'
     }
     colunas_para_renomear_es = {k: v for k, v in mapeamento_local_espanha.items() if k in espanha_bruto.columns}
     if colunas_para_renomear_es:
-        espanha_bruto.rename(columns=colunas_para_renomear_es, inplace=True)
+        espanha_bruto = espanha_bruto.rename(columns=colunas_para_renomear_es)
         print("\n--- AJUSTE LOCAL: Coluna 'chapa' criada para a base Espanha. ---")
 
     # 2. Ajuste para a base do Brasil: Garante que a coluna 'nome' exista,
     #    criando-a a partir de 'nome_parcial' e 'sobrenome' se necessário.
     if 'nome' not in brasil_bruto.columns and 'nome_parcial' in brasil_bruto.columns:
-        brasil_bruto['nome'] = brasil_bruto['nome_parcial'].fillna('') + ' ' + brasil_bruto['sobrenome'].fillna('')
-        brasil_bruto['nome'] = brasil_bruto['nome'].str.strip()
+        brasil_bruto = brasil_bruto.assign(
+            nome=(brasil_bruto['nome_parcial'].fillna('') + ' ' + brasil_bruto['sobrenome'].fillna('')).str.strip())
         print("--- AJUSTE LOCAL: Coluna 'nome' criada para a base Brasil. ---")
     # --- FIM DO BLOCO DE AJUSTE LOCAL ---
 
@@ -39,34 +37,43 @@ def run_analysis_outros_eventos():
             print(f"\nERRO CRÍTICO: Colunas essenciais não encontradas na base {df_name} após padronização.")
             print(f"Colunas disponíveis: {df.columns.tolist()}")
             print("Verifique os nomes das colunas na planilha original ou o mapeamento local neste script.")
-            return
+            return {'linhas': 0, 'arquivos': arquivos, 'erro': f"Colunas essenciais não encontradas na base {df_name}."}
 
-    eventos_excluidos = ['EVE001', 'EVE012', 'EVE013']
+    eventos_excluidos = EVENTOS['outros_eventos_excluidos']
     print(f"\nExcluindo eventos predefinidos da análise: {eventos_excluidos}")
 
-    for df in [brasil_bruto, espanha_bruto]:
-        df['evento_codigo'] = df['motivo_evento'].astype(str).str.split('-').str[0].str.strip()
-        df.dropna(subset=['data_efetiva', 'chapa'], inplace=True)
-        df.sort_values('data_efetiva', ascending=False, inplace=True)
-        df.drop_duplicates(subset='chapa', keep='first', inplace=True)
+    if resolver_motor(motor) == 'duckdb':
+        from motor_duckdb import divergencias_de_eventos_sql
+        print("Executando a regra no motor DuckDB.")
+        df_divergencias = divergencias_de_eventos_sql(brasil_bruto, espanha_bruto, eventos_excluidos)
+    else:
+        # 'evento_codigo' vem da carga (categorias compartilhadas entre BR e ES).
+        brasil_bruto, espanha_bruto = [
+            registros_mais_recentes(garantir_codigo_evento(df).dropna(subset=['data_efetiva', 'chapa']), chave='chapa', decrescente=True)
+            for df in [brasil_bruto, espanha_bruto]
+        ]
 
-    brasil_filtrado = brasil_bruto[~brasil_bruto['evento_codigo'].isin(eventos_excluidos)]
-    espanha_filtrado = espanha_bruto[~espanha_bruto['evento_codigo'].isin(eventos_excluidos)]
+        brasil_filtrado = brasil_bruto[~brasil_bruto['evento_codigo'].isin(eventos_excluidos)]
+        espanha_filtrado = espanha_bruto[~espanha_bruto['evento_codigo'].isin(eventos_excluidos)]
 
-    print(f"Registros únicos e mais recentes no Brasil (pós-filtro): {brasil_filtrado.shape[0]}")
-    print(f"Registros únicos e mais recentes na Espanha (pós-filtro): {espanha_filtrado.shape[0]}")
+        print(f"Registros únicos e mais recentes no Brasil (pós-filtro): {brasil_filtrado.shape[0]}")
+        print(f"Registros únicos e mais recentes na Espanha (pós-filtro): {espanha_filtrado.shape[0]}")
 
-    df_merged = pd.merge(
-        brasil_filtrado[['chapa', 'nome', 'motivo_evento', 'evento_codigo']],
-        espanha_filtrado[['chapa', 'motivo_evento', 'evento_codigo']],
-        on='chapa',
-        suffixes=('_br', '_es')
-    )
+        df_merged = pd.merge(
+            brasil_filtrado[['chapa', 'nome', 'motivo_evento', 'evento_codigo']],
+            espanha_filtrado[['chapa', 'motivo_evento', 'evento_codigo']],
+            on='chapa',
+            suffixes=('_br', '_es')
+        )
 
-    df_divergencias = df_merged[df_merged['evento_codigo_br'] != df_merged['evento_codigo_es']].copy()
+        # Motivo vazio nas duas bases não é divergência.
+        codigo_br, codigo_es = df_merged['evento_codigo_br'], df_merged['evento_codigo_es']
+        df_divergencias = df_merged[(codigo_br != codigo_es) & ~(codigo_br.isna() & codigo_es.isna())]
 
     if df_divergencias.empty:
         print("\nNenhuma divergência de outros eventos encontrada entre as bases.")
+        registrar_resultado('outros_eventos', df_divergencias, as_of, historico)
+        return {'linhas': 0, 'arquivos': arquivos}
     else:
         print(f"\nEncontradas {df_divergencias.shape[0]} divergências de eventos.")
         colunas_finais = {
@@ -76,14 +83,15 @@ def run_analysis_outros_eventos():
             'motivo_evento_es': 'evento_espanha'
         }
         df_relatorio = df_divergencias[list(colunas_finais.keys())].rename(columns=colunas_finais)
-        df_relatorio['chapa'] = df_relatorio['chapa'].astype(str).str.split('.').str[0]
+        df_relatorio['chapa'] = renderizar_chave(df_relatorio['chapa'])
+        registrar_resultado('outros_eventos', df_relatorio, as_of, historico)
 
         print("\nPrévia do Relatório de Divergências de Eventos:")
         print(df_relatorio.head())
 
-        caminho_excel = os.path.join(output_dir, 'outros_eventos_divergentes.xlsx')
-        df_relatorio.to_excel(caminho_excel, index=False)
-        print(f"\n-> Relatório Excel gerado em: {caminho_excel}")
+        caminho_saida = exportar_relatorio(df_relatorio, caminho_relatorio(output_dir, 'outros_eventos_divergentes', formato))
+        print(f"\n-> Relatório gerado em: {caminho_saida}")
+        arquivos.append(caminho_saida)
 
         chapas_para_envio = ';'.join(df_relatorio['chapa'].unique())
         caminho_txt = os.path.join(output_dir, 'chapas_outros_eventos.txt')
@@ -92,8 +100,27 @@ def run_analysis_outros_eventos():
                 f.write("--------------OUTROS EVENTOS------------\n")
                 f.write(chapas_para_envio)
             print(f"-> Arquivo TXT com chapas gerado em: {caminho_txt}")
+            arquivos.append(caminho_txt)
         except Exception as e:
             print(f"ERRO ao gerar arquivo TXT: {e}")
+        return {'linhas': len(df_relatorio), 'arquivos': arquivos}
+
+def run_analysis_outros_eventos(formato='xlsx', motor=None):
+    print("--- EXECUTANDO ANÁLISE GERAL DE DIVERGÊNCIA DE EVENTOS ---")
+    agora = datetime.now()
+    nome_pasta_saida = f"outros_eventos_{agora.strftime('%d_%m_%y_%Hh%M')}"
+    output_dir = os.path.join('output', nome_pasta_saida)
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"Diretório de saída para esta execução: '{output_dir}'")
+
+    brasil_bruto, espanha_bruto = load_and_prepare_data()
+
+    if brasil_bruto is None or espanha_bruto is None:
+        print("Execução interrompida devido a erro na carga dos dados.")
+        return
+
+    executar_outros_eventos(brasil_bruto, espanha_bruto, output_dir, formato, motor)
 
 if __name__ == '__main__':
-    run_analysis_outros_eventos()
\ No newline at end of file
+    ativar_copy_on_write()
+    run_analysis_outros_eventos(sys.argv[1] if len(sys.argv) > 1 else 'xlsx', sys.argv[2] if len(sys.argv) > 2 else None)
\ No newline at end of file
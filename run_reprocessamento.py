@@ -0,0 +1,73 @@
+import argparse
+import os
+import time
+
+import pandas as pd # type: ignore
+
+from core_processing import load_and_prepare_data, ativar_copy_on_write
+from analysis_functions import analisar_pendencias
+from reconciliacao import resolver_motor, resolver_as_of, resolver_particoes, MOTORES
+from exportacao import exportar_relatorio, caminho_relatorio, FORMATOS_EXPORTACAO
+from historico_resultados import registrar_resultado
+
+# Reprocessa as análises do app dia a dia num período passado (backfill), como teriam saído
+# em cada data. As bases são carregadas uma vez e todas as datas consultam o mesmo índice
+# temporal (reconciliacao.IndiceTemporal): nada é reordenado ou refeito por data.
+
+def reprocessar_periodo(inicio, fim, motor=None, formato='csv', relatorios=False, historico=None, pasta_saida='output',
+                        particoes=None):
+    datas = pd.date_range(resolver_as_of(inicio), resolver_as_of(fim), freq='D')
+    if datas.empty:
+        raise ValueError(f"Período vazio: {inicio} a {fim}.")
+    motor, particoes = resolver_motor(motor), resolver_particoes(particoes)
+
+    print(f"--- REPROCESSAMENTO: {len(datas)} datas, de {datas[0].date()} a {datas[-1].date()} ---")
+    output_dir = os.path.join(pasta_saida, f"reprocessamento_{datas[0]:%d_%m_%y}_a_{datas[-1]:%d_%m_%y}")
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"Diretório de saída para esta execução: '{output_dir}'")
+
+    # O histórico reduzido do streaming não serve para datas passadas.
+    brasil_limpo, espanha_historico = load_and_prepare_data(streaming=False)
+    if brasil_limpo is None or espanha_historico is None:
+        print("Execução interrompida devido a erro na carga dos dados.")
+        return None
+
+    inicio_reprocessamento, resumo = time.perf_counter(), []
+    for data in datas:
+        for nome, (df_relatorio, _) in analisar_pendencias(brasil_limpo, espanha_historico, motor=motor, as_of=data,
+                                                            particoes=particoes).items():
+            if 'Erro' in df_relatorio.columns:
+                continue
+            resumo.append({'data_referencia': data.date(), 'analise': nome, 'pendencias': len(df_relatorio)})
+            # Com 'historico', as execuções entram com a própria data, em ordem cronológica.
+            registrar_resultado(nome, df_relatorio, as_of=data, historico=historico)
+            if relatorios and not df_relatorio.empty:
+                exportar_relatorio(df_relatorio, caminho_relatorio(output_dir, f'{nome}_{data:%Y_%m_%d}', formato))
+
+    df_resumo = pd.DataFrame(resumo, columns=['data_referencia', 'analise', 'pendencias'])
+    caminho_resumo = exportar_relatorio(df_resumo, caminho_relatorio(output_dir, 'resumo_por_data', formato))
+    print(f"\n--- REPROCESSAMENTO: {len(datas)} datas em {time.perf_counter() - inicio_reprocessamento:.1f}s ---")
+    print(df_resumo.pivot(index='data_referencia', columns='analise', values='pendencias').tail(10))
+    print(f"-> Resumo gravado em: {caminho_resumo}")
+    return df_resumo
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Reprocessa as análises do app para cada dia de um período passado.")
+    parser.add_argument('inicio', type=resolver_as_of, metavar='INICIO', help="Primeira data (AAAA-MM-DD).")
+    parser.add_argument('fim', type=resolver_as_of, metavar='FIM', help="Última data (AAAA-MM-DD), inclusive.")
+    parser.add_argument('--motor', choices=list(MOTORES), default=None,
+                        help="Motor das regras (padrão: ANALISE_MOTOR ou pandas).")
+    parser.add_argument('--formato', choices=list(FORMATOS_EXPORTACAO), default='csv')
+    parser.add_argument('--relatorios', action='store_true', help="Exporta também os relatórios de cada data.")
+    parser.add_argument('--historico', default=None, metavar='CAMINHO',
+                        help="Grava cada data como uma execução neste SQLite de histórico. Use um arquivo novo: "
+                             "execuções antigas gravadas depois das recentes confundem o controle de pendências resolvidas.")
+    parser.add_argument('--particoes', type=resolver_particoes, default=None, metavar='N',
+                        help="Concilia cada data em N partições por id_sistema_local, em processos paralelos.")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    ativar_copy_on_write()
+    args = _argumentos()
+    reprocessar_periodo(args.inicio, args.fim, args.motor, args.formato, args.relatorios, args.historico,
+                        particoes=args.particoes)